@@ -5,6 +5,8 @@ export const TOOL_DISPLAY_NAMES: Record<string, string> = {
   configurePayment: 'Configuring payment methods',
   setupInventory: 'Setting up product inventory',
   generateLegalDocs: 'Generating comprehensive legal documents',
+  searchProducts: 'Searching your products',
+  getProduct: 'Looking up product',
   addProduct: 'Adding product to your store',
   deleteProduct: 'Deleting product from your store',
   deleteAllProducts: 'Deleting all products from your store',
@@ -24,6 +26,8 @@ export const TOOL_DESCRIPTIONS: Record<string, string> = {
   configurePayment: 'Setting up payment methods',
   setupInventory: 'Creating sample products and organizing catalog',
   generateLegalDocs: 'Creating privacy policy, terms of use, and NDA documents',
+  searchProducts: 'Searching the products in your Shopify store',
+  getProduct: 'Looking up a product in your Shopify store',
   addProduct: 'Adding new product to your Shopify store',
   deleteProduct: 'Removing product from your Shopify store',
   deleteAllProducts: 'Removing all products from your Shopify store',
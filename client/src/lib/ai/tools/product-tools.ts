@@ -1,8 +1,159 @@
 import { z } from 'zod'
 import { createServerClient } from '@/lib/supabase-server'
+import { CONFIG } from '@/constants/config'
+
+// Reads go to the server's catalog mirror instead of the Shopify Admin API; passing
+// the access token lets the server refresh a stale mirror in the background
+async function fetchCatalog(path: string, params: Record<string, string>, accessToken: string) {
+  const query = new URLSearchParams(params).toString()
+  return fetch(`${CONFIG.API_BASE_URL}/api/shopify/catalog/${path}?${query}`, {
+    method: 'GET',
+    headers: {
+      'X-Shopify-Access-Token': accessToken,
+    }
+  })
+}
 
 export function createProductTools(userId?: string) {
   return {
+    searchProducts: {
+      description: "Search the products in the user's Shopify store by title, vendor, type, tags, description or SKU",
+      inputSchema: z.object({
+        query: z.string().describe("Search terms"),
+        limit: z.number().optional().describe("Maximum number of products to return (defaults to 10)")
+      }),
+      execute: async ({ query, limit = 10 }: { query: string; limit?: number }) => {
+        try {
+          if (!userId) {
+            return {
+              success: false,
+              status: "error",
+              message: "User ID is required to search products"
+            }
+          }
+
+          const supabase = createServerClient()
+          const { data: shopifyIntegration, error } = await supabase
+            .from('integrations')
+            .select('*')
+            .eq('user_id', userId)
+            .eq('integration_type', 'shopify')
+            .eq('is_active', true)
+            .single()
+
+          if (error || !shopifyIntegration) {
+            return {
+              success: false,
+              status: "error",
+              message: "No active Shopify integration found. Please connect your Shopify store first."
+            }
+          }
+
+          const shopDomain = shopifyIntegration.external_id
+          const response = await fetchCatalog(
+            'search', { shop: shopDomain, q: query, limit: String(limit) }, shopifyIntegration.access_token
+          )
+
+          if (!response.ok) {
+            const errorData = await response.text()
+            throw new Error(`Catalog search error: ${response.status} - ${errorData}`)
+          }
+
+          const result = await response.json()
+          return {
+            success: true,
+            status: "done",
+            products: result.results,
+            synced_at: result.synced_at,
+            message: `Found ${result.results.length} products matching "${query}"`
+          }
+        } catch (error) {
+          console.error('Error searching Shopify products:', error)
+          return {
+            success: false,
+            status: "error",
+            message: `Failed to search products: ${error instanceof Error ? error.message : 'Unknown error'}`
+          }
+        }
+      }
+    },
+
+    getProduct: {
+      description: "Look up one product in the user's Shopify store by product ID, handle or SKU",
+      inputSchema: z.object({
+        product_id: z.string().optional().describe("The Shopify product ID"),
+        handle: z.string().optional().describe("The product handle"),
+        sku: z.string().optional().describe("A variant SKU")
+      }),
+      execute: async ({ product_id, handle, sku }: { product_id?: string; handle?: string; sku?: string }) => {
+        try {
+          if (!userId) {
+            return {
+              success: false,
+              status: "error",
+              message: "User ID is required to look up products"
+            }
+          }
+
+          if (!product_id && !handle && !sku) {
+            return {
+              success: false,
+              status: "error",
+              message: "Pass a product ID, handle or SKU to look up"
+            }
+          }
+
+          const supabase = createServerClient()
+          const { data: shopifyIntegration, error } = await supabase
+            .from('integrations')
+            .select('*')
+            .eq('user_id', userId)
+            .eq('integration_type', 'shopify')
+            .eq('is_active', true)
+            .single()
+
+          if (error || !shopifyIntegration) {
+            return {
+              success: false,
+              status: "error",
+              message: "No active Shopify integration found. Please connect your Shopify store first."
+            }
+          }
+
+          const params: Record<string, string> = { shop: shopifyIntegration.external_id }
+          if (product_id) params.id = product_id
+          if (handle) params.handle = handle
+          if (sku) params.sku = sku
+          const response = await fetchCatalog('lookup', params, shopifyIntegration.access_token)
+
+          if (!response.ok) {
+            if (response.status === 404) {
+              return {
+                success: false,
+                status: "error",
+                message: `Product ${product_id || handle || sku} not found in your store`
+              }
+            }
+            const errorData = await response.text()
+            throw new Error(`Catalog lookup error: ${response.status} - ${errorData}`)
+          }
+
+          return {
+            success: true,
+            status: "done",
+            product: await response.json()
+          }
+        } catch (error) {
+          console.error('Error looking up Shopify product:', error)
+          return {
+            success: false,
+            status: "error",
+            message: `Failed to look up product: ${error instanceof Error ? error.message : 'Unknown error'}`
+          }
+        }
+      }
+    },
+
     addProduct: {
       description: "Add a new product to the user's Shopify store",
       inputSchema: z.object({
@@ -1,5 +1,7 @@
 from src.utils.create_openai import create_openai_client
 from src.utils.create_gemini import create_gemini_client, create_gemini_video_client
+from src.utils.resumable_upload import upload_resumable
+from src.utils.mp4_probe import Mp4ProbeError, probe_mp4
 import json
 import re
 import time
@@ -7,14 +9,139 @@ import requests
 import base64
 import os
 import uuid
+import zipfile
+from io import BytesIO
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src.utils import brand_store
+from src.utils.data_dir import data_path
+from src.utils.zip_stream import stream_zip
+from src.utils.perceptual_hash import DUPLICATE_DISTANCE, dedupe_and_rank, dhash, hamming
 from supabase import create_client, Client
 
-def generate_branding (idea_string: str) -> dict:
+LOGO_CANDIDATES = int(os.getenv("LOGO_CANDIDATES", "4"))
+# Concurrent logo downloads/uploads per call
+LOGO_TRANSFER_WORKERS = int(os.getenv("LOGO_TRANSFER_WORKERS", "8"))
+LOGO_SIZES = (1024, 512, 256, 128, 64)
+DEFAULT_TYPOGRAPHY = {"heading_font": "Montserrat", "body_font": "Open Sans"}
+
+def _upload_logo(image_bytes: bytes, brand_name: str) -> str | None:
+    """Upload logo bytes to Supabase Storage and return the public URL."""
+    try:
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        bucket_name = os.getenv("SUPABASE_BUCKET", "product_images")
+        if not supabase_url or not supabase_service_key:
+            raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY env vars")
+
+        sb: Client = create_client(supabase_url, supabase_service_key)
+        object_key = f"logos/{brand_name.strip().lower().replace(' ', '-')}-{uuid.uuid4().hex}.png"
+
+        # Upload bytes to Supabase Storage
+        upload_res = sb.storage.from_(bucket_name).upload(
+            path=object_key,
+            file=image_bytes,
+            file_options={"contentType": "image/png", "upsert": "true"},
+        )
+        # UploadResponse object doesn't have .get() method, check for errors differently
+        if hasattr(upload_res, 'error') and upload_res.error:
+            raise RuntimeError(upload_res.error)
+
+        # Get public URL
+        public = sb.storage.from_(bucket_name).get_public_url(object_key)
+        public_url = public.get("publicUrl") if isinstance(public, dict) else None
+        if not public_url:
+            # Fallback to generated URL pattern
+            public_url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{object_key}"
+        return public_url
+    except Exception as supa_e:
+        print(f"Error uploading logo to Supabase Storage: {supa_e}")
+        return None
+
+def _download(url: str) -> bytes:
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+def generate_logo_candidates(brand_name: str, tagline: str, n: int = 1, exclude_hashes: list[int] | None = None) -> list[dict]:
+    """
+    Requests `n` logos from the image provider in a single call, drops
+    near-duplicates (by perceptual hash, including against `exclude_hashes`),
+    uploads the rest and returns them ranked best first.
+
+    Returns:
+        list[dict]: Candidates as {url, phash}.
+    """
+    client = create_openai_client()
+
+    image_prompt = f"""
+    Create a logo for a brand named '{brand_name}' with the tagline '{tagline}'. The logo should be modern and visually appealing. No text.
+    """
+    image_response = client.images.generate(
+        model="dall-e-2",
+        prompt=image_prompt,
+        n=n,
+        size="1024x1024",
+    )
+
+    # Download every candidate concurrently; no local save
+    urls = [image.url for image in image_response.data if image.url]
+    if not urls:
+        print("Image provider returned no logo candidates")
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(urls), LOGO_TRANSFER_WORKERS)) as pool:
+        images = list(pool.map(_download, urls))
+
+    hashes = [dhash(image) for image in images]
+    fresh = [
+        i for i, value in enumerate(hashes)
+        if all(hamming(value, seen) > DUPLICATE_DISTANCE for seen in exclude_hashes or [])
+    ]
+    ranked = [fresh[i] for i in dedupe_and_rank([hashes[i] for i in fresh])]
+    print(f"Generated {len(images)} logo candidates, {len(ranked)} distinct")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(ranked), LOGO_TRANSFER_WORKERS))) as pool:
+        public_urls = list(pool.map(lambda i: _upload_logo(images[i], brand_name), ranked))
+
+    return [
+        {"url": url, "phash": f"{hashes[i]:016x}"}
+        for i, url in zip(ranked, public_urls) if url
+    ]
+
+def regenerate_logo(brand_id: str) -> dict | None:
+    """
+    Serves the next stored logo candidate for a brand, only calling the image
+    provider for a fresh batch once every stored candidate has been shown.
+
+    Returns:
+        dict | None: {brand_id, logo, source}, or None if the brand is unknown.
+    """
+    brand = brand_store.get_brand(brand_id)
+    if brand is None:
+        return None
+
+    candidate = brand_store.take_next_logo(brand_id)
+    if candidate:
+        return {"brand_id": brand_id, "logo": candidate["url"], "source": "cache"}
+
+    candidates = generate_logo_candidates(
+        brand["brand_name"],
+        brand["tagline"],
+        n=LOGO_CANDIDATES,
+        exclude_hashes=brand_store.stored_logo_hashes(brand_id),
+    )
+    brand_store.add_logo_candidates(brand_id, candidates)
+    candidate = brand_store.take_next_logo(brand_id)
+    return {"brand_id": brand_id, "logo": candidate["url"] if candidate else None, "source": "provider"}
+
+def generate_branding (idea_string: str, logo_candidates: int = 1) -> dict:
     """
     Generates branding assets based on the provided idea string.
 
     Args:
         idea_string (str): The idea or concept for which to generate branding assets.
+        logo_candidates (int): How many logos to request in the single image-provider call.
 
     Returns:
         dict: A dictionary containing the generated branding assets.
@@ -34,6 +161,7 @@ def generate_branding (idea_string: str) -> dict:
             Output a JSON object with the following fields:
             - brand_name: A catchy and relevant brand name.
             - tagline: A short and memorable tagline.
+            - typography: An object with heading_font and body_font, both Google Fonts family names that suit the brand.
             Do not include any code markdown (like ```json) or other text outside the JSON object.
         """
 
@@ -57,56 +185,19 @@ def generate_branding (idea_string: str) -> dict:
         result.update(branding_data)
         
         print("Generating logo...")
-        client = create_openai_client()
+        candidates = generate_logo_candidates(result['brand_name'], result['tagline'], n=logo_candidates)
 
-        image_prompt = f"""
-        Create a logo for a brand named '{result['brand_name']}' with the tagline '{result['tagline']}'. The logo should be modern and visually appealing. No text.
-        """
-        image_response = client.images.generate(
-            model="dall-e-2",
-            prompt=image_prompt,
-            n=1,
-            size="1024x1024",
+        brand_id = brand_store.create_brand(
+            idea_string,
+            result['brand_name'],
+            result['tagline'],
+            data={"typography": result.get("typography") or DEFAULT_TYPOGRAPHY},
         )
-
-        image_url = image_response.data[0].url
-        
-        # Download the image from the URL
-        image_response_download = requests.get(image_url)
-        image_response_download.raise_for_status()
-        
-        # No local save; we will upload bytes directly to Supabase Storage
-
-        # Upload to Supabase Storage using service role key
-        try:
-            supabase_url = os.getenv("SUPABASE_URL")
-            supabase_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-            bucket_name = os.getenv("SUPABASE_BUCKET", "product_images")
-            if not supabase_url or not supabase_service_key:
-                raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY env vars")
-
-            sb: Client = create_client(supabase_url, supabase_service_key)
-            object_key = f"logos/{result['brand_name'].strip().lower().replace(' ', '-')}-{uuid.uuid4().hex}.png"
-
-            # Upload bytes to Supabase Storage
-            upload_res = sb.storage.from_(bucket_name).upload(
-                path=object_key,
-                file=image_response_download.content,
-                file_options={"contentType": "image/png", "upsert": "true"},
-            )
-            # UploadResponse object doesn't have .get() method, check for errors differently
-            if hasattr(upload_res, 'error') and upload_res.error:
-                raise RuntimeError(upload_res.error)
-
-            # Get public URL
-            public = sb.storage.from_(bucket_name).get_public_url(object_key)
-            public_url = public.get("publicUrl") if isinstance(public, dict) else None
-            if not public_url:
-                # Fallback to generated URL pattern
-                public_url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{object_key}"
-            result["logo"] = public_url
-        except Exception as supa_e:
-            print(f"Error uploading logo to Supabase Storage: {supa_e}")
+        brand_store.add_logo_candidates(brand_id, candidates)
+        top = brand_store.take_next_logo(brand_id)
+        result["brand_id"] = brand_id
+        result["logo"] = top["url"] if top else ""
+        result["logo_candidates"] = [c["url"] for c in candidates]
 
         print("Generated logo and uploaded to Supabase Storage!")
 
@@ -116,9 +207,10 @@ def generate_branding (idea_string: str) -> dict:
         print(f"Error processing branding data: {e}")
         return { "branding": response.text }
 
-def generate_branding_video(idea_string: str) -> dict:
+def generate_branding_video(idea_string: str, brand_id: str | None = None) -> dict:
     """
     Generates a branding video based on the provided idea string.
+    When `brand_id` is given, the video link is recorded on the stored brand.
     """
     try:
         print("Generating branding video for: ", idea_string)
@@ -174,6 +266,13 @@ def generate_branding_video(idea_string: str) -> dict:
             print(f"Error saving generated video: {dl_e}")
             return { "video": False, "video_url": None }
 
+        # Reject corrupt or truncated files before they are uploaded and served
+        try:
+            metadata = probe_mp4(video_bytes)
+        except Mp4ProbeError as probe_e:
+            print(f"Rejecting generated video: {probe_e}")
+            return { "video": False, "video_url": None }
+
         # Upload saved video to Supabase Storage and return public URL
         try:
             supabase_url = os.getenv("SUPABASE_URL")
@@ -186,26 +285,118 @@ def generate_branding_video(idea_string: str) -> dict:
             safe_name = re.sub(r"[^a-z0-9-]", "-", idea_string.strip().lower().replace(" ", "-"))[:60]
             object_key = f"videos/{safe_name}-{uuid.uuid4().hex}.mp4"
 
-            # video_bytes already populated above
-
-            upload_res = sb.storage.from_(bucket_name).upload(
-                path=object_key,
-                file=video_bytes,
-                file_options={"contentType": "video/mp4", "upsert": "true"},
-            )
-            if hasattr(upload_res, 'error') and upload_res.error:
-                raise RuntimeError(upload_res.error)
+            # Videos are large; send them in resumable, parallel chunks
+            # An interrupted upload of the same video resumes under its original key
+            object_key = upload_resumable(bucket_name, object_key, video_bytes, content_type="video/mp4")
 
             public = sb.storage.from_(bucket_name).get_public_url(object_key)
             public_url = public.get("publicUrl") if isinstance(public, dict) else None
             if not public_url:
                 public_url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{object_key}"
 
-            return { "video": True, "video_url": public_url }
+            if brand_id:
+                _record_brand_video(brand_id, public_url, object_key)
+
+            return { "video": True, "video_url": public_url, "metadata": metadata }
         except Exception as supa_e:
             print(f"Error uploading video to Supabase Storage: {supa_e}")
-            return { "video": True, "video_url": None }
+            return { "video": True, "video_url": None, "metadata": metadata }
     except Exception as e:
         print(f"Error processing branding video: {e}")
         return { "video": False }
-    
+
+def _record_brand_video(brand_id: str, video_url: str, object_key: str) -> None:
+    try:
+        brand = brand_store.get_brand(brand_id)
+        if brand is None:
+            return
+        videos = brand["data"].get("videos", [])
+        videos.append({"url": video_url, "object_key": object_key, "created_at": time.time()})
+        brand_store.update_brand_data(brand_id, videos=videos)
+    except Exception as e:
+        print(f"Error recording video for brand {brand_id}: {e}")
+
+def _logo_artifacts(logo: dict) -> dict:
+    """
+    Logo derivatives (resized PNGs, favicon) and palette for a stored logo
+    candidate, rendered once and cached on disk by perceptual hash.
+
+    Returns:
+        dict: Artifact name -> file path, plus "palette" -> list of colors.
+    """
+    cache_dir = os.path.dirname(data_path("artifacts", "logos", logo["phash"], "original.png"))
+    original_path = os.path.join(cache_dir, "original.png")
+    palette_path = os.path.join(cache_dir, "palette.json")
+
+    if not os.path.exists(palette_path):
+        image_bytes = _download(logo["url"])
+        with Image.open(BytesIO(image_bytes)) as image:
+            image = image.convert("RGBA")
+            _write_atomic(original_path, lambda f: image.save(f, "PNG"))
+            for size in LOGO_SIZES:
+                resized = image.resize((size, size), Image.LANCZOS)
+                _write_atomic(os.path.join(cache_dir, f"logo-{size}.png"), lambda f: resized.save(f, "PNG", optimize=True))
+            _write_atomic(os.path.join(cache_dir, "favicon.ico"), lambda f: image.save(f, "ICO", sizes=[(16, 16), (32, 32), (48, 48)]))
+
+            quantized = image.convert("RGB").quantize(colors=5)
+            palette = quantized.getpalette()
+            total = image.width * image.height
+            colors = [
+                {
+                    "hex": "#{:02x}{:02x}{:02x}".format(*palette[index * 3:index * 3 + 3]),
+                    "share": round(count / total, 3),
+                }
+                for count, index in sorted(quantized.getcolors(), reverse=True)
+            ]
+        _write_atomic(palette_path, lambda f: f.write(json.dumps(colors).encode()))
+
+    artifacts = {"original.png": original_path, "favicon.ico": os.path.join(cache_dir, "favicon.ico")}
+    for size in LOGO_SIZES:
+        artifacts[f"logo-{size}.png"] = os.path.join(cache_dir, f"logo-{size}.png")
+    with open(palette_path) as f:
+        artifacts["palette"] = json.load(f)
+    return artifacts
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def brand_bundle(brand_id: str) -> tuple[str, Iterator[bytes]] | None:
+    """
+    Streams a zip of the brand kit: logo derivatives, a colors/typography
+    JSON, the tagline and a manifest of generated video links.
+
+    Returns:
+        tuple | None: (filename, iterator of zip chunks), or None if the brand is unknown.
+    """
+    brand = brand_store.get_brand(brand_id)
+    if brand is None:
+        return None
+
+    slug = re.sub(r"[^a-z0-9-]", "-", (brand["brand_name"] or "brand").strip().lower())
+    served = [c for c in brand["logo_candidates"] if c["served"]]
+    logo = served[-1] if served else None
+
+    def entries():
+        artifacts = _logo_artifacts(logo) if logo else {"palette": []}
+        for name, path in artifacts.items():
+            if name != "palette":
+                yield f"logo/{name}", path, zipfile.ZIP_STORED
+
+        style = {
+            "brand_name": brand["brand_name"],
+            "colors": artifacts["palette"],
+            "typography": brand["data"].get("typography") or DEFAULT_TYPOGRAPHY,
+        }
+        yield "brand.json", json.dumps(style, indent=2).encode(), zipfile.ZIP_DEFLATED
+        yield "tagline.txt", (brand["tagline"] or "").encode(), zipfile.ZIP_DEFLATED
+
+        manifest = {"videos": [
+            {"url": v["url"], "created_at": v.get("created_at")} for v in brand["data"].get("videos", [])
+        ]}
+        yield "videos.json", json.dumps(manifest, indent=2).encode(), zipfile.ZIP_DEFLATED
+
+    return f"{slug}-brand-kit.zip", stream_zip(entries())
+
@@ -1,11 +1,238 @@
 from src.models.docs import LegalDocsInput, LegalDocsOutput, LegalDocument
 from src.utils.create_gemini import create_gemini_client
+from src.utils.pdf_renderer import TEMPLATE_VERSION, submit_bundle_render, submit_document_render
+from src.utils.render_cache import content_key, get_render_cache
+from src.utils.legal_template_store import get_template, save_templates
+from src.utils.placeholder_fill import fill_placeholders, find_placeholders
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from urllib.parse import quote
 import json
 import base64
 import os
-import tempfile 
+import re
+import unicodedata
+
+PLACEHOLDER_CHOICES = ['Company Name','Store Name','Website URL','Contact Email','Physical Address','Effective Date','Governing Law','DMCA Agent Email']
+
+# Document types available to the per-document generation mode
+LEGAL_DOC_TYPES = {
+    "privacy_policy_bootstrap": {
+        "title": "Privacy Policy",
+        "defaults": "collects ['account info','order details','payment tokens (via processor)','basic analytics']; cookies = 'essential + analytics'; sell_data = false; share_with = ['payment processors','shipping carriers','analytics providers']; retention = 'as long as needed for orders and legal obligations'.",
+    },
+    "website_terms_bootstrap": {
+        "title": "Website Terms of Use",
+        "defaults": "license = 'limited, revocable, non-transferable'; liability_cap = 'amount paid in last 12 months'; arbitration = true; class_waiver = true.",
+    },
+    "refund_policy_bootstrap": {
+        "title": "Refund Policy",
+        "defaults": "return_window = '30 days from delivery'; condition = 'unused, in original packaging'; refund_method = 'original payment method'; return_shipping = 'paid by customer unless item is defective'; exclusions = ['final sale items','gift cards','perishables'].",
+    },
+    "nda_bootstrap": {
+        "title": "Mutual Non-Disclosure Agreement",
+        "defaults": "type = 'mutual'; term = '2 years'; confidentiality_survives = '3 years after termination'; exclusions = ['public information','independently developed','rightfully received from third parties']; remedies = 'injunctive relief available'.",
+    },
+}
+DEFAULT_DOC_TYPES = [
+    t.strip() for t in os.getenv("LEGAL_DOC_TYPES", "privacy_policy_bootstrap,website_terms_bootstrap").split(",") if t.strip()
+]
+
+def _clean_json(text: str) -> str:
+    """Remove markdown code fences around a JSON answer"""
+    cleaned = text.strip()
+    if cleaned.startswith('```json'):
+        cleaned = cleaned.replace('```json', '').replace('```', '').strip()
+    elif cleaned.startswith('```'):
+        cleaned = cleaned.replace('```', '').strip()
+    return cleaned
+
+def _single_doc_prompt(idea: str, doc_type: str) -> str:
+    spec = LEGAL_DOC_TYPES[doc_type]
+    return f"""
+        You are a legal-docs drafting assistant for a simple online store MVP.
+
+        Input: a one-sentence business idea.
+        Output: exactly one JSON object for a {spec['title']}. Do not include explanations, comments, or extra keys outside the schema.
+
+        Rules:
+        - Infer the store name and what it sells from the idea; if missing, set [Store Name] and keep content generic.
+        - Use conservative, jurisdiction-agnostic defaults; add placeholders where needed.
+        - Write content in Markdown, with clear headings and short sections.
+
+        The JSON object follows this schema:
+        doc_type: '{doc_type}'
+        title: human-readable title
+        summary: 1–2 sentence purpose
+        placeholders: array of strings chosen from {PLACEHOLDER_CHOICES}
+        defaults_used: small object listing key defaults applied
+        content: Markdown string (no code fences)
+
+        Defaults: {spec['defaults']}
+
+        Now generate the output for this idea:
+        IDEA: {idea}
+    """
+
+def generate_legal_doc(idea: str, doc_type: str) -> dict:
+    """Generate one legal document with its own LLM call and validate it against LegalDocument"""
+    _, client = create_gemini_client()
+    response = client.generate_content(_single_doc_prompt(idea, doc_type))
+
+    cleaned = _clean_json(response.text)
+    doc_data = json.loads(cleaned[cleaned.find('{'):cleaned.rfind('}') + 1])
+    doc_data['doc_type'] = doc_type
+    return LegalDocument(**doc_data).dict()
+
+def iter_generated_docs(idea: str, doc_types: list):
+    """
+    Generate each document type concurrently, yielding (doc_type, doc, error)
+    as soon as each one arrives. Exactly one of doc/error is set.
+    """
+    unknown = [t for t in doc_types if t not in LEGAL_DOC_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown legal doc types: {unknown}")
+
+    with ThreadPoolExecutor(max_workers=max(1, len(doc_types))) as pool:
+        futures = {pool.submit(generate_legal_doc, idea, doc_type): doc_type for doc_type in doc_types}
+        for future in as_completed(futures):
+            doc_type = futures[future]
+            try:
+                yield doc_type, future.result(), None
+            except Exception as e:
+                print(f"Error generating {doc_type}: {e}")
+                yield doc_type, None, str(e)
+
+def generate_legal_docs_parallel(idea: str, doc_types: list = None, combined_pdf: bool = False) -> dict:
+    """
+    Generate legal docs with one smaller LLM call per document type. A bad
+    answer only fails its own document, and each PDF render starts as soon as
+    its document arrives (or, with combined_pdf, all documents are rendered
+    together in one pass once they have all arrived).
+    """
+    doc_types = doc_types or DEFAULT_DOC_TYPES
+    docs = {}
+    renders = {}
+    errors = []
+    for doc_type, doc, error in iter_generated_docs(idea, doc_types):
+        if error:
+            errors.append({"doc_type": doc_type, "error": error})
+            continue
+        docs[doc_type] = doc
+        if not combined_pdf:
+            renders[doc_type] = _submit_pdf_render(doc)
+
+    ordered = [t for t in doc_types if t in docs]
+    result = {
+        "docs": json.dumps([docs[t] for t in ordered]),
+        "errors": errors or None,
+        "templates": _save_templates([docs[t] for t in ordered]),
+    }
+    if combined_pdf and ordered:
+        result["combined_pdf"], result["pdfs"] = create_combined_pdf([docs[t] for t in ordered])
+    else:
+        result["pdfs"] = [_pdf_result(docs[t], renders[t]) for t in ordered]
+    return result
+
+def iter_legal_doc_events(idea: str, doc_types: list = None):
+    """
+    Generate and render legal docs, yielding an event dict as each step
+    finishes: `document` when a document's markdown is ready, `pdf` when its
+    PDF is rendered (as a render-cache artifact reference, not inline data),
+    `error` for a failed step, then `done`.
+    """
+    doc_types = doc_types or DEFAULT_DOC_TYPES
+    unknown = [t for t in doc_types if t not in LEGAL_DOC_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown legal doc types: {unknown}")
+
+    yield {"event": "start", "doc_types": doc_types}
+    with ThreadPoolExecutor(max_workers=max(1, len(doc_types))) as pool:
+        # future -> (stage, doc_type, doc)
+        pending = {
+            pool.submit(generate_legal_doc, idea, doc_type): ("generate", doc_type, None)
+            for doc_type in doc_types
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, doc_type, doc = pending.pop(future)
+                if future.exception() is not None:
+                    print(f"Error during {stage} of {doc_type}: {future.exception()}")
+                    yield {"event": "error", "stage": stage, "doc_type": doc_type, "error": str(future.exception())}
+                elif stage == "generate":
+                    doc = future.result()
+                    pending[_submit_pdf_render(doc)] = ("render", doc_type, doc)
+                    templates = _save_templates([doc])
+                    yield {
+                        "event": "document",
+                        "doc_type": doc_type,
+                        "document": doc,
+                        "template_id": templates[0]["template_id"] if templates else None,
+                    }
+                else:
+                    key = pdf_cache_key(doc)
+                    yield {
+                        "event": "pdf",
+                        "doc_type": doc_type,
+                        "title": doc['title'],
+                        "filename": pdf_filename(doc['title']),
+                        "size": len(future.result()),
+                        "artifact": key,
+                        "pdf_url": f"/api/legal/pdf/{key}",
+                    }
+    yield {"event": "done"}
+
+def _save_templates(docs_data: list) -> list:
+    """Keep generated documents as fillable templates; returns a summary per template"""
+    try:
+        template_ids = save_templates(docs_data)
+    except Exception as e:
+        print(f"Error saving legal templates: {e}")
+        return []
+    return [
+        {
+            "template_id": template_id,
+            "doc_type": doc['doc_type'],
+            "title": doc['title'],
+            "placeholders": find_placeholders(doc['title'] + doc['summary'] + doc['content']),
+        }
+        for template_id, doc in zip(template_ids, docs_data)
+    ]
+
+def fill_template(template_id: str, values: dict) -> dict | None:
+    """A stored template with tenant placeholder values substituted, or None if unknown"""
+    template = get_template(template_id)
+    if template is None:
+        return None
+    doc = dict(template)
+    for field in ('title', 'summary', 'content'):
+        doc[field] = fill_placeholders(template[field], values)
+    doc['unfilled'] = find_placeholders(doc['title'] + doc['summary'] + doc['content'])
+    return doc
+
+def render_filled_template(template_id: str, values: dict) -> tuple | None:
+    """
+    Fill a stored template and render it. Renders go through the render cache,
+    so each tenant variant is laid out once; no LLM call is made.
+
+    Returns:
+        tuple | None: (filled document, PDF bytes), or None if the template is unknown.
+    """
+    doc = fill_template(template_id, values)
+    if doc is None:
+        return None
+    return doc, _submit_pdf_render(doc).result()
+
+def get_cached_pdf(key: str) -> bytes | None:
+    """Rendered PDF bytes for an artifact key returned by the streaming endpoint"""
+    return get_render_cache().get(key)
 
 def generate_legal_docs(input_data: dict) -> dict:
+    if input_data.get('mode') == 'parallel':
+        return generate_legal_docs_parallel(
+            input_data['idea'], input_data.get('doc_types'), input_data.get('combined_pdf', False)
+        )
+
     prompt = f"""
         You are a legal-docs drafting assistant for a simple online store MVP. 
 
@@ -32,152 +259,155 @@ def generate_legal_docs(input_data: dict) -> dict:
         Now generate the output for this idea:
         IDEA: {input_data['idea']}
     """
-    MODEL, client = create_gemini_client()
+    _, client = create_gemini_client()
 
-    response = client.models.generate_content(
-        model=MODEL,
-        contents=prompt,
-    )
+    response = client.generate_content(prompt)
 
     # Parse the JSON response
     try:
         # Clean the response - remove markdown code blocks if present
-        cleaned_docs = response.text.strip()
-        if cleaned_docs.startswith('```json'):
-            cleaned_docs = cleaned_docs.replace('```json', '').replace('```', '').strip()
-        elif cleaned_docs.startswith('```'):
-            cleaned_docs = cleaned_docs.replace('```', '').strip()
-        
+        cleaned_docs = _clean_json(response.text)
+
         # Find JSON array
         json_start = cleaned_docs.find('[')
         json_end = cleaned_docs.rfind(']') + 1
         json_string = cleaned_docs[json_start:json_end]
         
         docs_data = json.loads(json_string)
+        templates = _save_templates(docs_data)
         
-        # Generate PDFs for each document
-        pdfs = []
-        for doc_data in docs_data:
-            pdf_info = create_pdf_from_doc(doc_data)
-            pdfs.append(pdf_info)
+        if input_data.get('combined_pdf'):
+            # One layout pass for every document, with per-document extraction
+            combined, pdfs = create_combined_pdf(docs_data)
+            return {
+                "docs": response.text,
+                "pdfs": pdfs,
+                "combined_pdf": combined,
+                "templates": templates
+            }
+
+        # Generate PDFs for each document in parallel
+        pdfs = create_pdfs_from_docs(docs_data)
         
         return {
             "docs": response.text,
-            "pdfs": pdfs
+            "pdfs": pdfs,
+            "templates": templates
         }
         
     except Exception as e:
         print(f"Error processing legal docs: {e}")
         return { "docs": response.text }
 
+def create_pdfs_from_docs(docs_data: list) -> list:
+    """Render several legal documents concurrently across the PDF renderer pool"""
+    pending = [(doc_data, _submit_pdf_render(doc_data)) for doc_data in docs_data]
+    return [_pdf_result(doc_data, future) for doc_data, future in pending]
+
+def create_combined_pdf(docs_data: list, title: str = "Legal Documents") -> tuple:
+    """
+    Render all documents into one PDF in a single layout pass (table of
+    contents, bookmarks, shared font subsets) and extract each document's
+    pages from the same layout.
+
+    Returns:
+        tuple: (combined pdf info, list of per-document pdf infos)
+    """
+    docs = [(d['title'], d['summary'], d['content']) for d in docs_data]
+    key = content_key(TEMPLATE_VERSION, "bundle", title, docs)
+    cache = get_render_cache()
+    doc_keys = [content_key(key, i) for i in range(len(docs))]
+
+    combined = cache.get(key)
+    documents = [cache.get(k) for k in doc_keys] if combined is not None else [None]
+    if combined is None or any(d is None for d in documents):
+        try:
+            rendered = submit_bundle_render(title, docs).result()
+        except Exception as e:
+            print(f"Error creating combined PDF: {e}")
+            failed = Future()
+            failed.set_exception(e)
+            return _pdf_result({"title": title}, failed), create_pdfs_from_docs(docs_data)
+        combined, documents = rendered["combined"], rendered["documents"]
+        cache.put(key, combined)
+        for doc_key, pdf_data in zip(doc_keys, documents):
+            cache.put(doc_key, pdf_data)
+
+    def resolved(pdf_data: bytes) -> Future:
+        future = Future()
+        future.set_result(pdf_data)
+        return future
+
+    return (
+        _pdf_result({"title": title}, resolved(combined)),
+        [_pdf_result(doc_data, resolved(pdf_data)) for doc_data, pdf_data in zip(docs_data, documents)],
+    )
+
 def create_pdf_from_doc(doc_data: dict) -> dict:
     """Convert a legal document to PDF and return base64 encoded data"""
+    return _pdf_result(doc_data, _submit_pdf_render(doc_data))
+
+def render_doc_pdf(doc_data: dict) -> bytes:
+    """Render a legal document and return the raw PDF bytes, without base64 or temp files"""
+    return _submit_pdf_render(doc_data).result()
+
+def pdf_cache_key(doc_data: dict) -> str:
+    return content_key(TEMPLATE_VERSION, doc_data['title'], doc_data['summary'], doc_data['content'])
+
+def pdf_filename(title: str) -> str:
+    return f"{title.replace(' ', '_').lower()}.pdf"
+
+def pdf_content_disposition(title: str) -> str:
+    """Content-Disposition for a rendered PDF: an ASCII filename plus the UTF-8 one (RFC 6266) for any title"""
+    filename = pdf_filename(title)
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode()
+    ascii_name = re.sub(r'[^\w.-]', '_', ascii_name)
+    if ascii_name == ".pdf":
+        ascii_name = "document.pdf"
+    return f"inline; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def _submit_pdf_render(doc_data: dict) -> Future:
+    """Serve from the render cache when possible, otherwise queue a render and cache the result"""
     try:
-        import markdown
-        from weasyprint import HTML
-        from weasyprint.text.fonts import FontConfiguration
-
-        # Convert markdown to HTML
-        html_content = markdown.markdown(
-            doc_data['content'],
-            extensions=['tables', 'fenced_code', 'toc']
-        )
-        
-        # Create a complete HTML document with styling
-        html_document = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>{doc_data['title']}</title>
-            <style>
-                body {{
-                    font-family: 'Times New Roman', serif;
-                    line-height: 1.6;
-                    max-width: 800px;
-                    margin: 0 auto;
-                    padding: 40px 20px;
-                    color: #333;
-                }}
-                h1 {{
-                    color: #2c3e50;
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 10px;
-                    margin-bottom: 30px;
-                }}
-                h2 {{
-                    color: #34495e;
-                    margin-top: 30px;
-                    margin-bottom: 15px;
-                }}
-                h3 {{
-                    color: #7f8c8d;
-                    margin-top: 20px;
-                    margin-bottom: 10px;
-                }}
-                p {{
-                    margin-bottom: 15px;
-                    text-align: justify;
-                }}
-                ul, ol {{
-                    margin-bottom: 15px;
-                    padding-left: 30px;
-                }}
-                li {{
-                    margin-bottom: 5px;
-                }}
-                strong {{
-                    font-weight: bold;
-                }}
-                em {{
-                    font-style: italic;
-                }}
-                .summary {{
-                    background-color: #f8f9fa;
-                    padding: 15px;
-                    border-left: 4px solid #3498db;
-                    margin-bottom: 30px;
-                    font-style: italic;
-                }}
-                @page {{
-                    margin: 1in;
-                    size: A4;
-                }}
-            </style>
-        </head>
-        <body>
-            <h1>{doc_data['title']}</h1>
-            <div class="summary">
-                <strong>Summary:</strong> {doc_data['summary']}
-            </div>
-            {html_content}
-        </body>
-        </html>
-        """
-        
-        # Generate PDF using WeasyPrint
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-            font_config = FontConfiguration()
-            HTML(string=html_document).write_pdf(
-                temp_file.name,
-                font_config=font_config
-            )
-            
-            # Read the PDF file and encode as base64
-            with open(temp_file.name, 'rb') as pdf_file:
-                pdf_data = pdf_file.read()
-                pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
-            
-            # Clean up temp file
-            os.unlink(temp_file.name)
-            
-            return {
-                "title": doc_data['title'],
-                "filename": f"{doc_data['title'].replace(' ', '_').lower()}.pdf",
-                "pdf_data": pdf_base64,
-                "size": len(pdf_data)
-            }
-            
+        cache = get_render_cache()
+        key = pdf_cache_key(doc_data)
+        cached = cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        # Resolve only once the result is cached, so an immediate re-render hits
+        cached_future = Future()
+
+        def cache_result(done: Future) -> None:
+            try:
+                pdf_data = done.result()
+                cache.put(key, pdf_data)
+                cached_future.set_result(pdf_data)
+            except Exception as e:
+                cached_future.set_exception(e)
+
+        submit_document_render(doc_data['title'], doc_data['summary'], doc_data['content']).add_done_callback(cache_result)
+        return cached_future
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+def _pdf_result(doc_data: dict, future: Future) -> dict:
+    try:
+        # Generate PDF using the WeasyPrint worker pool
+        pdf_data = future.result()
+        pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
+
+        return {
+            "title": doc_data['title'],
+            "filename": pdf_filename(doc_data['title']),
+            "pdf_data": pdf_base64,
+            "size": len(pdf_data)
+        }
+
     except Exception as e:
         print(f"Error creating PDF for {doc_data.get('title', 'Unknown')}: {e}")
         return {
@@ -0,0 +1,509 @@
+import asyncio
+import html
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from src.utils.catalog_mirror import get_catalog_mirror
+from src.utils.shopify_client import admin_graphql, get_shop_client
+from src.utils.shopify_throttle import BACKGROUND, estimate_query_cost
+
+load_dotenv()
+BULK_POLL_SECONDS = float(os.getenv("SHOPIFY_BULK_POLL_SECONDS", "1.0"))
+BULK_POLL_MAX_SECONDS = float(os.getenv("SHOPIFY_BULK_POLL_MAX_SECONDS", "10.0"))
+BULK_TIMEOUT_SECONDS = float(os.getenv("SHOPIFY_BULK_TIMEOUT_SECONDS", str(2 * 3600)))
+EXPORT_PAGE_SIZE = int(os.getenv("SHOPIFY_EXPORT_PAGE_SIZE", "250"))
+# Pages fetched ahead of the consumer; bounds export memory to this many pages
+EXPORT_PREFETCH_PAGES = int(os.getenv("SHOPIFY_EXPORT_PREFETCH_PAGES", "2"))
+# Shopify rejects any single query whose requested cost exceeds this
+MAX_QUERY_COST = 1000
+# Reads from a mirror older than this start an incremental sync in the background
+CATALOG_MAX_AGE_SECONDS = float(os.getenv("CATALOG_MAX_AGE_SECONDS", "600"))
+CATALOG_WEBHOOK_TOPICS = ("PRODUCTS_CREATE", "PRODUCTS_UPDATE", "PRODUCTS_DELETE")
+
+STAGED_UPLOADS_CREATE = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+BULK_RUN_MUTATION = """
+mutation bulkOperationRunMutation($mutation: String!, $stagedUploadPath: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+BULK_OPERATION_STATUS = """
+query bulkOperation($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+"""
+
+# Runs once per JSONL line; each line holds the $input variables
+PRODUCT_SET_MUTATION = """
+mutation call($input: ProductSetInput!) {
+  productSet(synchronous: true, input: $input) {
+    product { id title }
+    userErrors { field message }
+  }
+}
+"""
+
+WEBHOOK_SUBSCRIPTION_CREATE = """
+mutation webhookSubscriptionCreate($topic: WebhookSubscriptionTopic!, $callbackUrl: URL!) {
+  webhookSubscriptionCreate(topic: $topic, webhookSubscription: { callbackUrl: $callbackUrl, format: JSON }) {
+    webhookSubscription { id }
+    userErrors { field message }
+  }
+}
+"""
+
+FINAL_BULK_STATUSES = {"COMPLETED", "FAILED", "CANCELED", "EXPIRED"}
+
+EXPORT_QUERIES = {
+    "products": """
+query export($first: Int!, $after: String, $query: String) {
+  products(first: $first, after: $after, query: $query) {
+    edges {
+      node {
+        id title handle status vendor productType tags descriptionHtml createdAt updatedAt
+        variants(first: 10) {
+          edges { node { id sku price inventoryQuantity } }
+          pageInfo { hasNextPage endCursor }
+        }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+""",
+    "orders": """
+query export($first: Int!, $after: String, $query: String) {
+  orders(first: $first, after: $after, query: $query) {
+    edges {
+      node {
+        id name email createdAt updatedAt displayFinancialStatus displayFulfillmentStatus
+        totalPriceSet { shopMoney { amount currencyCode } }
+        customer { id }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+""",
+    "customers": """
+query export($first: Int!, $after: String, $query: String) {
+  customers(first: $first, after: $after, query: $query) {
+    edges {
+      node {
+        id firstName lastName email phone createdAt updatedAt numberOfOrders
+        amountSpent { amount currencyCode }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+""",
+}
+
+# Rest of a product's variants, for the few products with more than fit in the export page
+PRODUCT_VARIANTS_QUERY = """
+query productVariants($id: ID!, $first: Int!, $after: String) {
+  product(id: $id) {
+    variants(first: $first, after: $after) {
+      edges { node { id sku price inventoryQuantity } }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+VARIANT_PAGE_SIZE = 250
+
+class ShopifyUserError(ValueError):
+    """Shopify rejected the request (GraphQL errors or userErrors)."""
+
+def normalize_updated_since(value: Optional[str]) -> Optional[str]:
+    """An ISO 8601 `updated_since` as a UTC timestamp for Shopify's search syntax (naive values are UTC)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ShopifyUserError(f"updated_since is not an ISO 8601 timestamp: {value!r}") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _check(response: dict, field: str) -> dict:
+    if response.get("errors"):
+        raise ShopifyUserError("; ".join(error.get("message", str(error)) for error in response["errors"]))
+    data = (response.get("data") or {}).get(field) or {}
+    if data.get("userErrors"):
+        raise ShopifyUserError("; ".join(error["message"] for error in data["userErrors"]))
+    return data
+
+def product_set_input(product: dict) -> dict:
+    """Our flat product fields -> ProductSetInput with a single default variant."""
+    product_input = {
+        "title": product["title"],
+        "productOptions": [{"name": "Title", "values": [{"name": "Default Title"}]}],
+        "variants": [{
+            "optionValues": [{"optionName": "Title", "name": "Default Title"}],
+            "price": f"{product['price']:.2f}",
+        }],
+    }
+    if product.get("description"):
+        # The description is plain text; escape it so it cannot inject markup into the storefront
+        product_input["descriptionHtml"] = f"<p>{html.escape(product['description'])}</p>"
+    if product.get("sku"):
+        product_input["variants"][0]["sku"] = product["sku"]
+    for field, key in (("vendor", "vendor"), ("product_type", "productType"), ("tags", "tags"), ("status", "status")):
+        if product.get(field):
+            product_input[key] = product[field]
+    return product_input
+
+async def _stage_jsonl(shop: str, access_token: str, jsonl: bytes) -> str:
+    """Upload the variables file to Shopify's staged upload target and return its key."""
+    staged = _check(await admin_graphql(shop, access_token, STAGED_UPLOADS_CREATE, {
+        "input": [{
+            "resource": "BULK_MUTATION_VARIABLES",
+            "filename": "products.jsonl",
+            "mimeType": "text/jsonl",
+            "httpMethod": "POST",
+        }],
+    }), "stagedUploadsCreate")
+    target = staged["stagedTargets"][0]
+    parameters = {parameter["name"]: parameter["value"] for parameter in target["parameters"]}
+    response = await get_shop_client(shop).post(
+        target["url"],
+        data=parameters,
+        files={"file": ("products.jsonl", jsonl, "text/jsonl")},
+        timeout=300,
+    )
+    response.raise_for_status()
+    return parameters["key"]
+
+async def _wait_for_bulk_operation(shop: str, access_token: str, operation_id: str) -> AsyncIterator[dict]:
+    """Poll with backoff, yielding the operation each time its status or progress changes."""
+    delay = BULK_POLL_SECONDS
+    waited = 0.0
+    last = None
+    while True:
+        response = await admin_graphql(
+            shop, access_token, BULK_OPERATION_STATUS, {"id": operation_id}, priority=BACKGROUND
+        )
+        if response.get("errors"):
+            raise ShopifyUserError("; ".join(error.get("message", str(error)) for error in response["errors"]))
+        operation = response["data"]["node"]
+        progress = (operation["status"], operation.get("objectCount"))
+        if progress != last:
+            last = progress
+            yield operation
+        if operation["status"] in FINAL_BULK_STATUSES:
+            return
+        if waited > BULK_TIMEOUT_SECONDS:
+            raise TimeoutError(f"Bulk operation {operation_id} still {operation['status']} after {waited:.0f}s")
+        await asyncio.sleep(delay)
+        waited += delay
+        delay = min(delay * 1.5, BULK_POLL_MAX_SECONDS)
+
+async def _iter_results(shop: str, url: str) -> AsyncIterator[dict]:
+    async with get_shop_client(shop).stream("GET", url, timeout=300) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+async def iter_bulk_product_import(shop: str, access_token: str, products: List[dict]) -> AsyncIterator[dict]:
+    """
+    Create products with one Shopify bulk mutation, yielding NDJSON-ready
+    events: started, status (as the operation progresses), one row per
+    product in input order of completion, and done.
+    """
+    jsonl = "".join(json.dumps({"input": product_set_input(product)}) + "\n" for product in products).encode()
+    staged_upload_path = await _stage_jsonl(shop, access_token, jsonl)
+    run = _check(await admin_graphql(shop, access_token, BULK_RUN_MUTATION, {
+        "mutation": PRODUCT_SET_MUTATION,
+        "stagedUploadPath": staged_upload_path,
+    }), "bulkOperationRunMutation")
+    operation_id = run["bulkOperation"]["id"]
+    yield {"event": "started", "bulk_operation_id": operation_id, "rows": len(products), "bytes": len(jsonl)}
+
+    operation = None
+    async for operation in _wait_for_bulk_operation(shop, access_token, operation_id):
+        yield {"event": "status", "status": operation["status"], "object_count": operation.get("objectCount")}
+
+    created = failed = 0
+    results_url = operation.get("url") or operation.get("partialDataUrl")
+    if results_url:
+        async for result in _iter_results(shop, results_url):
+            line = result.get("__lineNumber")
+            product_set = (result.get("data") or {}).get("productSet") or {}
+            errors = [error["message"] for error in product_set.get("userErrors") or []]
+            errors += [error.get("message", str(error)) for error in result.get("errors") or []]
+            product = product_set.get("product")
+            if product and not errors:
+                created += 1
+            else:
+                failed += 1
+            yield {
+                "event": "row",
+                "line": line,
+                "title": products[line]["title"] if isinstance(line, int) and line < len(products) else None,
+                "product_id": product["id"] if product else None,
+                "errors": errors,
+            }
+
+    yield {
+        "event": "done",
+        "status": operation["status"],
+        "error_code": operation.get("errorCode"),
+        "created": created,
+        "failed": failed,
+        "missing": len(products) - created - failed,
+    }
+
+def _flatten(value):
+    """Replace GraphQL connections ({"edges": [{"node": ...}], "pageInfo": ...}) with plain lists."""
+    if isinstance(value, dict):
+        if "edges" in value and set(value) <= {"edges", "pageInfo"}:
+            return [_flatten(edge["node"]) for edge in value["edges"]]
+        return {key: _flatten(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_flatten(item) for item in value]
+    return value
+
+def export_page_size(resource: str, requested: Optional[int] = None) -> int:
+    """The requested page size (max 250), cut down so one page stays under MAX_QUERY_COST."""
+    query = EXPORT_QUERIES[resource]
+    one, two = (estimate_query_cost(query, {"first": n}) for n in (1, 2))
+    per_node = max(two - one, 1)
+    fits = (MAX_QUERY_COST - (one - per_node)) // per_node
+    return max(1, min(requested or EXPORT_PAGE_SIZE, 250, fits))
+
+async def _fetch_remaining_variants(shop: str, access_token: str, product: dict) -> None:
+    """Extend product["variants"] in place with the pages the export query left out."""
+    variants = product["variants"]
+    while variants["pageInfo"]["hasNextPage"]:
+        response = await admin_graphql(shop, access_token, PRODUCT_VARIANTS_QUERY, {
+            "id": product["id"], "first": VARIANT_PAGE_SIZE, "after": variants["pageInfo"]["endCursor"],
+        }, priority=BACKGROUND)
+        if response.get("errors"):
+            raise ShopifyUserError("; ".join(error.get("message", str(error)) for error in response["errors"]))
+        page = ((response["data"] or {}).get("product") or {}).get("variants")
+        if page is None:
+            # Deleted since the export page was read
+            return
+        variants["edges"] += page["edges"]
+        variants["pageInfo"] = page["pageInfo"]
+
+async def _iter_pages(shop: str, access_token: str, resource: str, page_size: int,
+                      updated_since: Optional[str]) -> AsyncIterator[List[dict]]:
+    query = EXPORT_QUERIES[resource]
+    # Interpolated into the search query, so only a parsed timestamp goes in
+    updated_since = normalize_updated_since(updated_since)
+    variables = {"first": page_size, "after": None, "query": f"updated_at:>'{updated_since}'" if updated_since else None}
+    while True:
+        response = await admin_graphql(shop, access_token, query, variables, priority=BACKGROUND)
+        if response.get("errors"):
+            raise ShopifyUserError("; ".join(error.get("message", str(error)) for error in response["errors"]))
+        connection = response["data"][resource]
+        nodes = [edge["node"] for edge in connection["edges"]]
+        if resource == "products":
+            for node in nodes:
+                await _fetch_remaining_variants(shop, access_token, node)
+        yield [_flatten(node) for node in nodes]
+        if not connection["pageInfo"]["hasNextPage"]:
+            return
+        variables["after"] = connection["pageInfo"]["endCursor"]
+
+async def iter_export_pages(shop: str, access_token: str, resource: str, page_size: Optional[int] = None,
+                            updated_since: Optional[str] = None,
+                            prefetch: int = EXPORT_PREFETCH_PAGES) -> AsyncIterator[List[dict]]:
+    """
+    Walk every page of `resource` (products, orders or customers), optionally
+    only those updated after `updated_since`. Up to `prefetch` pages are
+    fetched while the caller works on the current one; once that many are
+    waiting, fetching stops until the caller catches up.
+    """
+    pages = _iter_pages(shop, access_token, resource, export_page_size(resource, page_size), updated_since)
+    if prefetch <= 0:
+        async for page in pages:
+            yield page
+        return
+
+    queue = asyncio.Queue(maxsize=prefetch)
+
+    async def produce() -> None:
+        try:
+            async for page in pages:
+                await queue.put(page)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            page = await queue.get()
+            if page is None:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        producer.cancel()
+
+async def register_catalog_webhooks(shop: str, access_token: str) -> None:
+    """Subscribe APP_URL/api/shopify/webhooks to product changes (no-op without APP_URL)."""
+    app_url = os.getenv("APP_URL")
+    if not app_url:
+        return
+    for topic in CATALOG_WEBHOOK_TOPICS:
+        response = await admin_graphql(shop, access_token, WEBHOOK_SUBSCRIPTION_CREATE, {
+            "topic": topic,
+            "callbackUrl": f"{app_url.rstrip('/')}/api/shopify/webhooks",
+        }, priority=BACKGROUND)
+        errors = ((response.get("data") or {}).get("webhookSubscriptionCreate") or {}).get("userErrors") or []
+        errors += response.get("errors") or []
+        # "Address for this topic has already been taken" just means we subscribed before
+        errors = [error["message"] for error in errors if "already been taken" not in error.get("message", "")]
+        if errors:
+            print(f"Webhook subscription {topic} for {shop} failed: {'; '.join(errors)}")
+
+async def sync_catalog(shop: str, access_token: str, full: bool = False) -> dict:
+    """
+    Bring the shop's catalog mirror up to date: a full load the first time
+    (or when `full`), which also drops products no longer in Shopify and
+    subscribes to product webhooks, and otherwise only products updated
+    since the last sync.
+    """
+    mirror = get_catalog_mirror(shop)
+    cursor = None if full else mirror.sync_cursor()
+    started = time.time()
+    synced = 0
+    seen = set()
+    async for page in iter_export_pages(shop, access_token, "products", updated_since=cursor):
+        await asyncio.to_thread(mirror.upsert_products, page)
+        synced += len(page)
+        if cursor is None:
+            seen.update(product["id"] for product in page)
+    deleted = 0
+    if cursor is None:
+        deleted = await asyncio.to_thread(mirror.delete_products, list(mirror.product_ids() - seen))
+        await asyncio.to_thread(mirror.optimize)
+        await register_catalog_webhooks(shop, access_token)
+    mirror.finish_sync(started)
+    return {
+        "mode": "incremental" if cursor else "full",
+        "updated_since": cursor,
+        "synced": synced,
+        "deleted": deleted,
+        "seconds": round(time.time() - started, 3),
+    }
+
+# shop -> (latest sync task, whether it is a full sync)
+_catalog_syncs: Dict[str, Tuple[asyncio.Task, bool]] = {}
+
+async def _full_sync_after(previous: asyncio.Task, shop: str, access_token: str) -> dict:
+    # wait() rather than gather(): cancelling this sync must not cancel the one it queued behind
+    await asyncio.wait([previous])
+    return await sync_catalog(shop, access_token, full=True)
+
+def start_catalog_sync(shop: str, access_token: str, full: bool = False) -> asyncio.Task:
+    """
+    The shop's running sync, or a new one; concurrent callers share a single
+    sync. A full sync requested while an incremental one runs is queued to
+    start as soon as it finishes, and later callers share the full one.
+    """
+    running = _catalog_syncs.get(shop)
+    if running is not None and not running[0].done():
+        task, running_full = running
+        if running_full or not full:
+            return task
+        task = asyncio.create_task(_full_sync_after(task, shop, access_token))
+    else:
+        task = asyncio.create_task(sync_catalog(shop, access_token, full))
+    task.add_done_callback(_log_sync_failure)
+    _catalog_syncs[shop] = (task, full)
+    return task
+
+def _log_sync_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Catalog sync failed: {task.exception()}")
+
+def catalog_syncing(shop: str) -> bool:
+    running = _catalog_syncs.get(shop)
+    return running is not None and not running[0].done()
+
+def refresh_catalog_if_stale(shop: str, access_token: Optional[str]) -> None:
+    """Start a background incremental sync when the mirror is older than CATALOG_MAX_AGE_SECONDS."""
+    if not access_token or catalog_syncing(shop):
+        return
+    last_synced = get_catalog_mirror(shop).last_synced()
+    if last_synced is None or time.time() - last_synced > CATALOG_MAX_AGE_SECONDS:
+        start_catalog_sync(shop, access_token)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Product export throughput and memory against the local stand-in")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Shopify server time per page")
+    parser.add_argument("--consumer-ms", type=float, default=50, help="time the client takes to take one page")
+    args = parser.parse_args()
+
+    from src.dev.shopify_standin import serve
+    from src.utils import shopify_client
+    # Shopify Plus sized buckets so the comparison is about pagination, not throttling
+    stores = {
+        count: serve(port=0, bucket=20000, restore_rate=1000, latency_ms=args.latency_ms, products=count)
+        for count in (args.products, args.products * 4)
+    }
+    shop = "bench.myshopify.com"
+
+    async def export(count: int, prefetch: int, collect: bool) -> tuple:
+        """Stream (or collect, as a list-building endpoint would) a `count` product catalog; returns (seconds, peak MiB)."""
+        shopify_client.SHOPIFY_BASE_URL = f"http://127.0.0.1:{stores[count].server_address[1]}"
+        await admin_graphql(shop, "t", "{ shop { name } }")
+        tracemalloc.start()
+        start = time.perf_counter()
+        collected = []
+        async for page in iter_export_pages(shop, "t", "products", prefetch=prefetch):
+            chunk = "".join(json.dumps(item) + "\n" for item in page)
+            if collect:
+                collected.append(chunk)
+            await asyncio.sleep(args.consumer_ms / 1000)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        return elapsed, peak
+
+    async def main() -> None:
+        size = export_page_size("products")
+        print(f"{args.latency_ms:.0f} ms per page from Shopify, {args.consumer_ms:.0f} ms per page to the client, "
+              f"{size} products per page")
+        for name, count, prefetch, collect in (
+            ("sequential", args.products, 0, False),
+            ("prefetch 2", args.products, 2, False),
+            ("prefetch 2, 4x catalog", args.products * 4, 2, False),
+            ("collected in memory", args.products, 2, True),
+            ("collected, 4x catalog", args.products * 4, 2, True),
+        ):
+            elapsed, peak = await export(count, prefetch, collect)
+            print(f"{name:>24}: {count} products in {elapsed:5.2f} s ({count / elapsed:4.0f}/s), peak {peak:5.1f} MiB")
+        await shopify_client.close_shop_clients()
+
+    asyncio.run(main())
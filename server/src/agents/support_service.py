@@ -1,47 +1,140 @@
 import os
 from dotenv import load_dotenv
-from agentmail import AgentMail
 import json
+import time
 from email.utils import parseaddr
+from src.utils.create_agentmail import create_agentmail_client
 from src.utils.create_gemini import create_gemini_client
+from src.utils.email_outbox import get_outbox
+from src.utils.email_queue import UnprocessableEmail
+from src.utils.faq_index import get_faq_responder
+from src.utils.placeholder_fill import fill_placeholders, find_placeholders
+from src.utils.reply_templates import (
+    INTENT_DESCRIPTIONS, classify_intent, extract_order_number, get_reply_template_cache,
+)
+from src.utils.thread_context import get_thread_context_cache
 
 load_dotenv()
 
-def respond_to_support_email(body):
-    api_key = os.getenv("AGENT_MAIL_API_KEY")
-    if not api_key:
-        print("AGENT_MAIL_API_KEY not set. Cannot respond to email.")
-        return
-
-    client = AgentMail(api_key=api_key)
-    text = body.decode("utf-8")
-    payload = json.loads(text)
-
-    subject = payload['message']['subject']
-    sender = payload['message']['from_']
-    name, address = parseaddr(sender)
-    message_body = payload['message']['text']
+def _format_history(turns):
+    if not turns:
+        return ""
+    lines = [f"{'Customer' if turn['role'] == 'customer' else 'Support'}: {turn['text']}" for turn in turns]
+    return "Earlier messages in this conversation, oldest first:\n" + "\n---\n".join(lines) + "\n"
 
+async def _draft_reply(subject, name, address, message_body, history):
     prompt = f"""
         You are a customer support assistant for an e-commerce platform. A user has sent the following email:
         Subject: {subject}
         From: {name} <{address}>
         Message: {message_body}
+        {history}
         Please draft a polite and helpful response addressing their concerns. Keep the response concise and professional.
     """
 
+    start = time.perf_counter()
+    MODEL, gemini_client = create_gemini_client()
+    response = await gemini_client.generate_content_async(prompt)
+    get_faq_responder().record_llm(time.perf_counter() - start)
+    return response.text
+
+TEMPLATE_PLACEHOLDERS = {"Customer Name", "Order Number"}
+
+async def _draft_template(intent, subject, message_body):
+    prompt = f"""
+        You are a customer support assistant for an e-commerce platform. Write a reusable email reply for
+        customers writing about {INTENT_DESCRIPTIONS[intent]}.
+        Use the placeholder [Customer Name] for the customer's name and [Order Number] for their order number,
+        and do not mention any other customer-specific details. Use no other placeholders.
+        Here is an example of such an email, for tone only:
+        Subject: {subject}
+        Message: {message_body}
+        Return only the reply text. Keep it concise, polite and professional.
+    """
+
+    start = time.perf_counter()
     MODEL, gemini_client = create_gemini_client()
-    response = gemini_client.generate_content(prompt)
+    response = await gemini_client.generate_content_async(prompt)
+    get_faq_responder().record_llm(time.perf_counter() - start)
+    template = response.text.strip()
+    if not set(find_placeholders(template)) <= TEMPLATE_PLACEHOLDERS:
+        return None
+    return template
+
+async def _templated_reply(intent, store, subject, name, message_body):
+    """Reply from the intent's cached template (drafting it on first use), or None to fall back to the LLM."""
+    templates = get_reply_template_cache()
+    template = templates.get(intent, store)
+    order_number = extract_order_number(f"{subject}\n{message_body}")
+    if template is None:
+        # Drafted templates use [Order Number]; without one the draft could not be
+        # filled and the reply would cost a second LLM call
+        if not order_number:
+            return None
+        template = await _draft_template(intent, subject, message_body)
+        if template is None:
+            return None
+        templates.put(intent, store, template)
+
+    values = {"Customer Name": name or "there"}
+    if order_number:
+        values["Order Number"] = order_number
+    reply = fill_placeholders(template, values)
+    if find_placeholders(reply):
+        templates.record_unfillable()
+        return None
+    return reply
+
+async def respond_to_support_email(body):
+    api_key = os.getenv("AGENT_MAIL_API_KEY")
+    if not api_key:
+        print("AGENT_MAIL_API_KEY not set. Cannot respond to email.")
+        return
+
+    try:
+        payload = json.loads(body.decode("utf-8"))
+        subject = payload['message']['subject']
+        name, address = parseaddr(payload['message']['from_'])
+        message_body = payload['message']['text']
+        thread_id = payload['message'].get('thread_id')
+        message_id = payload['message'].get('message_id')
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        # Retrying cannot fix a malformed payload
+        raise UnprocessableEmail(f"Unparseable webhook payload: {e!r}") from e
+
+    # Prior turns come from the local cache, not another AgentMail round trip
+    thread_cache = get_thread_context_cache()
+    history = _format_history(thread_cache.history(thread_id, exclude_message_id=message_id))
+    thread_cache.record(thread_id, "customer", message_body, message_id)
+
+    # Common first questions are answered from the FAQ index; follow-ups and
+    # everything else cost a Gemini call
+    match = None if history else get_faq_responder().match(f"{subject}\n{message_body}")
+    reply_text = None
+    if match is not None:
+        reply_text = fill_placeholders(match['answer'], {"Customer Name": name or "there"})
+    elif not history:
+        # Repetitive requests (damaged item, order status, ...) reuse one drafted reply per intent and store
+        intent = classify_intent(f"{subject}\n{message_body}")
+        if intent is not None:
+            store = payload['message'].get('inbox_id') or os.getenv("AGENT_MAIL")
+            reply_text = await _templated_reply(intent, store, subject, name, message_body)
+    if reply_text is None:
+        reply_text = await _draft_reply(subject, name, address, message_body, history)
 
-    reply_text = response.text
     reply_subject = f"Hey {name}! Re: {subject}"
     reply_to = address
 
-    client.inboxes.messages.send(
-        inbox_id=os.getenv("AGENT_MAIL"),
+    # Sent by the outbox dispatcher, within the inbox's rate limit and with retries
+    idempotency_key = get_outbox().enqueue(
+        os.getenv("AGENT_MAIL"),
         to=reply_to,
         labels=["support"],
         subject=reply_subject,
         text=reply_text,
     )
+    thread_cache.record(thread_id, "support", reply_text, idempotency_key)
 
+async def send_reply(inbox_id, message, idempotency_key):
+    client = create_agentmail_client()
+    await client.inboxes.messages.send(inbox_id=inbox_id, idempotency_key=idempotency_key, **message)
@@ -0,0 +1,141 @@
+"""
+Local stand-in for the parts of the AgentMail API used by the support path:
+sending a message and listing/creating webhooks.
+
+    python -m src.dev.agentmail_standin --port 9081
+    AGENT_MAIL_BASE_URL=http://127.0.0.1:9081
+
+`--handshake-ms N` delays every new connection by N ms to stand in for the
+TCP + TLS setup a real HTTPS connection pays, so client reuse shows up in
+benchmarks the way it does against the real API. `--rate-limit N` answers
+429 with Retry-After once an inbox sends more than N messages per second.
+Sends with an idempotency key that was already used are not delivered again.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class AgentMailState:
+    def __init__(self, handshake_ms: float = 0, rate_limit: float = 0):
+        self.lock = threading.Lock()
+        self.handshake_ms = handshake_ms
+        self.rate_limit = rate_limit
+        # inbox id -> (tokens, last refill)
+        self.buckets = {}
+        self.idempotency_keys = {}
+        self.rejected = 0
+        self.sent = []
+        self.webhooks = []
+        self.connections = 0
+
+    def allow(self, inbox_id: str) -> bool:
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(inbox_id, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - updated) * self.rate_limit)
+            allowed = tokens >= 1
+            self.buckets[inbox_id] = (tokens - 1 if allowed else tokens, now)
+            if not allowed:
+                self.rejected += 1
+            return allowed
+
+
+def make_handler(state: AgentMailState):
+    class AgentMailHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, keep-alive
+        # connections stall on Nagle + delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+            if state.handshake_ms:
+                time.sleep(state.handshake_ms / 1000)
+
+        def _reply(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> dict:
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            return json.loads(raw) if raw else {}
+
+        def do_GET(self):
+            if self.path.split("?")[0] == "/v0/webhooks":
+                with state.lock:
+                    webhooks = list(state.webhooks)
+                return self._reply(200, {"count": len(webhooks), "webhooks": webhooks})
+            self._reply(404, {"message": "not found"})
+
+        def do_POST(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            body = self._body()
+            if parts == ["v0", "webhooks"]:
+                now = datetime.now(timezone.utc).isoformat()
+                webhook = {
+                    "webhook_id": uuid.uuid4().hex,
+                    "url": body["url"],
+                    "event_types": body.get("event_types"),
+                    "secret": uuid.uuid4().hex,
+                    "enabled": True,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                with state.lock:
+                    state.webhooks.append(webhook)
+                return self._reply(200, webhook)
+            if len(parts) == 5 and parts[:2] == ["v0", "inboxes"] and parts[3:] == ["messages", "send"]:
+                if not state.allow(parts[2]):
+                    return self._reply(429, {"message": "rate limited"}, {"Retry-After": "1"})
+                key = self.headers.get("Idempotency-Key") or body.get("idempotency_key")
+                with state.lock:
+                    if key and key in state.idempotency_keys:
+                        return self._reply(200, state.idempotency_keys[key])
+                    result = {"message_id": f"<{uuid.uuid4().hex}@standin>", "thread_id": uuid.uuid4().hex}
+                    state.sent.append({"inbox_id": parts[2], **body})
+                    if key:
+                        state.idempotency_keys[key] = result
+                return self._reply(200, result)
+            self._reply(404, {"message": "not found"})
+
+    return AgentMailHandler
+
+
+def serve(port: int = 9081, handshake_ms: float = 0, rate_limit: float = 0) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread and return the server."""
+    state = AgentMailState(handshake_ms=handshake_ms, rate_limit=rate_limit)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local AgentMail API stand-in")
+    parser.add_argument("--port", type=int, default=9081)
+    parser.add_argument("--handshake-ms", type=float, default=0)
+    parser.add_argument("--rate-limit", type=float, default=0, help="sends per second per inbox before 429s")
+    args = parser.parse_args()
+
+    state = AgentMailState(args.handshake_ms, args.rate_limit)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"AgentMail stand-in listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
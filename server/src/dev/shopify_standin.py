@@ -0,0 +1,389 @@
+"""
+Local stand-in for the Shopify endpoints the server calls: the OAuth token
+exchange and the Admin GraphQL API.
+
+    python -m src.dev.shopify_standin --port 9090
+    SHOPIFY_BASE_URL=http://127.0.0.1:9090
+
+Every shop domain is served from the same in-memory store. GraphQL requests
+are answered by matching the operation against the handful of queries and
+mutations the server sends, not by a real GraphQL executor. Bulk mutations
+(staged upload + bulkOperationRunMutation + productSet) run on a background
+thread at `--bulk-rows-per-second` and publish a JSONL result file.
+
+GraphQL calls are metered like Shopify's: a leaky bucket of `--bucket`
+points refilling at `--restore-rate` per second, and a call whose requested
+cost does not fit fails with THROTTLED. `--latency-ms` adds server time to
+every GraphQL call; `--products N` and `--orders N` seed the store.
+
+`--handshake-ms N` delays every new connection by N ms to stand in for the
+TCP + TLS setup a real HTTPS connection pays.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GRAPHQL_PATH = re.compile(r"^/admin/api/[\w-]+/graphql\.json$")
+# Arguments, not `$first: Int!` variable definitions
+VARIANTS_FIRST = re.compile(r"\bvariants\s*\(\s*first\s*:\s*(\$\w+|\d+)")
+PAGE_ARGUMENT = re.compile(r"(?<![$\w])(first|after|query)\s*:\s*(\$\w+|\d+|\"[^\"]*\")")
+UPDATED_AFTER = re.compile(r"updated_at:>\s*'?([^' ]+)'?")
+
+
+class ShopifyState:
+    def __init__(self, handshake_ms: float = 0, bulk_rows_per_second: float = 0, bucket: float = 1000,
+                 restore_rate: float = 50, latency_ms: float = 0):
+        self.lock = threading.Lock()
+        self.handshake_ms = handshake_ms
+        self.bulk_rows_per_second = bulk_rows_per_second
+        self.latency_ms = latency_ms
+        self.connections = 0
+        self.requests = 0
+        self.products = {}
+        self.orders = {}
+        self.customers = {}
+        self.next_id = 1
+        self.staged = {}
+        self.bulk_operations = {}
+        self.bulk_results = {}
+        self.webhook_subscriptions = {}
+        self.bucket = bucket
+        self.restore_rate = restore_rate
+        self.available = bucket
+        self.bucket_updated = time.monotonic()
+        self.throttled = 0
+
+    def charge(self, cost: float) -> bool:
+        """Take `cost` points from the bucket; False (nothing taken) if it does not fit."""
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.bucket, self.available + (now - self.bucket_updated) * self.restore_rate)
+            self.bucket_updated = now
+            if cost > self.available:
+                self.throttled += 1
+                return False
+            self.available -= cost
+            return True
+
+    def refund(self, points: float) -> None:
+        with self.lock:
+            self.available = min(self.bucket, self.available + points)
+
+    def throttle_status(self) -> dict:
+        with self.lock:
+            available = min(self.bucket, self.available + (time.monotonic() - self.bucket_updated) * self.restore_rate)
+        return {"maximumAvailable": self.bucket, "currentlyAvailable": round(available, 1), "restoreRate": self.restore_rate}
+
+    def create_product(self, product_input: dict) -> dict:
+        with self.lock:
+            product_id = f"gid://shopify/Product/{self.next_id}"
+            self.next_id += 1
+            now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            product = {"id": product_id, "createdAt": now, "updatedAt": now, **product_input}
+            self.products[product_id] = product
+        return product
+
+    def seed_products(self, count: int) -> None:
+        for n in range(count):
+            self.create_product({
+                "title": f"Stand-in Product {n + 1}",
+                "handle": f"stand-in-product-{n + 1}",
+                "descriptionHtml": f"<p>Sample product number {n + 1}.</p>",
+                "vendor": "Stand-in",
+                "productType": "Sample",
+                "status": "ACTIVE",
+                "tags": ["sample"],
+                "variants": [{"price": f"{10 + n % 90}.00", "sku": f"SKU-{n + 1:06d}"}],
+            })
+
+    def seed_orders(self, count: int) -> None:
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self.lock:
+            for n in range(count):
+                customer_id = f"gid://shopify/Customer/{n % 500 + 1}"
+                self.customers.setdefault(customer_id, {
+                    "id": customer_id, "firstName": "Sample", "lastName": f"Customer {n % 500 + 1}",
+                    "email": f"customer{n % 500 + 1}@example.com", "phone": None,
+                    "createdAt": now, "updatedAt": now, "numberOfOrders": "0",
+                    "amountSpent": {"amount": "0.0", "currencyCode": "USD"},
+                })
+                order_id = f"gid://shopify/Order/{n + 1}"
+                self.orders[order_id] = {
+                    "id": order_id, "name": f"#{1000 + n + 1}", "email": f"customer{n % 500 + 1}@example.com",
+                    "createdAt": now, "updatedAt": now,
+                    "displayFinancialStatus": "PAID", "displayFulfillmentStatus": "UNFULFILLED",
+                    "totalPriceSet": {"shopMoney": {"amount": f"{20 + n % 180}.00", "currencyCode": "USD"}},
+                    "customer": {"id": customer_id},
+                }
+                customer = self.customers[customer_id]
+                customer["numberOfOrders"] = str(int(customer["numberOfOrders"]) + 1)
+
+
+def _multipart_fields(content_type: str, body: bytes) -> dict:
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    fields = {}
+    for part in body.split(b"--" + boundary):
+        head, sep, value = part.partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]+)"', head)
+        if sep and name:
+            fields[name.group(1).decode()] = value[:-2] if value.endswith(b"\r\n") else value
+    return fields
+
+
+def _run_bulk_mutation(state: ShopifyState, operation: dict, variables_jsonl: bytes) -> None:
+    lines = [line for line in variables_jsonl.decode().splitlines() if line.strip()]
+    results = []
+    for number, line in enumerate(lines):
+        product_input = json.loads(line)["input"]
+        if not product_input.get("title"):
+            result = {"productSet": {"product": None, "userErrors": [{"field": ["title"], "message": "Title can't be blank"}]}}
+        else:
+            product = state.create_product(product_input)
+            result = {"productSet": {"product": {"id": product["id"], "title": product["title"]}, "userErrors": []}}
+        results.append(json.dumps({"data": result, "__lineNumber": number}))
+        operation["objectCount"] = str(number + 1)
+        if state.bulk_rows_per_second:
+            time.sleep(1 / state.bulk_rows_per_second)
+    with state.lock:
+        state.bulk_results[operation["id"]] = ("\n".join(results) + "\n").encode()
+    operation["url"] = f"{operation['base_url']}/bulk-results/{operation['id'].rsplit('/', 1)[-1]}.jsonl"
+    operation["status"] = "COMPLETED"
+
+
+def make_handler(state: ShopifyState):
+    class ShopifyHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, keep-alive
+        # connections stall on Nagle + delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+            if state.handshake_ms:
+                time.sleep(state.handshake_ms / 1000)
+
+        def _reply(self, status: int, payload, headers: dict = None):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _base_url(self) -> str:
+            return f"http://{self.headers.get('Host')}"
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path.startswith("/bulk-results/"):
+                key = "gid://shopify/BulkOperation/" + path.rsplit("/", 1)[-1].split(".")[0]
+                with state.lock:
+                    data = state.bulk_results.get(key)
+                if data is None:
+                    return self._reply(404, {"errors": "Not Found"})
+                return self._reply(200, data, {"Content-Type": "application/jsonl"})
+            self._reply(404, {"errors": "Not Found"})
+
+        def do_POST(self):
+            with state.lock:
+                state.requests += 1
+            path = self.path.split("?")[0]
+            if path == "/staged-uploads":
+                fields = _multipart_fields(self.headers.get("Content-Type", ""), self._body())
+                with state.lock:
+                    state.staged[fields["key"].decode()] = fields["file"]
+                self.send_response(201)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if path == "/admin/oauth/access_token":
+                self._body()
+                return self._reply(200, {"access_token": f"shpat_{uuid.uuid4().hex}", "scope": "read_products,write_products"})
+            if GRAPHQL_PATH.match(path):
+                if not self.headers.get("X-Shopify-Access-Token"):
+                    return self._reply(401, {"errors": "[API] Invalid API key or access token"})
+                request = json.loads(self._body() or b"{}")
+                if state.latency_ms:
+                    time.sleep(state.latency_ms / 1000)
+                return self._reply(200, metered_graphql(state, request.get("query", ""), request.get("variables") or {}, self._base_url()))
+            self._reply(404, {"errors": "Not Found"})
+
+    return ShopifyHandler
+
+
+def _page_arguments(query: str, variables: dict) -> dict:
+    arguments = {}
+    for name, value in PAGE_ARGUMENT.findall(query):
+        value = variables.get(value[1:]) if value.startswith("$") else value.strip('"')
+        # The outermost connection's arguments come first in the query
+        if value not in (None, "null") and name not in arguments:
+            arguments[name] = int(value) if name == "first" else value
+    return arguments
+
+
+def requested_cost(query: str, variables: dict) -> int:
+    """Simplified Shopify pricing: mutations 10, connections 2 + first, other queries 1."""
+    if query.lstrip().startswith("mutation"):
+        return 10
+    first = _page_arguments(query, variables).get("first")
+    return 2 + first if first else 1
+
+
+def metered_graphql(state: ShopifyState, query: str, variables: dict, base_url: str) -> dict:
+    requested = requested_cost(query, variables)
+    if not state.charge(requested):
+        return {
+            "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+            "extensions": {"cost": {"requestedQueryCost": requested, "actualQueryCost": None,
+                                    "throttleStatus": state.throttle_status()}},
+        }
+    response = graphql(state, query, variables, base_url)
+    # Like Shopify, refund what the call turned out not to need (unfilled page slots)
+    actual = requested
+    connection = next((value for value in (response.get("data") or {}).values() if isinstance(value, dict) and "edges" in value), None)
+    if connection is not None:
+        actual = 2 + len(connection["edges"])
+        state.refund(requested - actual)
+    response["extensions"] = {"cost": {"requestedQueryCost": requested, "actualQueryCost": actual,
+                                       "throttleStatus": state.throttle_status()}}
+    return response
+
+
+def _connection(items: list, arguments: dict) -> dict:
+    """Cursor page over `items`; cursors are the position after the node."""
+    updated_after = UPDATED_AFTER.search(arguments.get("query") or "")
+    if updated_after:
+        items = [item for item in items if item["updatedAt"] > updated_after.group(1)]
+    start = int(arguments["after"]) if arguments.get("after") else 0
+    page = items[start:start + arguments.get("first", 50)]
+    edges = [{"cursor": str(start + n + 1), "node": node} for n, node in enumerate(page)]
+    return {
+        "edges": edges,
+        "pageInfo": {"hasNextPage": start + len(page) < len(items), "endCursor": edges[-1]["cursor"] if edges else None},
+    }
+
+
+def _variants(product: dict) -> list:
+    return [{"id": f"{product['id'].replace('Product', 'ProductVariant')}{n}", **variant}
+            for n, variant in enumerate(product.get("variants") or [])]
+
+
+def graphql(state: ShopifyState, query: str, variables: dict, base_url: str) -> dict:
+    if "stagedUploadsCreate" in query:
+        key = f"tmp/{uuid.uuid4().hex}/{variables['input'][0]['filename']}"
+        target = {
+            "url": f"{base_url}/staged-uploads",
+            "resourceUrl": f"{base_url}/staged-uploads/{key}",
+            "parameters": [{"name": "key", "value": key}, {"name": "Content-Type", "value": "text/jsonl"}],
+        }
+        return {"data": {"stagedUploadsCreate": {"stagedTargets": [target], "userErrors": []}}}
+
+    if "bulkOperationRunMutation" in query:
+        with state.lock:
+            staged = state.staged.pop(variables.get("stagedUploadPath"), None)
+        if staged is None:
+            errors = [{"field": ["stagedUploadPath"], "message": "Staged upload not found"}]
+            return {"data": {"bulkOperationRunMutation": {"bulkOperation": None, "userErrors": errors}}}
+        operation = {
+            "id": f"gid://shopify/BulkOperation/{uuid.uuid4().int % 10**12}",
+            "status": "RUNNING", "errorCode": None, "objectCount": "0", "url": None, "partialDataUrl": None,
+            "base_url": base_url,
+        }
+        with state.lock:
+            state.bulk_operations[operation["id"]] = operation
+        threading.Thread(target=_run_bulk_mutation, args=(state, operation, staged), daemon=True).start()
+        result = {"bulkOperation": {"id": operation["id"], "status": "CREATED"}, "userErrors": []}
+        return {"data": {"bulkOperationRunMutation": result}}
+
+    if "webhookSubscriptionCreate" in query:
+        key = (variables["topic"], variables["callbackUrl"])
+        with state.lock:
+            if key in state.webhook_subscriptions:
+                errors = [{"field": ["webhookSubscription", "callbackUrl"], "message": "Address for this topic has already been taken"}]
+                return {"data": {"webhookSubscriptionCreate": {"webhookSubscription": None, "userErrors": errors}}}
+            subscription = {"id": f"gid://shopify/WebhookSubscription/{len(state.webhook_subscriptions) + 1}"}
+            state.webhook_subscriptions[key] = subscription
+        return {"data": {"webhookSubscriptionCreate": {"webhookSubscription": subscription, "userErrors": []}}}
+
+    if re.search(r"\bnode\s*\(", query):
+        with state.lock:
+            operation = state.bulk_operations.get(variables.get("id"))
+        node = {k: v for k, v in operation.items() if k != "base_url"} if operation else None
+        return {"data": {"node": node}}
+
+    if re.search(r"\bproduct\s*\(", query):
+        with state.lock:
+            product = state.products.get(variables.get("id"))
+        if product is None:
+            return {"data": {"product": None}}
+        return {"data": {"product": {"variants": _connection(_variants(product), _page_arguments(query, variables))}}}
+
+    if re.search(r"\bproducts\s*\(", query):
+        with state.lock:
+            products = list(state.products.values())
+        connection = _connection(products, _page_arguments(query, variables))
+        variants_first = VARIANTS_FIRST.search(query)
+        variant_arguments = {}
+        if variants_first:
+            value = variants_first.group(1)
+            variant_arguments["first"] = int(variables[value[1:]] if value.startswith("$") else value)
+        for edge in connection["edges"]:
+            product = edge["node"]
+            edge["node"] = {**product, "variants": _connection(_variants(product), variant_arguments)}
+        return {"data": {"products": connection}}
+
+    for resource in ("orders", "customers"):
+        if re.search(rf"\b{resource}\s*\(", query):
+            with state.lock:
+                items = list(getattr(state, resource).values())
+            return {"data": {resource: _connection(items, _page_arguments(query, variables))}}
+
+    if re.search(r"\bshop\s*\{", query):
+        return {"data": {"shop": {"name": "Stand-in Shop"}}}
+    return {"errors": [{"message": "Operation not supported by the stand-in"}]}
+
+
+def serve(port: int = 9090, handshake_ms: float = 0, bulk_rows_per_second: float = 0, bucket: float = 1000,
+          restore_rate: float = 50, latency_ms: float = 0, products: int = 0, orders: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread and return the server."""
+    state = ShopifyState(handshake_ms, bulk_rows_per_second, bucket, restore_rate, latency_ms)
+    state.seed_products(products)
+    state.seed_orders(orders)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Shopify Admin API stand-in")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--handshake-ms", type=float, default=0)
+    parser.add_argument("--bulk-rows-per-second", type=float, default=0, help="bulk mutation speed (0 = as fast as possible)")
+    parser.add_argument("--bucket", type=float, default=1000, help="GraphQL cost bucket size")
+    parser.add_argument("--restore-rate", type=float, default=50, help="GraphQL cost points restored per second")
+    parser.add_argument("--latency-ms", type=float, default=0, help="server time per GraphQL call")
+    parser.add_argument("--products", type=int, default=0, help="seed the catalog with N products")
+    parser.add_argument("--orders", type=int, default=0, help="seed N orders (and up to 500 customers)")
+    args = parser.parse_args()
+
+    state = ShopifyState(args.handshake_ms, args.bulk_rows_per_second, args.bucket, args.restore_rate, args.latency_ms)
+    state.seed_products(args.products)
+    state.seed_orders(args.orders)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"Shopify stand-in listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
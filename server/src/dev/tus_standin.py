@@ -0,0 +1,148 @@
+"""
+Local stand-in for the Supabase Storage resumable (TUS) endpoint.
+
+Implements the parts of the TUS 1.0.0 protocol used by
+`src.utils.resumable_upload`: creation, HEAD/PATCH, the `checksum` extension
+(sha1) and the `concatenation` extension. Uploads are kept in memory.
+
+Run it and point the uploader at it:
+
+    python -m src.dev.tus_standin --port 9080
+    SUPABASE_TUS_URL=http://127.0.0.1:9080/upload/resumable
+
+`--fail-every N` makes every Nth PATCH fail with a 500 to exercise resumes.
+"""
+import argparse
+import base64
+import hashlib
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPLOAD_PATH = "/upload/resumable"
+
+
+class TusState:
+    def __init__(self, fail_every: int = 0):
+        self.lock = threading.Lock()
+        self.uploads = {}
+        self.fail_every = fail_every
+        self.patch_count = 0
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.patch_count += 1
+            return bool(self.fail_every) and self.patch_count % self.fail_every == 0
+
+
+def _decode_metadata(raw: str) -> dict:
+    metadata = {}
+    for pair in filter(None, (p.strip() for p in raw.split(","))):
+        key, _, value = pair.partition(" ")
+        metadata[key] = base64.b64decode(value).decode() if value else ""
+    return metadata
+
+
+def make_handler(state: TusState):
+    class TusHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, headers: dict = None, body: bytes = b""):
+            self.send_response(status)
+            self.send_header("Tus-Resumable", "1.0.0")
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def _upload(self):
+            upload_id = self.path.rsplit("/", 1)[-1]
+            return upload_id, state.uploads.get(upload_id)
+
+        def do_OPTIONS(self):
+            self._reply(204, {
+                "Tus-Version": "1.0.0",
+                "Tus-Extension": "creation,checksum,concatenation,termination",
+                "Tus-Checksum-Algorithm": "sha1",
+            })
+
+        def do_POST(self):
+            if self.path.rstrip("/") != UPLOAD_PATH:
+                return self._reply(404)
+            upload_id = uuid.uuid4().hex
+            concat = self.headers.get("Upload-Concat", "")
+            upload = {
+                "metadata": _decode_metadata(self.headers.get("Upload-Metadata", "")),
+                "data": bytearray(),
+                "partial": concat == "partial",
+            }
+            if concat.startswith("final;"):
+                data = bytearray()
+                for url in concat[len("final;"):].split():
+                    part = state.uploads.get(url.rstrip("/").rsplit("/", 1)[-1])
+                    if part is None or len(part["data"]) != part["length"]:
+                        return self._reply(400, body=b"incomplete partial upload")
+                    data.extend(part["data"])
+                upload["data"] = data
+                upload["length"] = len(data)
+            else:
+                upload["length"] = int(self.headers["Upload-Length"])
+            with state.lock:
+                state.uploads[upload_id] = upload
+            self._reply(201, {"Location": f"{UPLOAD_PATH}/{upload_id}"})
+
+        def do_HEAD(self):
+            _, upload = self._upload()
+            if upload is None:
+                return self._reply(404)
+            self._reply(200, {
+                "Upload-Offset": str(len(upload["data"])),
+                "Upload-Length": str(upload["length"]),
+                "Cache-Control": "no-store",
+            })
+
+        def do_PATCH(self):
+            _, upload = self._upload()
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if upload is None:
+                return self._reply(404)
+            if state.should_fail():
+                return self._reply(500, body=b"injected failure")
+            if int(self.headers.get("Upload-Offset", -1)) != len(upload["data"]):
+                return self._reply(409, {"Upload-Offset": str(len(upload["data"]))})
+            checksum = self.headers.get("Upload-Checksum")
+            if checksum:
+                algorithm, _, expected = checksum.partition(" ")
+                if algorithm != "sha1":
+                    return self._reply(400)
+                if base64.b64encode(hashlib.sha1(body).digest()).decode() != expected:
+                    return self._reply(460)
+            upload["data"].extend(body)
+            self._reply(204, {"Upload-Offset": str(len(upload["data"]))})
+
+    return TusHandler
+
+
+def serve(port: int = 9080, fail_every: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread and return the server."""
+    state = TusState(fail_every=fail_every)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local TUS stand-in for Supabase Storage")
+    parser.add_argument("--port", type=int, default=9080)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(TusState(args.fail_every)))
+    print(f"TUS stand-in listening on http://127.0.0.1:{args.port}{UPLOAD_PATH}")
+    server.serve_forever()
@@ -1,8 +1,24 @@
-from fastapi import FastAPI, Request # type: ignore
+from fastapi import Depends, FastAPI, Header, HTTPException, Request # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
 from src.utils.email_agent_setup import email_setup
-from src.agents.support_service import respond_to_support_email
+from src.agents.support_service import respond_to_support_email, send_reply
+from src.utils.create_agentmail import close_agentmail_client
+from src.utils.shopify_client import close_shop_clients
+from src.utils.thread_context import get_thread_context_cache
+from src.utils.faq_index import get_faq_responder
+from src.utils.reply_templates import get_reply_template_cache
+from src.models.support import ApprovedReplyInput
+from src.utils.pdf_renderer import start_pdf_renderers, shutdown_pdf_renderers
+from src.utils.email_queue import EmailQueue, EmailQueueWorker
+from src.utils.email_outbox import OutboxDispatcher, get_outbox
+from src.utils.message_dedup import MessageDeduplicator, inbound_message_id
+from src.utils.email_triage import SUPPORT, EmailTriage
+from typing import Optional
 from urllib.parse import urlencode
+import hmac
+import json
+import os
+import threading
 from .routes.shopify import router as shopify_router
 from .routes.legal import router as legal_router
 from .routes.brand import router as brand_router
@@ -14,6 +30,9 @@ try:
 except Exception:
     pass
 
+# Required (X-Admin-Token) by the support admin endpoints; they are disabled while it is unset
+SUPPORT_ADMIN_TOKEN = os.getenv("SUPPORT_ADMIN_TOKEN", "")
+
 app = FastAPI(title="Foundry API", version="1.0.0")
 
 # Add CORS middleware
@@ -25,10 +44,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Inbound support emails are persisted by the webhook and answered by background workers
+email_queue = EmailQueue()
+email_worker = EmailQueueWorker(email_queue, respond_to_support_email)
+# Replies go through a persisted outbox, rate limited per sending inbox
+outbox_dispatcher = OutboxDispatcher(get_outbox(), send_reply)
+# AgentMail redelivers webhooks; each message id is answered once
+email_dedup = MessageDeduplicator()
+# Bounces, auto-replies, mailing lists, flagged spam and our own mail never reach the LLM;
+# they are held for review instead
+email_triage = EmailTriage()
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not SUPPORT_ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="SUPPORT_ADMIN_TOKEN is not configured")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, SUPPORT_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 @app.on_event("startup")
 async def startup_event():
     print("Starting up...")
-    email_setup()
+    await email_setup()
+    # Warm the PDF renderer processes without holding up start-up
+    threading.Thread(target=start_pdf_renderers, daemon=True).start()
+    await email_worker.start()
+    await outbox_dispatcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await email_worker.stop()
+    await outbox_dispatcher.stop()
+    await close_agentmail_client()
+    await close_shop_clients()
+    shutdown_pdf_renderers()
 
 app.include_router(shopify_router)
 app.include_router(legal_router)
@@ -55,9 +103,71 @@ async def health_check():
 @app.post("/email/webhook")
 async def email_webhook(request: Request):
     body = await request.body()
-    respond_to_support_email(body)
+    try:
+        payload = json.loads(body)
+        message_id = inbound_message_id(payload)
+    except (ValueError, AttributeError):
+        payload, message_id = None, None
+
+    if message_id and email_dedup.check_and_add(message_id):
+        return {"status": "duplicate"}
+    triage = email_triage.classify(payload.get("message") or {}) if payload is not None else SUPPORT
+    try:
+        if triage != SUPPORT:
+            held_id = email_queue.hold(body, triage)
+            return {"status": "held", "triage": triage, "id": held_id}
+        email_queue.enqueue(body)
+    except Exception:
+        if message_id:
+            email_dedup.forget(message_id)
+        raise
+    email_worker.notify()
     return {"status": "received"}
 
+@app.get("/email/stats")
+async def email_stats():
+    return {
+        "queue": email_queue.counts(),
+        "outbox": get_outbox().counts(),
+        "dedup": email_dedup.info(),
+        "triage": email_triage.info(),
+        "thread_context": get_thread_context_cache().info(),
+        "faq": get_faq_responder().info(),
+        "reply_templates": get_reply_template_cache().info(),
+    }
+
+@app.get("/email/triaged", dependencies=[Depends(require_admin_token)])
+async def triaged_emails(triage: str = None, limit: int = 50):
+    """Recent mail that triage held back instead of answering."""
+    held = []
+    for held_id, held_triage, payload, created_at in email_queue.held(triage, min(max(limit, 1), 500)):
+        try:
+            message = json.loads(payload).get("message") or {}
+        except (ValueError, AttributeError):
+            message = {}
+        held.append({
+            "id": held_id,
+            "triage": held_triage,
+            "from": message.get("from_") or message.get("from"),
+            "subject": message.get("subject"),
+            "received_at": created_at,
+        })
+    return {"emails": held}
+
+@app.post("/email/triaged/{held_id}/release", dependencies=[Depends(require_admin_token)])
+async def release_triaged_email(held_id: int):
+    """Queue a held message for a reply after all (triage got it wrong)."""
+    job_id = email_queue.release(held_id)
+    if job_id is None:
+        raise HTTPException(status_code=404, detail="Held email not found")
+    email_worker.notify()
+    return {"status": "received", "job_id": job_id}
+
+@app.post("/email/faq/approved", dependencies=[Depends(require_admin_token)])
+async def add_approved_reply(input: ApprovedReplyInput):
+    reply_id = get_faq_responder().add_approved_reply(input.question, input.answer)
+    return {"id": reply_id}
+
 if __name__ == "__main__":
     import uvicorn # type: ignore
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,12 +1,21 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Any
+from .video import VideoMetadata
 
 class BrandingInfoInput (BaseModel):
     idea_string : str
+    logo_candidates : int = Field(default=1, ge=1, le=10)
+    brand_id : str | None = None
 
 class BrandingInfosOutput (BaseModel):
     branding : dict 
 
 class BrandingInfoVideoOutput (BaseModel):
     video: Any
-    video_url: str | None = None
\ No newline at end of file
+    video_url: str | None = None
+    metadata: VideoMetadata | None = None
+
+class LogoRegenerateOutput (BaseModel):
+    brand_id: str
+    logo: str | None = None
+    source: str
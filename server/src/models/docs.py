@@ -1,8 +1,11 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 class LegalDocsInput (BaseModel):
     idea: str
+    mode: Literal["single", "parallel"] = "single"  # parallel: one LLM call per document type
+    doc_types: Optional[List[str]] = None  # parallel mode only; defaults to LEGAL_DOC_TYPES env
+    combined_pdf: bool = False  # also render all docs into one PDF with a table of contents
 
 class LegalDocument (BaseModel):
     doc_type: str
@@ -15,4 +18,10 @@ class LegalDocument (BaseModel):
 
 class LegalDocsOutput (BaseModel):
     docs: str
-    pdfs: Optional[List[dict]] = None  # List of {title, pdf_url, pdf_data}
\ No newline at end of file
+    pdfs: Optional[List[dict]] = None  # List of {title, pdf_url, pdf_data}
+    errors: Optional[List[dict]] = None  # List of {doc_type, error} in parallel mode
+    combined_pdf: Optional[dict] = None  # {title, filename, pdf_data, size} when combined_pdf is set
+    templates: Optional[List[dict]] = None  # List of {template_id, doc_type, title, placeholders}
+
+class PlaceholderValues (BaseModel):
+    values: Dict[str, str]  # e.g. {"Company Name": "Acme LLC", "Contact Email": "help@acme.com"}
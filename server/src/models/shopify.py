@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class BulkProduct (BaseModel):
+    title: str
+    description: Optional[str] = None
+    price: float
+    sku: Optional[str] = None
+    product_type: Optional[str] = None
+    vendor: Optional[str] = None
+    tags: Optional[List[str]] = None
+    status: Optional[str] = None  # ACTIVE, DRAFT or ARCHIVED; Shopify defaults to ACTIVE
+
+class BulkProductsInput (BaseModel):
+    products: List[BulkProduct] = Field(min_length=1)
@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+class ApprovedReplyInput (BaseModel):
+    question: str  # the customer question, as short as it can be while still specific
+    answer: str  # may use [Customer Name]
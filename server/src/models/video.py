@@ -1,8 +1,18 @@
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, Optional
 
 class VideoInput (BaseModel):
     prompt: str
 
 class VideoOutput (BaseModel):
-    video: Any
\ No newline at end of file
+    video: Any
+
+class VideoMetadata (BaseModel):
+    duration: float
+    width: int
+    height: int
+    video_codec: str
+    audio_codec: Optional[str] = None
+    major_brand: str
+    faststart: bool
+    size: int
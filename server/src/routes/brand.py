@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
-from src.agents.brand_service import generate_branding, generate_branding_video
-from ..models.branding import BrandingInfoInput, BrandingInfosOutput, BrandingInfoVideoOutput
+from fastapi.responses import StreamingResponse
+from src.agents.brand_service import generate_branding, generate_branding_video, regenerate_logo, brand_bundle
+from ..models.branding import BrandingInfoInput, BrandingInfosOutput, BrandingInfoVideoOutput, LogoRegenerateOutput
 
 router = APIRouter(prefix="/api/brand", tags=["brand"])
 
@@ -10,7 +11,7 @@ async def generate_branding_assets(input: BrandingInfoInput):
     Generate branding assets (logo, tagline, name) for a business idea.
     """
     try:
-        result = generate_branding(input.idea_string)
+        result = generate_branding(input.idea_string, input.logo_candidates)
         return BrandingInfosOutput(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating branding documents: {str(e)}")
@@ -22,11 +23,39 @@ async def generate_branding_video_asset(input: BrandingInfoInput):
     Generate branding video for a business idea.
     """
     try:
-        result = generate_branding_video(input.idea_string)
+        result = generate_branding_video(input.idea_string, input.brand_id)
         return BrandingInfoVideoOutput(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating branding video: {str(e)}")
 
+@router.post("/{brand_id}/regenerate-logo", response_model=LogoRegenerateOutput)
+async def regenerate_brand_logo(brand_id: str):
+    """
+    Serve the next stored logo candidate, generating a new batch only when all have been shown.
+    """
+    try:
+        result = regenerate_logo(brand_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error regenerating logo: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Brand not found")
+    return LogoRegenerateOutput(**result)
+
+@router.get("/{brand_id}/bundle")
+async def download_brand_bundle(brand_id: str):
+    """
+    Stream a zip of the brand kit (logo derivatives, colors/typography, tagline, video links).
+    """
+    bundle = brand_bundle(brand_id)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Brand not found")
+    filename, chunks = bundle
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @router.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "brand"}
\ No newline at end of file
@@ -1,6 +1,14 @@
 from fastapi import APIRouter, HTTPException
-from ..models.docs import LegalDocsInput, LegalDocsOutput
-from ..agents.legal_service import generate_legal_docs
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+import json
+import re
+from ..models.docs import LegalDocsInput, LegalDocsOutput, LegalDocument, PlaceholderValues
+from ..agents.legal_service import (
+    generate_legal_docs, render_doc_pdf, pdf_content_disposition, iter_legal_doc_events, get_cached_pdf,
+    fill_template, render_filled_template,
+)
+from ..utils.render_cache import get_render_cache
 
 router = APIRouter(prefix="/api/legal", tags=["legal"])
 
@@ -10,11 +18,91 @@ async def generate_legal_documents(input: LegalDocsInput):
     Generate legal documents (Privacy Policy, Terms of Use, NDA) for a business idea.
     """
     try:
-        result = generate_legal_docs(input.dict())
+        result = await run_in_threadpool(generate_legal_docs, input.dict())
         return LegalDocsOutput(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating legal documents: {str(e)}")
 
+@router.post("/generate/stream")
+async def generate_legal_documents_stream(input: LegalDocsInput):
+    """
+    Generate legal documents one LLM call per document type, streaming NDJSON
+    events as each document's markdown is ready and as each PDF is rendered.
+    PDFs are referenced by artifact URL rather than inlined.
+    """
+    events = iter_legal_doc_events(input.idea, input.doc_types)
+    try:
+        first = next(events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def ndjson():
+        yield json.dumps(first) + "\n"
+        for event in events:
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/pdf/{key}")
+async def get_legal_pdf(key: str):
+    """
+    Fetch a rendered PDF by the artifact key from the streaming endpoint.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", key):
+        raise HTTPException(status_code=400, detail="Invalid artifact key")
+    pdf_data = await run_in_threadpool(get_cached_pdf, key)
+    if pdf_data is None:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return Response(content=pdf_data, media_type="application/pdf")
+
+@router.post("/render")
+async def render_legal_document(doc: LegalDocument):
+    """
+    Render one legal document straight to a PDF response (no base64, no temp files).
+    """
+    try:
+        pdf_data = await run_in_threadpool(render_doc_pdf, doc.dict())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering legal document: {str(e)}")
+    return Response(
+        content=pdf_data,
+        media_type="application/pdf",
+        headers={"Content-Disposition": pdf_content_disposition(doc.title)},
+    )
+
+@router.post("/templates/{template_id}/fill")
+async def fill_legal_template(template_id: str, input: PlaceholderValues):
+    """
+    Substitute tenant values into a stored legal template and return the document.
+    """
+    doc = await run_in_threadpool(fill_template, template_id, input.values)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return doc
+
+@router.post("/templates/{template_id}/render")
+async def render_legal_template(template_id: str, input: PlaceholderValues):
+    """
+    Substitute tenant values into a stored legal template and render it to PDF, without an LLM call.
+    """
+    try:
+        result = await run_in_threadpool(render_filled_template, template_id, input.values)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering legal template: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    doc, pdf_data = result
+    return Response(
+        content=pdf_data,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": pdf_content_disposition(doc["title"]),
+            "X-Unfilled-Placeholders": ",".join(doc["unfilled"]),
+        },
+    )
+
 @router.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "legal"}
+    return {"status": "healthy", "service": "legal", "pdf_cache": get_render_cache().info()}
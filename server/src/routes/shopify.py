@@ -1,12 +1,31 @@
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Header, Request, HTTPException
+from fastapi.responses import RedirectResponse, StreamingResponse
 import os
 import hmac
 import hashlib
-import httpx
+import base64
+import asyncio
+import time
 from urllib.parse import urlencode
 import dotenv
 from typing import Optional
+import httpx
+import json
+from src.agents.shopify_service import (
+    EXPORT_QUERIES,
+    ShopifyUserError,
+    catalog_syncing,
+    iter_bulk_product_import,
+    iter_export_pages,
+    normalize_updated_since,
+    refresh_catalog_if_stale,
+    start_catalog_sync,
+)
+from src.utils.catalog_mirror import catalog_mirror_info, get_catalog_mirror, product_from_webhook
+from src.models.shopify import BulkProductsInput
+from src.utils.shopify_client import (
+    SHOPIFY_API_VERSION, InvalidShopError, get_shop_client, normalize_shop, shop_client_info,
+)
 
 router = APIRouter(prefix="/api/shopify", tags=["shopify"])
 
@@ -36,15 +55,35 @@ def verify_hmac(query_params: dict) -> bool:
     return hmac.compare_digest(digest, hmac_param)
 
 
+def verify_webhook_hmac(body: bytes, hmac_header: Optional[str]) -> bool:
+    """Verify X-Shopify-Hmac-Sha256: base64 HMAC-SHA256 of the raw body with the app secret."""
+    if not hmac_header:
+        return False
+    digest = hmac.new(get_env("SHOPIFY_API_SECRET").encode(), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), hmac_header)
+
+
+def shop_domain(shop: str) -> str:
+    """The normalized shop domain, or a 400 for anything that is not a *.myshopify.com shop."""
+    try:
+        return normalize_shop(shop)
+    except InvalidShopError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def catalog_mirror(shop: str):
+    try:
+        return get_catalog_mirror(normalize_shop(shop))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/auth")
 async def shopify_oauth_start(shop: str, host: Optional[str] = None):
     """Redirect merchant to Shopify OAuth install screen."""
-    # Clean shop parameter - remove https:// if present
-    if shop.startswith("https://"):
-        shop = shop.replace("https://", "")
-    if shop.startswith("http://"):
-        shop = shop.replace("http://", "")
-    
+    # Clean shop parameter (strip scheme and path) and refuse anything but a Shopify shop
+    shop = shop_domain(shop)
+
     api_key = get_env("SHOPIFY_API_KEY")
     scopes = os.getenv("SHOPIFY_SCOPES", "read_products,write_products,read_themes,write_themes,read_orders,read_customers")
     app_url = os.getenv("APP_URL", "http://localhost:8000")
@@ -69,39 +108,38 @@ async def shopify_oauth_callback(request: Request, shop: str, code: str, state:
         print("HMAC verification failed")
         raise HTTPException(status_code=400, detail="Invalid HMAC signature")
 
+    shop = shop_domain(shop)
     api_key = get_env("SHOPIFY_API_KEY")
     api_secret = get_env("SHOPIFY_API_SECRET")
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        token_resp = await client.post(
-            f"https://{shop}/admin/oauth/access_token",
-            json={
-                "client_id": api_key,
-                "client_secret": api_secret,
-                "code": code,
-            },
-        )
-        token_resp.raise_for_status()
-        token_data = token_resp.json()
-        access_token = token_data.get("access_token")
-        if not access_token:
-            print("No access token received from Shopify")
-            raise HTTPException(status_code=400, detail="No access_token returned by Shopify")
-
-        # Get scopes from the token response
-        scopes = token_data.get("scope", "").split(",") if token_data.get("scope") else []
-        
-        # Encode the token data to pass to frontend
-        import json
-        import base64
-        token_data_encoded = base64.b64encode(json.dumps({
-            'access_token': access_token,
-            'scopes': scopes,
-            'shop': shop,
-            'metadata': {
-                'shop_name': shop,
-                'api_version': '2024-10'
-            }
-        }).encode()).decode()
+    client = get_shop_client(shop)
+    token_resp = await client.post(
+        "/admin/oauth/access_token",
+        json={
+            "client_id": api_key,
+            "client_secret": api_secret,
+            "code": code,
+        },
+    )
+    token_resp.raise_for_status()
+    token_data = token_resp.json()
+    access_token = token_data.get("access_token")
+    if not access_token:
+        print("No access token received from Shopify")
+        raise HTTPException(status_code=400, detail="No access_token returned by Shopify")
+
+    # Get scopes from the token response
+    scopes = token_data.get("scope", "").split(",") if token_data.get("scope") else []
+    
+    # Encode the token data to pass to frontend
+    token_data_encoded = base64.b64encode(json.dumps({
+        'access_token': access_token,
+        'scopes': scopes,
+        'shop': shop,
+        'metadata': {
+            'shop_name': shop,
+            'api_version': SHOPIFY_API_VERSION
+        }
+    }).encode()).decode()
 
     # Redirect back to frontend with token data
     frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -110,3 +148,170 @@ async def shopify_oauth_callback(request: Request, shop: str, code: str, state:
     return RedirectResponse(url=redirect_url, status_code=302)
 
 
+@router.post("/products/bulk")
+async def bulk_import_products(
+    input: BulkProductsInput,
+    shop: str,
+    x_shopify_access_token: str = Header(...),
+):
+    """
+    Create many products with one Shopify bulk mutation: the products are
+    staged as a JSONL file, imported by bulkOperationRunMutation and the
+    per-row results are streamed back as NDJSON once the operation finishes.
+    """
+    shop = shop_domain(shop)
+    products = [product.dict() for product in input.products]
+    events = iter_bulk_product_import(shop, x_shopify_access_token, products)
+    try:
+        # Staging and starting the operation happen before the first event,
+        # so request errors still get a proper status code
+        first = await events.__anext__()
+    except ShopifyUserError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Shopify returned {e.response.status_code}")
+
+    async def ndjson():
+        yield json.dumps(first) + "\n"
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/export/{resource}")
+async def export_resource(
+    resource: str,
+    shop: str,
+    updated_since: Optional[str] = None,
+    page_size: Optional[int] = None,
+    x_shopify_access_token: str = Header(...),
+):
+    """
+    Stream every product, order or customer (optionally only those updated
+    after `updated_since`, ISO 8601) as NDJSON, one object per line.
+    Pages are fetched a bounded number ahead of the client, so a slow reader
+    pauses the export instead of it piling up in memory.
+    """
+    if resource not in EXPORT_QUERIES:
+        raise HTTPException(status_code=404, detail=f"Unknown export resource: {resource}")
+    try:
+        updated_since = normalize_updated_since(updated_since)
+    except ShopifyUserError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pages = iter_export_pages(shop_domain(shop), x_shopify_access_token, resource, page_size, updated_since)
+    try:
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = []
+    except ShopifyUserError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Shopify returned {e.response.status_code}")
+
+    def lines(page: list) -> str:
+        return "".join(json.dumps(item) + "\n" for item in page)
+
+    async def ndjson():
+        yield lines(first)
+        try:
+            async for page in pages:
+                yield lines(page)
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.post("/catalog/sync")
+async def sync_catalog_mirror(shop: str, full: bool = False, x_shopify_access_token: str = Header(...)):
+    """
+    Bring the local catalog mirror up to date: a full load the first time
+    (or with `full=true`), otherwise only products updated since the last
+    sync. Concurrent requests for a shop share one sync; `full=true` during
+    an incremental sync waits for it and then runs the full load.
+    """
+    mirror = catalog_mirror(shop)
+    task = start_catalog_sync(shop_domain(shop), x_shopify_access_token, full)
+    try:
+        result = await asyncio.shield(task)
+    except ShopifyUserError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Shopify returned {e.response.status_code}")
+    return {**result, "products": mirror.info()["products"]}
+
+
+@router.get("/catalog/search")
+async def search_catalog(
+    shop: str,
+    q: str,
+    limit: int = 10,
+    x_shopify_access_token: Optional[str] = Header(None),
+):
+    """
+    Full-text product search over the local mirror (title, vendor, type,
+    tags, description, SKUs); the last word matches as a prefix. With an
+    access token, a stale mirror is refreshed in the background.
+    """
+    mirror = catalog_mirror(shop)
+    start = time.perf_counter()
+    results = mirror.search(q, max(1, min(limit, 50)))
+    took_us = (time.perf_counter() - start) * 1e6
+    refresh_catalog_if_stale(normalize_shop(shop), x_shopify_access_token)
+    return {
+        "results": results,
+        "took_us": round(took_us, 1),
+        "synced_at": mirror.last_synced(),
+        "syncing": catalog_syncing(normalize_shop(shop)),
+    }
+
+
+@router.get("/catalog/lookup")
+async def lookup_catalog_product(
+    shop: str,
+    id: Optional[str] = None,
+    handle: Optional[str] = None,
+    sku: Optional[str] = None,
+    x_shopify_access_token: Optional[str] = Header(None),
+):
+    """One product from the local mirror by id (numeric or gid), handle or variant SKU."""
+    if not (id or handle or sku):
+        raise HTTPException(status_code=400, detail="Pass one of id, handle or sku")
+    mirror = catalog_mirror(shop)
+    product = mirror.lookup(product_id=id, handle=handle, sku=sku)
+    refresh_catalog_if_stale(normalize_shop(shop), x_shopify_access_token)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not in the catalog mirror")
+    return product
+
+
+@router.post("/webhooks")
+async def shopify_webhook(request: Request):
+    """Product create/update/delete webhooks keep the catalog mirror current between syncs."""
+    body = await request.body()
+    if not verify_webhook_hmac(body, request.headers.get("X-Shopify-Hmac-Sha256")):
+        raise HTTPException(status_code=401, detail="Invalid webhook HMAC")
+    topic = request.headers.get("X-Shopify-Topic", "")
+    if topic not in ("products/create", "products/update", "products/delete"):
+        return {"status": "ignored", "topic": topic}
+
+    mirror = catalog_mirror(request.headers.get("X-Shopify-Shop-Domain", ""))
+    if mirror.sync_cursor() is None:
+        # Never loaded; the first sync will pick the change up
+        return {"status": "not_mirrored"}
+    payload = json.loads(body)
+    if topic == "products/delete":
+        await asyncio.to_thread(mirror.delete_products, [payload["id"]])
+    else:
+        await asyncio.to_thread(mirror.upsert_products, [product_from_webhook(payload)])
+    return {"status": "ok", "topic": topic}
+
+
+@router.get("/stats")
+async def shopify_stats():
+    """Pooled clients, per-host GraphQL cost throttle state and catalog mirrors."""
+    return {**shop_client_info(), "catalog": catalog_mirror_info()}
@@ -0,0 +1,110 @@
+"""
+Local SQLite store for generated brands and their logo candidates, so follow-up
+actions (regenerating a logo, exporting a bundle) don't repeat provider calls.
+"""
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+from src.utils.data_dir import data_path
+
+BRAND_STORE_PATH = os.getenv("BRAND_STORE_PATH") or data_path("brand_store.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS brands (
+    id TEXT PRIMARY KEY,
+    idea TEXT NOT NULL,
+    brand_name TEXT,
+    tagline TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS logo_candidates (
+    brand_id TEXT NOT NULL REFERENCES brands(id),
+    url TEXT NOT NULL,
+    phash TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logo_candidates_brand ON logo_candidates(brand_id, served, rank);
+"""
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(BRAND_STORE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.executescript(SCHEMA)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def create_brand(idea: str, brand_name: str, tagline: str, data: Optional[dict] = None) -> str:
+    brand_id = uuid.uuid4().hex
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO brands (id, idea, brand_name, tagline, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (brand_id, idea, brand_name, tagline, json.dumps(data or {}), time.time()),
+        )
+    return brand_id
+
+def get_brand(brand_id: str) -> Optional[dict]:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM brands WHERE id = ?", (brand_id,)).fetchone()
+        if row is None:
+            return None
+        brand = dict(row)
+        brand["data"] = json.loads(brand["data"])
+        brand["logo_candidates"] = [
+            dict(c) for c in conn.execute(
+                "SELECT url, phash, rank, served FROM logo_candidates WHERE brand_id = ? ORDER BY rank",
+                (brand_id,),
+            )
+        ]
+    return brand
+
+def update_brand_data(brand_id: str, **fields) -> None:
+    """Merge `fields` into the brand's JSON data."""
+    with _connect() as conn:
+        row = conn.execute("SELECT data FROM brands WHERE id = ?", (brand_id,)).fetchone()
+        if row is None:
+            raise KeyError(brand_id)
+        data = json.loads(row["data"])
+        data.update(fields)
+        conn.execute("UPDATE brands SET data = ? WHERE id = ?", (json.dumps(data), brand_id))
+
+def add_logo_candidates(brand_id: str, candidates: List[dict]) -> None:
+    """Append ranked candidates ({url, phash}) after any already stored."""
+    with _connect() as conn:
+        start = conn.execute(
+            "SELECT COALESCE(MAX(rank) + 1, 0) FROM logo_candidates WHERE brand_id = ?", (brand_id,)
+        ).fetchone()[0]
+        now = time.time()
+        conn.executemany(
+            "INSERT INTO logo_candidates (brand_id, url, phash, rank, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(brand_id, c["url"], c["phash"], start + i, now) for i, c in enumerate(candidates)],
+        )
+
+def stored_logo_hashes(brand_id: str) -> List[int]:
+    with _connect() as conn:
+        return [
+            int(row["phash"], 16)
+            for row in conn.execute("SELECT phash FROM logo_candidates WHERE brand_id = ?", (brand_id,))
+        ]
+
+def take_next_logo(brand_id: str) -> Optional[dict]:
+    """Mark the best not-yet-served candidate as served and return it."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT rowid, url, phash, rank FROM logo_candidates WHERE brand_id = ? AND served = 0 ORDER BY rank LIMIT 1",
+            (brand_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE logo_candidates SET served = 1 WHERE rowid = ?", (row["rowid"],))
+        return {"url": row["url"], "phash": row["phash"], "rank": row["rank"]}
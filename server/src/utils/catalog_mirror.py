@@ -0,0 +1,398 @@
+"""
+Local per-shop mirror of the Shopify product catalog.
+
+Each shop gets its own SQLite file (data/catalog/{shop}.db) holding one row
+per product plus an FTS5 index over title, vendor, type, tags, description
+and SKUs, so product searches and lookups are answered from disk in well
+under a millisecond instead of with a live Admin API call.
+
+The mirror is filled by a full export, kept current by incremental exports
+of products updated since the last sync (minus CATALOG_SYNC_OVERLAP_SECONDS
+for clock skew) and by products/* webhooks in between. Writes carry
+Shopify's updated_at and never replace a newer row with an older one, so
+webhooks and syncs can arrive in any order.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from src.utils.data_dir import data_path
+
+load_dotenv()
+CATALOG_SYNC_OVERLAP_SECONDS = float(os.getenv("CATALOG_SYNC_OVERLAP_SECONDS", "300"))
+CATALOG_SEARCH_LIMIT = int(os.getenv("CATALOG_SEARCH_LIMIT", "10"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    handle TEXT,
+    title TEXT NOT NULL,
+    vendor TEXT,
+    product_type TEXT,
+    status TEXT,
+    tags TEXT,
+    description TEXT,
+    skus TEXT,
+    price_min REAL,
+    price_max REAL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_handle ON products (handle);
+CREATE TABLE IF NOT EXISTS product_skus (
+    sku TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    PRIMARY KEY (sku, product_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    title, vendor, product_type, tags, description, skus,
+    content='products', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, title, vendor, product_type, tags, description, skus)
+    VALUES (new.rowid, new.title, new.vendor, new.product_type, new.tags, new.description, new.skus);
+END;
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, vendor, product_type, tags, description, skus)
+    VALUES ('delete', old.rowid, old.title, old.vendor, old.product_type, old.tags, old.description, old.skus);
+END;
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, vendor, product_type, tags, description, skus)
+    VALUES ('delete', old.rowid, old.title, old.vendor, old.product_type, old.tags, old.description, old.skus);
+    INSERT INTO products_fts (rowid, title, vendor, product_type, tags, description, skus)
+    VALUES (new.rowid, new.title, new.vendor, new.product_type, new.tags, new.description, new.skus);
+END;
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+UPSERT = """
+INSERT INTO products (id, handle, title, vendor, product_type, status, tags, description, skus,
+                      price_min, price_max, updated_at, data)
+VALUES (:id, :handle, :title, :vendor, :product_type, :status, :tags, :description, :skus,
+        :price_min, :price_max, :updated_at, :data)
+ON CONFLICT (id) DO UPDATE SET
+    handle = excluded.handle, title = excluded.title, vendor = excluded.vendor,
+    product_type = excluded.product_type, status = excluded.status, tags = excluded.tags,
+    description = excluded.description, skus = excluded.skus, price_min = excluded.price_min,
+    price_max = excluded.price_max, updated_at = excluded.updated_at, data = excluded.data
+WHERE excluded.updated_at >= products.updated_at
+"""
+
+# Searched in order until there are enough results. Ranking all matches with
+# bm25() scores every row containing a word, and prefix terms merge every
+# matching doclist up front; on a large catalog either takes milliseconds for
+# common words, while whole-word tiers with LIMIT stay well under one.
+SEARCH_TIERS = ("{title}", "")
+SUMMARY_COLUMNS = "p.id, p.handle, p.title, p.vendor, p.product_type, p.status, p.price_min, p.price_max"
+
+SHOP_DOMAIN = re.compile(r"^[a-z0-9][a-z0-9.-]*$")
+HTML_TAG = re.compile(r"<[^>]+>")
+WORD = re.compile(r"\w+")
+
+def _utc(timestamp: Optional[str]) -> str:
+    """Any ISO 8601 timestamp -> `YYYY-MM-DDTHH:MM:SSZ` in UTC, so they compare as strings."""
+    if not timestamp:
+        return "1970-01-01T00:00:00Z"
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def product_gid(product_id) -> str:
+    product_id = str(product_id)
+    return product_id if product_id.startswith("gid://") else f"gid://shopify/Product/{product_id}"
+
+def product_from_webhook(payload: dict) -> dict:
+    """REST-shaped products/* webhook payload -> the GraphQL shape the export produces."""
+    tags = payload.get("tags") or []
+    return {
+        "id": payload.get("admin_graphql_api_id") or product_gid(payload["id"]),
+        "title": payload.get("title") or "",
+        "handle": payload.get("handle"),
+        "status": (payload.get("status") or "").upper() or None,
+        "vendor": payload.get("vendor"),
+        "productType": payload.get("product_type"),
+        "tags": [tag.strip() for tag in tags.split(",") if tag.strip()] if isinstance(tags, str) else tags,
+        "descriptionHtml": payload.get("body_html"),
+        "updatedAt": payload.get("updated_at"),
+        "variants": [
+            {
+                "id": variant.get("admin_graphql_api_id") or f"gid://shopify/ProductVariant/{variant.get('id')}",
+                "sku": variant.get("sku"),
+                "price": variant.get("price"),
+                "inventoryQuantity": variant.get("inventory_quantity"),
+            }
+            for variant in payload.get("variants") or []
+        ],
+    }
+
+def _row(product: dict) -> dict:
+    variants = product.get("variants") or []
+    prices = [float(variant["price"]) for variant in variants if variant.get("price") not in (None, "")]
+    skus = [variant["sku"] for variant in variants if variant.get("sku")]
+    return {
+        "id": product["id"],
+        "handle": product.get("handle"),
+        "title": product.get("title") or "",
+        "vendor": product.get("vendor"),
+        "product_type": product.get("productType"),
+        "status": product.get("status"),
+        "tags": " ".join(product.get("tags") or []),
+        "description": HTML_TAG.sub(" ", product.get("descriptionHtml") or "").strip(),
+        "skus": " ".join(skus),
+        "price_min": min(prices) if prices else None,
+        "price_max": max(prices) if prices else None,
+        "updated_at": _utc(product.get("updatedAt")),
+        "data": json.dumps(product),
+    }
+
+def fts_query(text: str, prefix: bool = False) -> Optional[str]:
+    """User text -> an FTS5 query of quoted terms (no operator injection), the last one optionally a prefix."""
+    terms = WORD.findall(text.lower())
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+class CatalogMirror:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.stats = {"searches": 0, "lookups": 0, "upserts": 0, "deletes": 0, "query_us": 0.0}
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def sync_cursor(self) -> Optional[str]:
+        """`updated_since` for the next incremental sync, or None if there was no full load yet."""
+        with self._lock:
+            return self._state("sync_cursor")
+
+    def last_synced(self) -> Optional[float]:
+        with self._lock:
+            value = self._state("last_synced")
+        return float(value) if value else None
+
+    def finish_sync(self, started: float) -> None:
+        """Record a completed sync that began at `started` (epoch seconds)."""
+        cursor = datetime.fromtimestamp(started - CATALOG_SYNC_OVERLAP_SECONDS, timezone.utc)
+        with self._lock:
+            self._set_state("sync_cursor", cursor.strftime("%Y-%m-%dT%H:%M:%SZ"))
+            self._set_state("last_synced", str(time.time()))
+
+    def upsert_products(self, products: List[dict]) -> None:
+        """Insert or update products in one transaction; older versions never replace newer ones."""
+        rows = [_row(product) for product in products]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(UPSERT, rows)
+                for row in rows:
+                    self._conn.execute("DELETE FROM product_skus WHERE product_id = ?", (row["id"],))
+                    current = self._conn.execute("SELECT skus FROM products WHERE id = ?", (row["id"],)).fetchone()
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO product_skus (sku, product_id) VALUES (?, ?)",
+                        [(sku, row["id"]) for sku in (current[0] or "").split()],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stats["upserts"] += len(rows)
+
+    def delete_products(self, product_ids: List[str]) -> int:
+        ids = [(product_gid(product_id),) for product_id in product_ids]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            deleted = self._conn.executemany("DELETE FROM products WHERE id = ?", ids).rowcount
+            self._conn.executemany("DELETE FROM product_skus WHERE product_id = ?", ids)
+            self._conn.execute("COMMIT")
+            self.stats["deletes"] += deleted
+        return deleted
+
+    def optimize(self) -> None:
+        """Merge the FTS index into one segment; after a bulk load this makes searches ~25% faster."""
+        with self._lock:
+            self._conn.execute("INSERT INTO products_fts (products_fts) VALUES ('optimize')")
+
+    def product_ids(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM products")}
+
+    def _timed(self, kind: str, start: float) -> None:
+        self.stats[kind] += 1
+        self.stats["query_us"] += (time.perf_counter() - start) * 1e6
+
+    def search(self, text: str, limit: int = CATALOG_SEARCH_LIMIT) -> List[dict]:
+        """
+        Products containing every word of `text`: an exact SKU first, then
+        title matches, then matches anywhere (vendor, type, tags, SKUs,
+        description); in mirror order within a tier. If whole words
+        find nothing, the last word is retried as a prefix ("lin" -> linen).
+        """
+        if fts_query(text) is None:
+            return []
+        start = time.perf_counter()
+        rows, seen = [], set()
+
+        def add(query: str, *params) -> None:
+            for row in self._conn.execute(query, params):
+                if row[0] not in seen and len(rows) < limit:
+                    seen.add(row[0])
+                    rows.append(row[1:])
+
+        with self._lock:
+            add(f"SELECT p.rowid, {SUMMARY_COLUMNS} FROM product_skus s JOIN products p ON p.id = s.product_id "
+                "WHERE s.sku = ? LIMIT ?", text.strip(), limit)
+            for prefix in (False, True):
+                query = fts_query(text, prefix)
+                for columns in SEARCH_TIERS:
+                    if len(rows) >= limit:
+                        break
+                    add(f"SELECT p.rowid, {SUMMARY_COLUMNS} FROM products p WHERE p.rowid IN "
+                        "(SELECT rowid FROM products_fts WHERE products_fts MATCH ? LIMIT ?) "
+                        "ORDER BY p.rowid",
+                        f"{columns}: ({query})" if columns else query, limit + len(seen))
+                if rows:
+                    break
+            self._timed("searches", start)
+        keys = ("id", "handle", "title", "vendor", "product_type", "status", "price_min", "price_max")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def lookup(self, product_id: Optional[str] = None, handle: Optional[str] = None,
+               sku: Optional[str] = None) -> Optional[dict]:
+        """One product, as exported from Shopify, by id (numeric or gid), handle or variant SKU."""
+        start = time.perf_counter()
+        with self._lock:
+            if product_id:
+                row = self._conn.execute("SELECT data FROM products WHERE id = ?", (product_gid(product_id),)).fetchone()
+            elif handle:
+                row = self._conn.execute("SELECT data FROM products WHERE handle = ?", (handle,)).fetchone()
+            elif sku:
+                row = self._conn.execute(
+                    "SELECT p.data FROM product_skus s JOIN products p ON p.id = s.product_id WHERE s.sku = ?", (sku,)
+                ).fetchone()
+            else:
+                row = None
+            self._timed("lookups", start)
+        return json.loads(row[0]) if row else None
+
+    def info(self) -> dict:
+        with self._lock:
+            products = self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            queries = self.stats["searches"] + self.stats["lookups"]
+            return {
+                **{k: v for k, v in self.stats.items() if k != "query_us"},
+                "products": products,
+                "sync_cursor": self._state("sync_cursor"),
+                "avg_query_us": round(self.stats["query_us"] / queries, 1) if queries else None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_mirrors: Dict[str, CatalogMirror] = {}
+_mirrors_lock = threading.Lock()
+
+def get_catalog_mirror(shop: str) -> CatalogMirror:
+    """The mirror for a normalized shop domain (my-shop.myshopify.com)."""
+    if not SHOP_DOMAIN.match(shop):
+        raise ValueError(f"Invalid shop domain: {shop}")
+    with _mirrors_lock:
+        mirror = _mirrors.get(shop)
+        if mirror is None:
+            mirror = _mirrors[shop] = CatalogMirror(data_path("catalog", f"{shop}.db"))
+        return mirror
+
+def catalog_mirror_info() -> dict:
+    with _mirrors_lock:
+        mirrors = dict(_mirrors)
+    return {shop: mirror.info() for shop, mirror in mirrors.items()}
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import statistics
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Catalog mirror load rate and local search/lookup latency")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    colors = "red blue green black white grey navy pink olive cream tan rust teal plum sand".split()
+    materials = "wool cotton linen silk leather denim cashmere bamboo ceramic oak walnut brass steel glass velvet".split()
+    nouns = ("scarf shirt dress jacket hat boots sneakers socks hoodie sweater coat skirt jeans belt wallet bag backpack "
+             "mug teapot bowl plate vase lamp chair table stool shelf rug cushion blanket throw candle diffuser soap "
+             "serum cream balm shampoo towel robe apron planter clock mirror frame tray basket bottle tumbler notebook "
+             "pen case watch bracelet necklace ring earrings beanie gloves").split()
+    adjectives = "classic everyday organic handmade vintage slim relaxed cozy minimalist rustic modern soft heavy light".split()
+    filler = [f"{a}{b}" for a in ("ka", "lo", "mi", "ne", "ru", "sa", "te", "vo") for b in ("bar", "dex", "fin", "gol", "lum",
+                                                                                            "mor", "pix", "quen", "tor", "zan")]
+    weights = [1 / (n + 1) for n in range(len(filler))]
+
+    def fake_product(n: int) -> dict:
+        title = f"{rng.choice(adjectives)} {rng.choice(colors)} {rng.choice(materials)} {rng.choice(nouns)}".title()
+        words = title.lower().split() + rng.choices(filler, weights=weights, k=40)
+        rng.shuffle(words)
+        return {
+            "id": f"gid://shopify/Product/{n}",
+            "title": title,
+            "handle": f"{title.lower().replace(' ', '-')}-{n}",
+            "vendor": rng.choice(["Acme", "Knitco", "Lumen", "Oakline", "Brightside"]),
+            "productType": title.split()[-1],
+            "tags": rng.sample(colors + materials, 2),
+            "descriptionHtml": f"<p>{' '.join(words)}.</p>",
+            "status": "ACTIVE",
+            "updatedAt": "2024-06-01T12:00:00Z",
+            "variants": [{"id": f"gid://shopify/ProductVariant/{n}", "sku": f"SKU-{n:06d}", "price": f"{rng.randint(8, 200)}.00"}],
+        }
+
+    mirror = CatalogMirror(os.path.join(tempfile.mkdtemp(), "catalog.db"))
+    products = [fake_product(n) for n in range(1, args.products + 1)]
+    start = time.perf_counter()
+    for offset in range(0, len(products), 250):
+        mirror.upsert_products(products[offset:offset + 250])
+    mirror.optimize()
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {args.products} products in {elapsed:.2f} s ({args.products / elapsed:.0f}/s)")
+
+    def measure(fn) -> list:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1e6)
+        return timings
+
+    def report(name: str, timings: list) -> None:
+        timings.sort()
+        print(f"{name:>34}: median {statistics.median(timings):6.0f} us, p99 {timings[int(len(timings) * 0.99)]:6.0f} us")
+
+    report("lookup by id", measure(lambda: mirror.lookup(product_id=str(rng.randint(1, args.products)))))
+    report("lookup by handle", measure(lambda: mirror.lookup(handle=products[rng.randrange(args.products)]["handle"])))
+    report("lookup by sku", measure(lambda: mirror.lookup(sku=f"SKU-{rng.randint(1, args.products):06d}")))
+    for query in ("scarf", "wool scarf", "red wool scarf", "navy cashmere beanie", "teapot", "brass lamp",
+                  "knitco", "SKU-000123", "vintage oak", "lin", "zanbar", "waterproof kayak"):
+        report(f"search {query!r}", measure(lambda: mirror.search(query)))
@@ -0,0 +1,102 @@
+"""
+Process-wide AgentMail client.
+
+One AsyncAgentMail instance backed by a single keep-alive httpx connection
+pool is shared by the webhook setup and the support responder, so each email
+reuses an open connection instead of paying TCP + TLS setup again.
+"""
+import os
+from typing import Optional
+import httpx
+from agentmail import AsyncAgentMail
+from agentmail.environment import AgentMailEnvironment
+from dotenv import load_dotenv
+
+load_dotenv()
+API_KEY = os.getenv("AGENT_MAIL_API_KEY")
+# Point at src.dev.agentmail_standin (or another deployment) instead of the public API
+AGENT_MAIL_BASE_URL = os.getenv("AGENT_MAIL_BASE_URL")
+AGENT_MAIL_MAX_CONNECTIONS = int(os.getenv("AGENT_MAIL_MAX_CONNECTIONS", "20"))
+AGENT_MAIL_TIMEOUT = float(os.getenv("AGENT_MAIL_TIMEOUT", "60"))
+
+_client: Optional[AsyncAgentMail] = None
+_http: Optional[httpx.AsyncClient] = None
+
+def _environment() -> AgentMailEnvironment:
+    if not AGENT_MAIL_BASE_URL:
+        return AgentMailEnvironment.PROD
+    base = AGENT_MAIL_BASE_URL.rstrip("/")
+    return AgentMailEnvironment(http=base, websockets=base.replace("http", "ws", 1))
+
+def new_agentmail_client(http_client: Optional[httpx.AsyncClient] = None) -> AsyncAgentMail:
+    if not API_KEY:
+        raise RuntimeError("AGENT_MAIL_API_KEY not set")
+    return AsyncAgentMail(api_key=API_KEY, environment=_environment(), httpx_client=http_client)
+
+def create_agentmail_client() -> AsyncAgentMail:
+    global _client, _http
+    if _client is None:
+        if not API_KEY:
+            raise RuntimeError("AGENT_MAIL_API_KEY not set")
+        _http = httpx.AsyncClient(
+            timeout=AGENT_MAIL_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=AGENT_MAIL_MAX_CONNECTIONS,
+                max_keepalive_connections=AGENT_MAIL_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+        _client = new_agentmail_client(_http)
+    return _client
+
+async def close_agentmail_client() -> None:
+    global _client, _http
+    if _http is not None:
+        await _http.aclose()
+    _client = None
+    _http = None
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import time
+
+    parser = argparse.ArgumentParser(description="Per-email AgentMail send latency: new client per email vs shared client")
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=30,
+                        help="connection setup cost simulated by the local stand-in")
+    args = parser.parse_args()
+
+    if not AGENT_MAIL_BASE_URL:
+        from src.dev.agentmail_standin import serve
+        server = serve(port=0, handshake_ms=args.handshake_ms)
+        AGENT_MAIL_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+        API_KEY = API_KEY or "standin"
+        print(f"Using local stand-in with {args.handshake_ms:.0f} ms connection setup")
+
+    async def send(client: AsyncAgentMail, i: int) -> None:
+        await client.inboxes.messages.send(
+            inbox_id="support@standin", to="customer@example.com", labels=["support"],
+            subject=f"Re: order {i}", text="Thanks for reaching out!",
+        )
+
+    async def per_email() -> None:
+        for i in range(args.emails):
+            # What respond_to_support_email used to do for every email
+            async with httpx.AsyncClient(timeout=AGENT_MAIL_TIMEOUT) as http_client:
+                await send(new_agentmail_client(http_client), i)
+
+    async def shared() -> None:
+        client = create_agentmail_client()
+        for i in range(args.emails):
+            await send(client, i)
+        await close_agentmail_client()
+
+    async def main() -> None:
+        for name, fn in (("per-email client", per_email), ("shared client", shared)):
+            start = time.perf_counter()
+            await fn()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>17}: {elapsed / args.emails * 1000:.2f} ms per email")
+
+    asyncio.run(main())
@@ -0,0 +1,11 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+DATA_DIR = os.getenv("FOUNDRY_DATA_DIR", "data")
+
+def data_path(*parts: str) -> str:
+    """Path under the server's local data directory, creating parent dirs."""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path
@@ -1,12 +1,12 @@
 import os
 from dotenv import load_dotenv
-from agentmail import AgentMail
 import os
+from src.utils.create_agentmail import create_agentmail_client
 
 # Get the variable, returning None if not found
 load_dotenv()
 
-def email_setup():
+async def email_setup():
     api_key = os.getenv("AGENT_MAIL_API_KEY")
     ngrok_url = os.getenv("NGROK_URL")
 
@@ -19,14 +19,14 @@ def email_setup():
         return
 
     print("Setting up email webhook...")
-    client = AgentMail(api_key=api_key)
+    client = create_agentmail_client()
 
-    all_webhooks = client.webhooks.list()
+    all_webhooks = await client.webhooks.list()
     if any(webhook.url == f"{ngrok_url}/email/webhook" for webhook in all_webhooks.webhooks):
         print("Email webhook already exists.")
         return
 
-    client.webhooks.create(
+    await client.webhooks.create(
         url=f"{ngrok_url}/email/webhook",
         event_types=['message.received'],
     )
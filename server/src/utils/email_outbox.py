@@ -0,0 +1,366 @@
+"""
+Persisted, rate-limited outbound queue for support replies.
+
+Replies are written to the support database instead of being sent inline. A
+dispatcher drains the outbox with a token bucket per sending inbox
+(OUTBOX_RATE_PER_SECOND, OUTBOX_BURST), claims ready replies in batches and
+sends each batch concurrently. Failed sends are retried with jittered
+backoff (a 429 also empties that inbox's bucket and honours Retry-After)
+and marked failed after OUTBOX_MAX_ATTEMPTS. Every send carries an
+idempotency key generated when the reply is queued (a uuid4, unlike the
+database id it is never reused after the database is reset), so a retry after
+an ambiguous failure cannot deliver the same reply twice.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from src.utils.email_queue import SUPPORT_DB_PATH, connect_support_db, retry_delay
+
+load_dotenv()
+OUTBOX_RATE_PER_SECOND = float(os.getenv("OUTBOX_RATE_PER_SECOND", "2"))
+OUTBOX_BURST = int(os.getenv("OUTBOX_BURST", "10"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1.0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbound_emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    inbox_id TEXT NOT NULL,
+    idempotency_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbound_emails_ready ON outbound_emails(status, inbox_id, next_attempt_at);
+"""
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> int:
+        self._refill()
+        return int(self.tokens)
+
+    def take(self, n: int) -> None:
+        self._refill()
+        self.tokens -= n
+
+    def seconds_until(self, n: int = 1) -> float:
+        self._refill()
+        return max(0.0, (n - self.tokens) / self.rate)
+
+    def drain(self, seconds: float = 0.0) -> None:
+        """Rate limited by the server: stop sending from this inbox for `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+class Outbox:
+    def __init__(self, path: str = SUPPORT_DB_PATH, max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = connect_support_db(path)
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "rate_limited": 0}
+        # Set by the dispatcher so new replies go out without waiting for a poll
+        self.on_enqueue: Optional[Callable[[], None]] = None
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbound_emails)")}
+        if "idempotency_key" not in columns:
+            # Databases from before the column: replies still queued keep the key they may already have been sent with
+            self._conn.execute("ALTER TABLE outbound_emails ADD COLUMN idempotency_key TEXT")
+            self._conn.execute("UPDATE outbound_emails SET idempotency_key = 'outbox-' || id")
+
+    def enqueue(self, inbox_id: str, **message) -> str:
+        """Queue a reply; `message` holds the keyword arguments for messages.send. Returns its idempotency key."""
+        now = time.time()
+        idempotency_key = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbound_emails (inbox_id, idempotency_key, payload, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (inbox_id, idempotency_key, json.dumps(message), now, now),
+            )
+            self.stats["queued"] += 1
+        if self.on_enqueue is not None:
+            self.on_enqueue()
+        return idempotency_key
+
+    def ready_inboxes(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT inbox_id FROM outbound_emails WHERE status = 'pending' AND next_attempt_at <= ?",
+                (time.time(),),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def next_attempt_in(self) -> Optional[float]:
+        """Seconds until the next reply that is waiting on a retry delay becomes ready; ready ones don't count."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbound_emails WHERE status = 'pending' AND next_attempt_at > ?",
+                (now,),
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    def claim(self, inbox_id: str, limit: int) -> List[dict]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, idempotency_key, payload, attempts FROM outbound_emails "
+                    "WHERE status = 'pending' AND inbox_id = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (inbox_id, time.time(), limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbound_emails SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {
+                "id": row[0], "idempotency_key": row[1], "inbox_id": inbox_id,
+                "message": json.loads(row[2]), "attempts": row[3],
+            }
+            for row in rows
+        ]
+
+    def complete(self, outbox_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM outbound_emails WHERE id = ?", (outbox_id,))
+            self.stats["sent"] += 1
+
+    def fail(self, outbox_id: int, attempts: int, error: str, retry_after: Optional[float] = None) -> None:
+        attempts += 1
+        with self._lock:
+            if retry_after is not None:
+                self.stats["rate_limited"] += 1
+            if attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE outbound_emails SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, outbox_id),
+                )
+                self.stats["failed"] += 1
+            else:
+                delay = max(retry_after or 0.0, retry_delay(attempts))
+                self._conn.execute(
+                    "UPDATE outbound_emails SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (attempts, error, time.time() + delay, outbox_id),
+                )
+                self.stats["retried"] += 1
+
+    def recover(self) -> int:
+        """Return replies left `sending` by a crash to the queue; idempotency keys make the resend safe."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE outbound_emails SET status = 'pending' WHERE status = 'sending'"
+            ).rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbound_emails GROUP BY status").fetchall())
+            stats = dict(self.stats)
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "failed_total": counts.get("failed", 0),
+            **stats,
+        }
+
+Sender = Callable[[str, dict, str], Awaitable[None]]
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to back off if `error` is an HTTP 429 from the API, else None."""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After") or 1.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+class OutboxDispatcher:
+    """Sends queued replies, at most OUTBOX_CONCURRENCY at once and within each inbox's token bucket."""
+
+    def __init__(self, outbox: Outbox, send: Sender, concurrency: int = OUTBOX_CONCURRENCY):
+        self.outbox = outbox
+        self.send = send
+        self.concurrency = concurrency
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight = set()
+
+    def notify(self) -> None:
+        if self._wakeup is None or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _bucket(self, inbox_id: str) -> TokenBucket:
+        if inbox_id not in self.buckets:
+            self.buckets[inbox_id] = TokenBucket(OUTBOX_RATE_PER_SECOND, OUTBOX_BURST)
+        return self.buckets[inbox_id]
+
+    async def start(self) -> None:
+        recovered = self.outbox.recover()
+        if recovered:
+            print(f"Re-queued {recovered} outbound emails left in sending")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.outbox.on_enqueue = self.notify
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self.outbox.on_enqueue = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            # Sleep until a retry delay expires, a bucket refills or (via notify) a send
+            # finishes or a reply is queued; ready replies blocked on those don't shorten it
+            wait = OUTBOX_POLL_SECONDS
+            next_attempt = self.outbox.next_attempt_in()
+            if next_attempt is not None:
+                wait = min(wait, next_attempt)
+
+            for inbox_id in self.outbox.ready_inboxes():
+                free = self.concurrency - len(self._in_flight)
+                if free <= 0:
+                    # Every slot is busy; the next finished send wakes the loop
+                    break
+                bucket = self._bucket(inbox_id)
+                batch = min(bucket.available(), OUTBOX_BATCH_SIZE, free)
+                if batch < 1:
+                    wait = min(wait, bucket.seconds_until(1))
+                    continue
+                jobs = self.outbox.claim(inbox_id, batch)
+                bucket.take(len(jobs))
+                for job in jobs:
+                    task = asyncio.create_task(self._send(job))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(wait, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, job: dict) -> None:
+        try:
+            await self.send(job["inbox_id"], job["message"], job["idempotency_key"])
+            self.outbox.complete(job["id"])
+        except Exception as e:
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                self._bucket(job["inbox_id"]).drain(retry_after)
+            print(f"Error sending outbound email {job['id']} (attempt {job['attempts'] + 1}): {e}")
+            self.outbox.fail(job["id"], job["attempts"], str(e), retry_after=retry_after)
+        finally:
+            # A slot just freed up
+            self.notify()
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> Outbox:
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from src.dev.agentmail_standin import serve
+    from src.utils import create_agentmail
+
+    parser = argparse.ArgumentParser(description="Deliver a burst of replies to a rate-limited AgentMail stand-in")
+    parser.add_argument("--replies", type=int, default=200)
+    parser.add_argument("--server-rate", type=float, default=50, help="stand-in sends per second per inbox")
+    args = parser.parse_args()
+
+    server = serve(port=0, rate_limit=args.server_rate)
+    create_agentmail.AGENT_MAIL_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    create_agentmail.API_KEY = "standin"
+    client = create_agentmail.create_agentmail_client()
+    no_retries = {"max_retries": 0}
+
+    def reply(i: int) -> dict:
+        return {"to": "customer@example.com", "labels": ["support"], "subject": f"Re: order {i}", "text": "Thanks!"}
+
+    async def inline() -> None:
+        # What the responder used to do: every reply sent as soon as it was drafted
+        results = await asyncio.gather(*(
+            client.inboxes.messages.send(inbox_id="inline@standin", request_options=no_retries, **reply(i))
+            for i in range(args.replies)
+        ), return_exceptions=True)
+        lost = sum(isinstance(result, Exception) for result in results)
+        print(f"   inline: {args.replies - lost}/{args.replies} delivered, {lost} lost to 429s")
+
+    async def queued() -> None:
+        async def send(inbox_id: str, message: dict, idempotency_key: str) -> None:
+            await client.inboxes.messages.send(
+                inbox_id=inbox_id, idempotency_key=idempotency_key, request_options=no_retries, **message
+            )
+
+        global OUTBOX_RATE_PER_SECOND, OUTBOX_BURST
+        OUTBOX_RATE_PER_SECOND, OUTBOX_BURST = args.server_rate, int(args.server_rate)
+        with tempfile.TemporaryDirectory() as directory:
+            outbox = Outbox(os.path.join(directory, "support.db"))
+            dispatcher = OutboxDispatcher(outbox, send)
+            await dispatcher.start()
+            start = time.perf_counter()
+            for i in range(args.replies):
+                outbox.enqueue("queued@standin", **reply(i))
+            while outbox.counts()["sent"] + outbox.counts()["failed"] < args.replies:
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - start
+            await dispatcher.stop()
+            counts = outbox.counts()
+            print(f"   outbox: {counts['sent']}/{args.replies} delivered in {elapsed:.2f}s "
+                  f"({counts['sent'] / elapsed:.0f}/s, {counts['rate_limited']} 429s)")
+
+    async def main() -> None:
+        await inline()
+        await queued()
+        await create_agentmail.close_agentmail_client()
+
+    asyncio.run(main())
@@ -0,0 +1,269 @@
+"""
+Durable queue for inbound support emails.
+
+The /email/webhook handler only persists the raw payload (one SQLite insert
+in WAL mode) and returns, so AgentMail never waits on the LLM. A pool of
+async workers drains the queue with bounded concurrency; failed jobs are
+retried with exponential backoff and moved to a dead-letter table after
+EMAIL_QUEUE_MAX_ATTEMPTS; payloads the handler cannot parse
+(UnprocessableEmail) are dead-lettered straight away. Jobs left `processing` by a crash are picked up
+again on start-up. Mail that triage decides not to answer is kept in a
+separate table where it can be reviewed and, if triage was wrong, released
+into the queue.
+"""
+import asyncio
+import inspect
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional, Union
+from dotenv import load_dotenv
+from src.utils.data_dir import data_path
+
+load_dotenv()
+SUPPORT_DB_PATH = os.getenv("SUPPORT_DB_PATH") or data_path("support.db")
+EMAIL_QUEUE_CONCURRENCY = int(os.getenv("EMAIL_QUEUE_CONCURRENCY", "8"))
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv("EMAIL_QUEUE_MAX_ATTEMPTS", "5"))
+EMAIL_QUEUE_POLL_SECONDS = float(os.getenv("EMAIL_QUEUE_POLL_SECONDS", "1.0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inbound_emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inbound_emails_ready ON inbound_emails(status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS dead_letter_emails (
+    id INTEGER PRIMARY KEY,
+    payload BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS triaged_emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload BLOB NOT NULL,
+    triage TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_triaged_emails_triage ON triaged_emails(triage, id);
+"""
+
+class UnprocessableEmail(ValueError):
+    """Raised by a handler for a payload that no retry can fix (malformed JSON, missing fields)."""
+
+def connect_support_db(path: str = SUPPORT_DB_PATH) -> sqlite3.Connection:
+    """Connection to the support database, shared by the support queues and stores."""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def retry_delay(attempts: int, base: float = 2.0, cap: float = 300.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempts)))
+
+class EmailQueue:
+    def __init__(self, path: str = SUPPORT_DB_PATH, max_attempts: int = EMAIL_QUEUE_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = connect_support_db(path)
+        self._conn.executescript(SCHEMA)
+        self.stats = {"enqueued": 0, "processed": 0, "retried": 0, "dead_lettered": 0, "triaged": 0, "released": 0}
+
+    def enqueue(self, payload: bytes) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO inbound_emails (payload, next_attempt_at, created_at) VALUES (?, ?, ?)",
+                (payload, now, now),
+            )
+            self.stats["enqueued"] += 1
+            return cursor.lastrowid
+
+    def hold(self, payload: bytes, triage: str) -> int:
+        """Keep a message triage decided not to answer, for review."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO triaged_emails (payload, triage, created_at) VALUES (?, ?, ?)",
+                (payload, triage, time.time()),
+            )
+            self.stats["triaged"] += 1
+            return cursor.lastrowid
+
+    def held(self, triage: Optional[str] = None, limit: int = 50) -> List[tuple]:
+        """Most recent held messages as (id, triage, payload, created_at), optionally of one triage class."""
+        with self._lock:
+            if triage is None:
+                return self._conn.execute(
+                    "SELECT id, triage, payload, created_at FROM triaged_emails ORDER BY id DESC LIMIT ?", (limit,)
+                ).fetchall()
+            return self._conn.execute(
+                "SELECT id, triage, payload, created_at FROM triaged_emails WHERE triage = ? ORDER BY id DESC LIMIT ?",
+                (triage, limit),
+            ).fetchall()
+
+    def release(self, held_id: int) -> Optional[int]:
+        """Move a held message into the queue to be answered; returns the job id, or None if not held."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO inbound_emails (payload, next_attempt_at, created_at) "
+                    "SELECT payload, ?, ? FROM triaged_emails WHERE id = ?",
+                    (now, now, held_id),
+                )
+                job_id = cursor.lastrowid if cursor.rowcount else None
+                self._conn.execute("DELETE FROM triaged_emails WHERE id = ?", (held_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if job_id is not None:
+                self.stats["released"] += 1
+        return job_id
+
+    def claim(self, limit: int) -> List[tuple]:
+        """Mark up to `limit` ready jobs as processing and return (id, payload, attempts)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts FROM inbound_emails "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (time.time(), limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE inbound_emails SET status = 'processing' WHERE id = ?",
+                    [(row[0],) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def complete(self, job_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM inbound_emails WHERE id = ?", (job_id,))
+            self.stats["processed"] += 1
+
+    def fail(self, job_id: int, attempts: int, error: str, permanent: bool = False) -> None:
+        """Schedule a retry, or dead-letter the job once it is out of attempts or `permanent`."""
+        attempts += 1
+        with self._lock:
+            if permanent or attempts >= self.max_attempts:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO dead_letter_emails (id, payload, attempts, last_error, created_at, failed_at) "
+                        "SELECT id, payload, ?, ?, created_at, ? FROM inbound_emails WHERE id = ?",
+                        (attempts, error, time.time(), job_id),
+                    )
+                    self._conn.execute("DELETE FROM inbound_emails WHERE id = ?", (job_id,))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self.stats["dead_lettered"] += 1
+            else:
+                self._conn.execute(
+                    "UPDATE inbound_emails SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (attempts, error, time.time() + retry_delay(attempts), job_id),
+                )
+                self.stats["retried"] += 1
+
+    def recover(self) -> int:
+        """Return jobs stuck in `processing` (e.g. after a crash) to the queue."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE inbound_emails SET status = 'pending' WHERE status = 'processing'"
+            ).rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM inbound_emails GROUP BY status").fetchall())
+            dead = self._conn.execute("SELECT COUNT(*) FROM dead_letter_emails").fetchone()[0]
+            held = self._conn.execute("SELECT COUNT(*) FROM triaged_emails").fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "processing": counts.get("processing", 0),
+            "dead_letter": dead,
+            "held": held,
+            **self.stats,
+        }
+
+Handler = Callable[[bytes], Union[None, Awaitable[None]]]
+
+class EmailQueueWorker:
+    """Drains an EmailQueue with at most `concurrency` jobs in flight."""
+
+    def __init__(self, queue: EmailQueue, handler: Handler, concurrency: int = EMAIL_QUEUE_CONCURRENCY):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight = set()
+
+    def notify(self) -> None:
+        """Wake the worker right away instead of waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Re-queued {recovered} inbound emails left in processing")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            free = self.concurrency - len(self._in_flight)
+            jobs = self.queue.claim(free) if free > 0 else []
+            for job_id, payload, attempts in jobs:
+                task = asyncio.create_task(self._process(job_id, payload, attempts))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+            if jobs and len(self._in_flight) < self.concurrency:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=EMAIL_QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, job_id: int, payload: bytes, attempts: int) -> None:
+        try:
+            if inspect.iscoroutinefunction(self.handler):
+                await self.handler(payload)
+            else:
+                await asyncio.to_thread(self.handler, payload)
+            self.queue.complete(job_id)
+        except UnprocessableEmail as e:
+            print(f"Dead-lettering unprocessable inbound email {job_id}: {e}")
+            self.queue.fail(job_id, attempts, str(e), permanent=True)
+        except Exception as e:
+            print(f"Error processing inbound email {job_id} (attempt {attempts + 1}): {e}")
+            self.queue.fail(job_id, attempts, str(e))
+        finally:
+            # A slot just freed up
+            self.notify()
@@ -0,0 +1,106 @@
+"""
+Rule-based triage of inbound support mail before it reaches the LLM.
+
+Auto-responders (out-of-office notices included), bounces, mailing lists, mail already
+flagged as spam and our own outgoing mail are recognised from headers, labels
+and the mail-system sender addresses, and never get a drafted reply (replying
+to an auto-responder is how mail loops start). Subject and body wording is
+deliberately not used: customers write "before I go on vacation" or ask about
+paying with cryptocurrency too. Neither is X-Auto-Response-Suppress, which
+Outlook and ticketing systems also set on mail written by people. Everything else is "support"; the webhook keeps
+the rest for review rather than dropping it.
+"""
+import os
+import re
+import threading
+from email.utils import parseaddr
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUPPORT = "support"
+TRIAGE_CLASSES = ("self", "bounce", "auto_reply", "newsletter", "spam", SUPPORT)
+
+BOUNCE_SENDER = re.compile(r"^(mailer-daemon|postmaster|mail-daemon|bounces?)([+\-@]|$)", re.IGNORECASE)
+
+class EmailTriage:
+    def __init__(self, own_addresses: Optional[list] = None):
+        own = own_addresses if own_addresses is not None else [os.getenv("AGENT_MAIL", "")]
+        self.own_addresses = {address.strip().lower() for address in own if address}
+        self._lock = threading.Lock()
+        self.counts = {name: 0 for name in TRIAGE_CLASSES}
+
+    def _classify(self, message: dict) -> str:
+        headers = {key.lower(): str(value).lower() for key, value in (message.get("headers") or {}).items()}
+        labels = {label.lower() for label in message.get("labels") or []}
+        _, sender = parseaddr(message.get("from_") or message.get("from") or "")
+        sender = sender.lower()
+        local_part = sender.split("@", 1)[0]
+
+        if sender in self.own_addresses or "sent" in labels:
+            return "self"
+        if (
+            BOUNCE_SENDER.match(local_part)
+            or "report-type=delivery-status" in headers.get("content-type", "")
+            or "x-failed-recipients" in headers
+        ):
+            return "bounce"
+        auto_submitted = headers.get("auto-submitted", "no")
+        if (
+            auto_submitted != "no"
+            or "x-autoreply" in headers
+            or "x-autorespond" in headers
+            or headers.get("precedence") == "auto_reply"
+        ):
+            return "auto_reply"
+        if (
+            "list-unsubscribe" in headers
+            or "list-id" in headers
+            or headers.get("precedence") in ("bulk", "list", "junk")
+        ):
+            return "newsletter"
+        if "spam" in labels or headers.get("x-spam-flag") == "yes":
+            return "spam"
+        return SUPPORT
+
+    def classify(self, message: dict) -> str:
+        """Triage class of an AgentMail message dict; only "support" should get a reply."""
+        result = self._classify(message)
+        with self._lock:
+            self.counts[result] += 1
+        return result
+
+    def info(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+if __name__ == "__main__":
+    import time
+
+    triage = EmailTriage(["support@example.agentmail.to"])
+    samples = [
+        ({"from_": "Jane <jane@gmail.com>", "subject": "Where is my order?", "text": "Ordered last week."}, SUPPORT),
+        ({"from_": "MAILER-DAEMON@mx.example.com", "subject": "Undelivered Mail Returned to Sender"}, "bounce"),
+        ({"from_": "bob@corp.com", "subject": "Re: your order",
+          "headers": {"X-Auto-Response-Suppress": "All"}}, SUPPORT),
+        ({"from_": "bob@corp.com", "subject": "Automatic reply: Re: your order",
+          "headers": {"X-Auto-Response-Suppress": "All", "Auto-Submitted": "auto-replied"}}, "auto_reply"),
+        ({"from_": "bob@corp.com", "subject": "Re: order", "headers": {"Auto-Submitted": "auto-replied"}}, "auto_reply"),
+        ({"from_": "deals@shop.com", "subject": "Big sale", "headers": {"List-Unsubscribe": "<mailto:u@shop.com>"}}, "newsletter"),
+        ({"from_": "seo@agency.biz", "subject": "Increase your website traffic", "headers": {"X-Spam-Flag": "YES"}}, "spam"),
+        ({"from_": "Ann <ann@gmail.com>", "subject": "Payment", "text": "Can I pay with cryptocurrency?"}, SUPPORT),
+        ({"from_": "Ann <ann@gmail.com>", "subject": "Need my order before I go on vacation"}, SUPPORT),
+        ({"from_": "marketing@smallbrand.com", "subject": "Wholesale order question"}, SUPPORT),
+        ({"from_": "support@example.agentmail.to", "subject": "Hey Jane! Re: Where is my order?"}, "self"),
+    ]
+    for message, expected in samples:
+        got = triage.classify(message)
+        print(f"{expected:>14} -> {got}{'' if got == expected else '  MISMATCH'}")
+
+    rounds = 20000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message, _ in samples:
+            triage.classify(message)
+    print(f"{(time.perf_counter() - start) / (rounds * len(samples)) * 1e6:.1f} us per message")
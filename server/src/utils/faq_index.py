@@ -0,0 +1,282 @@
+"""
+Local BM25 index over curated FAQ answers and approved support replies.
+
+Every question phrasing is indexed as its own short document pointing at an
+answer. Candidates are ranked with BM25 over an inverted index; a match is
+only used when a phrasing is almost fully covered by the email
+(idf-weighted share of its terms, FAQ_MIN_CONFIDENCE), the phrasing in turn
+covers most of what the email says (FAQ_MIN_COVERAGE, so "what is your return
+policy? my item arrived broken" is not answered with the policy alone), the
+BM25 score is at least FAQ_MIN_SCORE, it clearly beats any other answer that
+also qualifies (FAQ_MIN_MARGIN), and the email is short enough to be a single
+question. Everything else goes to the LLM.
+
+No FAQ answers ship with the server: answers state store policy, so each
+deployment points SUPPORT_FAQ_PATH at its own reviewed file. Without one,
+only replies approved through /email/faq/approved are matched.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import List, Optional
+from dotenv import load_dotenv
+from src.utils.email_queue import SUPPORT_DB_PATH, connect_support_db
+
+load_dotenv()
+SUPPORT_FAQ_PATH = os.getenv("SUPPORT_FAQ_PATH")
+FAQ_MIN_CONFIDENCE = float(os.getenv("FAQ_MIN_CONFIDENCE", "0.8"))
+FAQ_MIN_COVERAGE = float(os.getenv("FAQ_MIN_COVERAGE", "0.4"))
+FAQ_MIN_MARGIN = float(os.getenv("FAQ_MIN_MARGIN", "1.3"))
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "2.0"))
+FAQ_MAX_QUERY_TERMS = int(os.getenv("FAQ_MAX_QUERY_TERMS", "12"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could did do does for from get got had has have hello hey hi
+how i if in is it its me my of on or our please so than thank thanks that the their them then there this to
+us was we were what which who will with would you your
+""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS approved_replies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+def _stem(token: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+class FaqIndex:
+    def __init__(self, entries: List[dict]):
+        """`entries` are {"id", "questions": [...], "answer"} dicts."""
+        self.answers = []
+        self.doc_answer = []
+        self.doc_terms = []
+        self.postings = defaultdict(list)
+        lengths = []
+        for entry in entries:
+            answer_index = len(self.answers)
+            self.answers.append({"id": entry["id"], "answer": entry["answer"]})
+            for question in entry["questions"]:
+                tokens = tokenize(question)
+                if not tokens:
+                    continue
+                doc = len(self.doc_answer)
+                self.doc_answer.append(answer_index)
+                self.doc_terms.append(set(tokens))
+                lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    self.postings[term].append((doc, tf))
+
+        n = len(lengths)
+        avg_length = sum(lengths) / n if n else 0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        # Per-document BM25 length normalisation, precomputed
+        self.norm = [BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length) for length in lengths]
+        self.doc_weight = [sum(self.idf[t] for t in terms) for terms in self.doc_terms]
+        # Email terms no phrasing uses count as much as an average indexed term
+        self.unseen_idf = sum(self.idf.values()) / len(self.idf) if self.idf else 1.0
+
+    def search(self, text: str, limit: int = 5) -> List[dict]:
+        tokens = tokenize(text)
+        query_terms = set(tokens)
+        scores = defaultdict(float)
+        for term in query_terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + self.norm[doc])
+
+        # Best phrasing per answer
+        best = {}
+        for doc, score in scores.items():
+            answer = self.doc_answer[doc]
+            if answer not in best or score > best[answer][1]:
+                best[answer] = (doc, score)
+
+        query_weight = sum(self.idf.get(t, self.unseen_idf) for t in query_terms)
+        results = []
+        for answer, (doc, score) in sorted(best.items(), key=lambda item: -item[1][1])[:limit]:
+            covered = sum(self.idf[t] for t in self.doc_terms[doc] if t in query_terms)
+            results.append({
+                **self.answers[answer],
+                "score": score,
+                "confidence": covered / self.doc_weight[doc] if self.doc_weight[doc] else 0.0,
+                "coverage": covered / query_weight if query_weight else 0.0,
+                "query_terms": len(tokens),
+            })
+        return results
+
+    def match(self, text: str) -> Optional[dict]:
+        """The answer to send without an LLM call, or None if no match is confident enough."""
+        results = [
+            result for result in self.search(text, limit=10)
+            if result["confidence"] >= FAQ_MIN_CONFIDENCE and result["coverage"] >= FAQ_MIN_COVERAGE
+            and result["score"] >= FAQ_MIN_SCORE
+        ]
+        if not results or results[0]["query_terms"] > FAQ_MAX_QUERY_TERMS:
+            return None
+        # Two answers both fully covered by the email: too ambiguous unless one clearly wins
+        if len(results) > 1 and results[0]["score"] < FAQ_MIN_MARGIN * results[1]["score"]:
+            return None
+        return results[0]
+
+def load_faq_entries(path: Optional[str] = SUPPORT_FAQ_PATH) -> List[dict]:
+    """Curated entries from `path`; none when no FAQ file is configured."""
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class FaqResponder:
+    """
+    Holds the live index (curated FAQs + approved replies from the support
+    database) and hit/latency counters.
+    """
+
+    def __init__(self, faq_path: Optional[str] = SUPPORT_FAQ_PATH, db_path: str = SUPPORT_DB_PATH):
+        self.faq_path = faq_path
+        self._lock = threading.Lock()
+        self._conn = connect_support_db(db_path)
+        self._conn.executescript(SCHEMA)
+        self.index = self._build()
+        self.stats = {"matches": 0, "faq_hits": 0, "llm_fallbacks": 0, "match_seconds": 0.0, "llm_seconds": 0.0}
+
+    def _build(self) -> FaqIndex:
+        entries = load_faq_entries(self.faq_path)
+        with self._lock:
+            rows = self._conn.execute("SELECT id, question, answer FROM approved_replies").fetchall()
+        entries += [{"id": f"approved_{row[0]}", "questions": [row[1]], "answer": row[2]} for row in rows]
+        return FaqIndex(entries)
+
+    def add_approved_reply(self, question: str, answer: str) -> str:
+        with self._lock:
+            reply_id = self._conn.execute(
+                "INSERT INTO approved_replies (question, answer, created_at) VALUES (?, ?, ?)",
+                (question, answer, time.time()),
+            ).lastrowid
+        # A few hundred short documents: rebuilding is cheaper than keeping the index mutable
+        self.index = self._build()
+        return f"approved_{reply_id}"
+
+    def match(self, text: str) -> Optional[dict]:
+        start = time.perf_counter()
+        result = self.index.match(text)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["matches"] += 1
+            self.stats["match_seconds"] += elapsed
+            if result is not None:
+                self.stats["faq_hits"] += 1
+        return result
+
+    def record_llm(self, seconds: float) -> None:
+        with self._lock:
+            self.stats["llm_fallbacks"] += 1
+            self.stats["llm_seconds"] += seconds
+
+    def info(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats["faq_hits"] + stats["llm_fallbacks"]
+        return {
+            "faq_hits": stats["faq_hits"],
+            "llm_fallbacks": stats["llm_fallbacks"],
+            "hit_rate": stats["faq_hits"] / total if total else 0.0,
+            "avg_match_us": stats["match_seconds"] / stats["matches"] * 1e6 if stats["matches"] else 0.0,
+            "avg_llm_ms": stats["llm_seconds"] / stats["llm_fallbacks"] * 1000 if stats["llm_fallbacks"] else 0.0,
+            "answers": len(self.index.answers),
+        }
+
+_responder = None
+_responder_lock = threading.Lock()
+
+def get_faq_responder() -> FaqResponder:
+    global _responder
+    with _responder_lock:
+        if _responder is None:
+            _responder = FaqResponder()
+        return _responder
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="FAQ match latency and hit rate on sample support emails")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Question phrasings only; a real FAQ file carries the store's own answers
+    sample_questions = {
+        "shipping_time": ["How long does shipping take?", "When will my order arrive?",
+                          "What is the delivery time for orders?"],
+        "order_tracking": ["Where is my order?", "How do I track my package?",
+                           "I have not received a tracking number for my order"],
+        "shipping_cost": ["How much does shipping cost?", "Do you offer free shipping?"],
+        "international_shipping": ["Do you ship internationally?", "Can you ship to my country outside the US?"],
+        "return_policy": ["What is your return policy?", "How do I return an item?", "Can I return my order?"],
+        "refund_status": ["When will I get my refund?", "How long does a refund take?", "I have not received my refund"],
+        "cancel_order": ["How do I cancel my order?", "Can I cancel my order?"],
+        "change_address": ["How do I change my shipping address?", "I entered the wrong address on my order"],
+        "business_hours": ["What are your business hours?", "When is customer support open?"],
+        "payment_methods": ["What payment methods do you accept?", "Can I pay with PayPal or a credit card?",
+                            "Do you accept PayPal?"],
+    }
+    index = FaqIndex([
+        {"id": answer_id, "questions": questions, "answer": f"[{answer_id} answer]"}
+        for answer_id, questions in sample_questions.items()
+    ])
+    samples = [
+        ("Hi there, how long does shipping usually take? Thanks, Sam", "shipping_time"),
+        ("Where is my order? I ordered a week ago.", "order_tracking"),
+        ("Hello, what's your return policy for shoes?", "return_policy"),
+        ("Can I cancel my order please", "cancel_order"),
+        ("Do you ship internationally to Germany?", "international_shipping"),
+        ("When will I get my refund?", "refund_status"),
+        ("When will I get my refund? I sent the item back last Monday.", None),
+        ("What are your business hours?", "business_hours"),
+        ("Do you accept PayPal?", "payment_methods"),
+        ("The zipper on the jacket I received broke after two days, and the color is different "
+         "from the photos. I'd like to know whether you can send a replacement in a larger size.", None),
+        ("Is the blue hoodie made of organic cotton?", None),
+        ("My order arrived damaged, the box was crushed.", None),
+        ("What is your return policy? My item arrived broken and I want a refund now.", None),
+        ("Where is my order? It says delivered but I never got it and the neighbours haven't seen it.", None),
+        ("Can I pay with cryptocurrency?", None),
+    ]
+    correct = 0
+    hits = 0
+    for text, expected in samples:
+        result = index.match(text)
+        got = result["id"] if result else None
+        hits += got is not None
+        correct += got == expected
+        confidence = f"{result['confidence']:.2f}/{result['coverage']:.2f}" if result else "-"
+        print(f"{str(expected):>24} -> {str(got):<24} confidence/coverage {confidence}")
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for text, _ in samples:
+            index.match(text)
+    elapsed = (time.perf_counter() - start) / (args.rounds * len(samples))
+    print(f"{correct}/{len(samples)} routed as expected, hit rate {hits / len(samples):.0%}, "
+          f"{elapsed * 1e6:.1f} us per match over {len(index.doc_answer)} phrasings")
@@ -0,0 +1,71 @@
+"""
+Local SQLite store for generated legal documents kept as templates, so tenant
+variants (new email, URL, ...) are filled and re-rendered without another
+LLM call.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from src.utils.data_dir import data_path
+from src.utils.render_cache import content_key
+
+LEGAL_TEMPLATE_STORE_PATH = os.getenv("LEGAL_TEMPLATE_STORE_PATH") or data_path("legal_templates.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS legal_templates (
+    id TEXT PRIMARY KEY,
+    doc_type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    content TEXT NOT NULL,
+    placeholders TEXT NOT NULL,
+    defaults_used TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(LEGAL_TEMPLATE_STORE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.executescript(SCHEMA)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def save_templates(docs: List[dict]) -> List[str]:
+    """
+    Store generated documents as templates. Ids are content hashes, so saving
+    the same document twice keeps a single template.
+    """
+    rows = []
+    for doc in docs:
+        template_id = content_key(doc['doc_type'], doc['title'], doc['summary'], doc['content'])[:32]
+        rows.append((
+            template_id,
+            doc['doc_type'],
+            doc['title'],
+            doc['summary'],
+            doc['content'],
+            json.dumps(doc.get('placeholders', [])),
+            json.dumps(doc.get('defaults_used', {})),
+            time.time(),
+        ))
+    with _connect() as conn:
+        conn.executemany("INSERT OR IGNORE INTO legal_templates VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return [row[0] for row in rows]
+
+def get_template(template_id: str) -> Optional[dict]:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM legal_templates WHERE id = ?", (template_id,)).fetchone()
+    if row is None:
+        return None
+    template = dict(row)
+    template['placeholders'] = json.loads(template['placeholders'])
+    template['defaults_used'] = json.loads(template['defaults_used'])
+    return template
@@ -0,0 +1,128 @@
+"""
+Deduplication of redelivered inbound emails by message id.
+
+AgentMail retries webhooks, so the same message can arrive several times. A
+rotating in-memory bloom filter answers "never seen" for new messages without
+touching disk; only ids it reports as possibly seen are confirmed against the
+exact set persisted in the support database, so bloom false positives never
+drop a real email. Ids are remembered for EMAIL_DEDUP_WINDOW_SECONDS and the
+bloom filter is rebuilt from the persisted set on start-up.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Optional
+from dotenv import load_dotenv
+from src.utils.email_queue import SUPPORT_DB_PATH, connect_support_db
+
+load_dotenv()
+EMAIL_DEDUP_WINDOW_SECONDS = float(os.getenv("EMAIL_DEDUP_WINDOW_SECONDS", str(3 * 24 * 3600)))
+EMAIL_DEDUP_CAPACITY = int(os.getenv("EMAIL_DEDUP_CAPACITY", "100000"))
+EMAIL_DEDUP_ERROR_RATE = float(os.getenv("EMAIL_DEDUP_ERROR_RATE", "0.001"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_messages (
+    message_id TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_seen_messages_seen_at ON seen_messages(seen_at);
+"""
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class MessageDeduplicator:
+    """
+    Two bloom generations, each covering one window: an id stays in the filter
+    for between one and two windows, so anything inside the window is always
+    found, and the exact set decides whether it is really a replay.
+    """
+
+    def __init__(
+        self,
+        path: str = SUPPORT_DB_PATH,
+        window: float = EMAIL_DEDUP_WINDOW_SECONDS,
+        capacity: int = EMAIL_DEDUP_CAPACITY,
+        error_rate: float = EMAIL_DEDUP_ERROR_RATE,
+    ):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._conn = connect_support_db(path)
+        self._conn.executescript(SCHEMA)
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.time()
+        self.stats = {"checked": 0, "duplicates_dropped": 0, "bloom_false_positives": 0}
+        self._load()
+
+    def _load(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.window,))
+        for (message_id,) in self._conn.execute("SELECT message_id FROM seen_messages"):
+            self._current.add(message_id)
+
+    def _rotate(self, now: float) -> None:
+        if now - self._rotated_at < self.window:
+            return
+        self._previous = self._current
+        self._current = BloomFilter(self.capacity, self.error_rate)
+        self._rotated_at = now
+        self._conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.window,))
+
+    def check_and_add(self, message_id: str) -> bool:
+        """Record `message_id` and return True if it was already seen within the window."""
+        now = time.time()
+        with self._lock:
+            self._rotate(now)
+            self.stats["checked"] += 1
+            if message_id in self._current or message_id in self._previous:
+                row = self._conn.execute(
+                    "SELECT seen_at FROM seen_messages WHERE message_id = ?", (message_id,)
+                ).fetchone()
+                if row is not None and row[0] >= now - self.window:
+                    self.stats["duplicates_dropped"] += 1
+                    return True
+                self.stats["bloom_false_positives"] += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO seen_messages (message_id, seen_at) VALUES (?, ?)",
+                (message_id, now),
+            )
+            self._current.add(message_id)
+            return False
+
+    def forget(self, message_id: str) -> None:
+        """Undo check_and_add when the message could not be accepted, so a retry goes through."""
+        with self._lock:
+            self._conn.execute("DELETE FROM seen_messages WHERE message_id = ?", (message_id,))
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats, "bloom_entries": self._current.count + self._previous.count}
+
+def inbound_message_id(payload: dict) -> Optional[str]:
+    message = payload.get("message") or {}
+    return message.get("message_id") or message.get("id")
@@ -0,0 +1,191 @@
+"""
+Minimal MP4 (ISO BMFF) box parser for sanity-checking generated videos.
+
+Only box headers and the `moov` atom are read; sample data in `mdat` is
+skipped, so probing costs microseconds regardless of the video's length.
+"""
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+class Mp4ProbeError(ValueError):
+    """Raised when a file is not a complete, playable MP4."""
+
+# Top-level boxes whose contents are parsed; every other box is only sized
+PARSED_BOXES = (b"ftyp", b"moov")
+
+def _box_header(header, offset: int, end: int) -> Tuple[bytes, int, int]:
+    """(type, header_length, size) of the box whose header starts at header[0]."""
+    if end - offset < 8 or len(header) < 8:
+        raise Mp4ProbeError(f"Truncated box header at offset {offset}")
+    size, box_type = struct.unpack_from(">I4s", header)
+    header_length = 8
+    if size == 1:
+        if end - offset < 16 or len(header) < 16:
+            raise Mp4ProbeError(f"Truncated box header at offset {offset}")
+        size = struct.unpack_from(">Q", header, 8)[0]
+        header_length = 16
+    elif size == 0:
+        size = end - offset
+    if size < header_length:
+        raise Mp4ProbeError(f"Invalid size {size} for '{box_type.decode('latin-1')}' box")
+    if offset + size > end:
+        raise Mp4ProbeError(
+            f"'{box_type.decode('latin-1')}' box at offset {offset} runs past the end of its parent "
+            f"({offset + size} > {end}); file is truncated"
+        )
+    return box_type, header_length, size
+
+def _iter_boxes(buf: memoryview, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload_start, box_end) for each box in buf[start:end]."""
+    offset = start
+    while offset < end:
+        box_type, header_length, size = _box_header(buf[offset:offset + 16], offset, end)
+        yield box_type, offset + header_length, offset + size
+        offset += size
+
+def _find(buf: memoryview, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for found, payload, box_end in _iter_boxes(buf, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+def _unpack(fmt: str, buf: memoryview, offset: int, end: int, box_type: str) -> tuple:
+    """struct.unpack_from that stays inside the box ending at `end`."""
+    if offset + struct.calcsize(fmt) > end:
+        raise Mp4ProbeError(f"'{box_type}' box is truncated: field at offset {offset} runs past its end at {end}")
+    return struct.unpack_from(fmt, buf, offset)
+
+def _full_box_times(buf: memoryview, payload: int, end: int, box_type: str) -> Tuple[int, int, int]:
+    """(version, timescale, duration) of an mvhd/mdhd box."""
+    version = _unpack(">B", buf, payload, end, box_type)[0]
+    if version == 1:
+        timescale, duration = _unpack(">IQ", buf, payload + 4 + 16, end, box_type)
+    else:
+        timescale, duration = _unpack(">II", buf, payload + 4 + 8, end, box_type)
+    return version, timescale, duration
+
+def _parse_track(buf: memoryview, start: int, end: int) -> dict:
+    track = {}
+    tkhd = _find(buf, start, end, b"tkhd")
+    if tkhd:
+        payload, tkhd_end = tkhd
+        # Width and height are 16.16 fixed point at the end of the box
+        version = _unpack(">B", buf, payload, tkhd_end, "tkhd")[0]
+        skip = 4 + (32 if version == 1 else 20) + 8 + 8 + 36
+        width, height = _unpack(">II", buf, payload + skip, tkhd_end, "tkhd")
+        track["width"], track["height"] = width >> 16, height >> 16
+
+    mdia = _find(buf, start, end, b"mdia")
+    if not mdia:
+        return track
+    hdlr = _find(buf, *mdia, b"hdlr")
+    if hdlr:
+        track["handler"] = bytes(buf[hdlr[0] + 8:hdlr[0] + 12]).decode("latin-1")
+    mdhd = _find(buf, *mdia, b"mdhd")
+    if mdhd:
+        _, timescale, duration = _full_box_times(buf, *mdhd, "mdhd")
+        track["duration"] = duration / timescale if timescale else 0.0
+
+    minf = _find(buf, *mdia, b"minf")
+    stbl = _find(buf, *minf, b"stbl") if minf else None
+    stsd = _find(buf, *stbl, b"stsd") if stbl else None
+    if stsd:
+        payload, stsd_end = stsd
+        entries = _unpack(">I", buf, payload + 4, stsd_end, "stsd")[0]
+        if entries and payload + 16 <= stsd_end:
+            track["codec"] = bytes(buf[payload + 12:payload + 16]).decode("latin-1")
+    return track
+
+def _load(source: Union[bytes, bytearray, memoryview, str]) -> Tuple[List[bytes], Dict[bytes, memoryview], int]:
+    """
+    Top-level box types in file order, the payloads of the first ftyp and moov
+    boxes, and the total file size. For paths only the top-level headers and
+    those two payloads are read from disk; mdat is never touched.
+    """
+    if not isinstance(source, str):
+        buf = memoryview(source)
+        if len(buf) < 8:
+            raise Mp4ProbeError("File is too small to be an MP4")
+        order, payloads = [], {}
+        for box_type, payload, box_end in _iter_boxes(buf, 0, len(buf)):
+            order.append(box_type)
+            if box_type in PARSED_BOXES and box_type not in payloads:
+                payloads[box_type] = buf[payload:box_end]
+        return order, payloads, len(buf)
+
+    size = os.path.getsize(source)
+    if size < 8:
+        raise Mp4ProbeError("File is too small to be an MP4")
+    order, payloads = [], {}
+    with open(source, "rb") as f:
+        offset = 0
+        while offset < size:
+            f.seek(offset)
+            box_type, header_length, box_size = _box_header(f.read(16), offset, size)
+            order.append(box_type)
+            if box_type in PARSED_BOXES and box_type not in payloads:
+                f.seek(offset + header_length)
+                payloads[box_type] = memoryview(f.read(box_size - header_length))
+            offset += box_size
+    return order, payloads, size
+
+def probe_mp4(source: Union[bytes, bytearray, memoryview, str]) -> dict:
+    """
+    Validates an MP4 file and extracts its basic metadata.
+
+    Args:
+        source: The file contents, or a path to the file.
+
+    Returns:
+        dict: duration (seconds), width, height, video_codec, audio_codec,
+              major_brand, faststart (moov before mdat) and size (bytes).
+
+    Raises:
+        Mp4ProbeError: If the file is truncated, lacks a moov/mdat atom or has no video track.
+    """
+    order, payloads, size = _load(source)
+
+    if b"ftyp" not in payloads:
+        raise Mp4ProbeError("Missing 'ftyp' box; not an MP4 file")
+    if b"moov" not in payloads:
+        raise Mp4ProbeError("Missing 'moov' box; file is incomplete")
+    if b"mdat" not in order:
+        raise Mp4ProbeError("Missing 'mdat' box; file has no media data")
+
+    ftyp = payloads[b"ftyp"]
+    buf = payloads[b"moov"]
+    moov_start, moov_end = 0, len(buf)
+    mvhd = _find(buf, moov_start, moov_end, b"mvhd")
+    if not mvhd:
+        raise Mp4ProbeError("Missing 'mvhd' box in moov")
+    _, timescale, duration = _full_box_times(buf, *mvhd, "mvhd")
+
+    metadata = {
+        "duration": duration / timescale if timescale else 0.0,
+        "width": None,
+        "height": None,
+        "video_codec": None,
+        "audio_codec": None,
+        "major_brand": bytes(ftyp[:4]).decode("latin-1"),
+        "faststart": order.index(b"moov") < order.index(b"mdat"),
+        "size": size,
+    }
+    for box_type, payload, box_end in _iter_boxes(buf, moov_start, moov_end):
+        if box_type != b"trak":
+            continue
+        track = _parse_track(buf, payload, box_end)
+        if track.get("handler") == "vide" and metadata["video_codec"] is None:
+            metadata["video_codec"] = track.get("codec")
+            metadata["width"] = track.get("width")
+            metadata["height"] = track.get("height")
+        elif track.get("handler") == "soun" and metadata["audio_codec"] is None:
+            metadata["audio_codec"] = track.get("codec")
+
+    if metadata["video_codec"] is None:
+        raise Mp4ProbeError("No video track found")
+    if not metadata["width"] or not metadata["height"]:
+        raise Mp4ProbeError("Video track has no resolution")
+    if metadata["duration"] <= 0:
+        raise Mp4ProbeError("Video has zero duration")
+    return metadata
@@ -0,0 +1,325 @@
+"""
+Process pool of pre-warmed WeasyPrint renderers.
+
+WeasyPrint layout is CPU-bound and holds the GIL, so rendering in the request
+thread serializes concurrent requests. Each worker process imports WeasyPrint
+and primes a FontConfiguration once at start-up (fontconfig scanning is the
+slowest part of a cold render); renders are then dispatched across workers.
+
+Legal documents are rendered from a precompiled Jinja2 template
+(src/templates/legal_document.html) with a stylesheet parsed once per worker
+and a reused Markdown converter, so per-document work is just markdown
+conversion and layout.
+
+PDF_RENDER_WORKERS sets the pool size (default: CPU count). 0 renders in the
+calling process instead, which is handy for debugging.
+
+Renders never touch disk: WeasyPrint writes into memory and the bytes go
+straight to the caller (base64 for JSON, a raw response, or storage).
+
+Benchmark docs/second against worker count with:
+
+    python -m src.utils.pdf_renderer --docs 48
+
+the legal route's per-document cost of the old temp-file round trip vs
+in-memory rendering with:
+
+    python -m src.utils.pdf_renderer --docs 48 --io
+
+and one combined multi-document render vs N separate renders with:
+
+    python -m src.utils.pdf_renderer --docs 48 --combined 4
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import BinaryIO, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+DOCUMENT_TEMPLATE = "legal_document.html"
+DOCUMENT_STYLESHEET = "legal_document.css"
+BUNDLE_TEMPLATE = "legal_bundle.html"
+BUNDLE_STYLESHEET = "legal_bundle.css"
+MARKDOWN_EXTENSIONS = ['tables', 'fenced_code', 'toc']
+
+def _template_version() -> str:
+    digest = hashlib.sha256()
+    for name in (DOCUMENT_TEMPLATE, DOCUMENT_STYLESHEET, BUNDLE_TEMPLATE, BUNDLE_STYLESHEET):
+        with open(os.path.join(TEMPLATES_DIR, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Changes whenever a document template or stylesheet changes
+TEMPLATE_VERSION = _template_version()
+
+# Per-process renderer state, set up by _init_worker
+_font_config = None
+_stylesheet = None
+_bundle_stylesheet = None
+_template = None
+_bundle_template = None
+_markdown = None
+_markdown_lock = threading.Lock()
+
+def _init_worker() -> None:
+    global _font_config, _stylesheet, _bundle_stylesheet, _template, _bundle_template, _markdown
+    import markdown
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    # Parse the stylesheet once; every render reuses the parsed rules
+    _stylesheet = CSS(filename=os.path.join(TEMPLATES_DIR, DOCUMENT_STYLESHEET), font_config=_font_config)
+    _bundle_stylesheet = CSS(filename=os.path.join(TEMPLATES_DIR, BUNDLE_STYLESHEET), font_config=_font_config)
+    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(["html"]))
+    _template = env.get_template(DOCUMENT_TEMPLATE)
+    _bundle_template = env.get_template(BUNDLE_TEMPLATE)
+    _markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+
+    # Prime fontconfig and the layout engine with a tiny render
+    HTML(string="<p>warm-up</p>").write_pdf(font_config=_font_config, stylesheets=[_stylesheet])
+
+def _markdown_html(content: str, id_prefix: str = ""):
+    """
+    Markdown to HTML. Heading ids get `id_prefix` so several documents can share
+    one HTML page without their table-of-contents anchors colliding.
+    """
+    from markdown.extensions.toc import slugify
+    from markupsafe import Markup
+
+    with _markdown_lock:
+        _markdown.treeprocessors["toc"].slugify = lambda value, separator: id_prefix + slugify(value, separator)
+        return Markup(_markdown.reset().convert(content))
+
+def _document_html(title: str, summary: str, content: str) -> str:
+    return _template.render(title=title, summary=summary, content=_markdown_html(content))
+
+def _render_document(title: str, summary: str, content: str) -> bytes:
+    if _font_config is None:
+        _init_worker()
+    return _render(_document_html(title, summary, content), stylesheets=[_stylesheet])
+
+def _ping() -> int:
+    return os.getpid()
+
+def _render_bundle(title: str, docs: list) -> dict:
+    """
+    Lay out several documents as one PDF (table of contents, one bookmark per
+    document, shared font subsets) in a single pass, then cut each document's
+    page range out of the same layout.
+
+    Args:
+        docs: (title, summary, content) tuples.
+
+    Returns:
+        dict: {"combined": bytes, "documents": [bytes, ...]} in input order.
+    """
+    from weasyprint import HTML
+
+    if _font_config is None:
+        _init_worker()
+
+    sections = [
+        {"anchor": f"doc-{i}", "title": doc_title, "summary": summary, "content": _markdown_html(content, f"doc-{i}-")}
+        for i, (doc_title, summary, content) in enumerate(docs)
+    ]
+    html_document = _bundle_template.render(title=title, docs=sections)
+    document = HTML(string=html_document).render(
+        font_config=_font_config,
+        stylesheets=[_stylesheet, _bundle_stylesheet],
+    )
+
+    starts = []
+    for section in sections:
+        start = next((i for i, page in enumerate(document.pages) if section["anchor"] in page.anchors), None)
+        if start is None:
+            raise RuntimeError(f"Bundle layout has no page for '{section['title']}' (anchor '{section['anchor']}' missing)")
+        starts.append(start)
+    ends = starts[1:] + [len(document.pages)]
+
+    return {
+        "combined": document.write_pdf(),
+        "documents": [document.copy(document.pages[start:end]).write_pdf() for start, end in zip(starts, ends)],
+    }
+
+def _render(html_document: str, target: Optional[BinaryIO] = None, stylesheets: Optional[list] = None) -> Optional[bytes]:
+    """Render in memory: returns the PDF bytes, or writes them into `target`."""
+    from weasyprint import HTML
+
+    if _font_config is None:
+        _init_worker()
+    return HTML(string=html_document).write_pdf(target, font_config=_font_config, stylesheets=stylesheets)
+
+def _get_pool(workers: int = PDF_RENDER_WORKERS) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process has threads running
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+def start_pdf_renderers(workers: int = PDF_RENDER_WORKERS) -> None:
+    """
+    Spawn every worker process; each runs the warm-up initializer as soon as
+    it starts. Returns once the pool is serving renders.
+    """
+    if workers <= 0:
+        return
+    pool = _get_pool(workers)
+    # One submission per worker makes the pool spawn all of its processes
+    [f.result() for f in [pool.submit(_ping) for _ in range(workers)]]
+    print(f"PDF renderer pool ready: {workers} workers")
+
+def shutdown_pdf_renderers() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def submit_render(html_document: str) -> Future:
+    """Queue an HTML document for rendering and return a Future of the PDF bytes."""
+    if PDF_RENDER_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(_render(html_document))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_pool().submit(_render, html_document)
+
+def submit_document_render(title: str, summary: str, content: str) -> Future:
+    """
+    Queue a markdown document for rendering with the precompiled document
+    template and shared stylesheet. Returns a Future of the PDF bytes.
+    """
+    if PDF_RENDER_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(_render_document(title, summary, content))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_pool().submit(_render_document, title, summary, content)
+
+def render_document_pdf(title: str, summary: str, content: str) -> bytes:
+    return submit_document_render(title, summary, content).result()
+
+def submit_bundle_render(title: str, docs: list) -> Future:
+    """
+    Queue a combined render of (title, summary, content) documents. Returns a
+    Future of {"combined": bytes, "documents": [bytes, ...]}.
+    """
+    if PDF_RENDER_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(_render_bundle(title, docs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_pool().submit(_render_bundle, title, [tuple(doc) for doc in docs])
+
+def render_pdf(html_document: str) -> bytes:
+    return submit_render(html_document).result()
+
+def render_pdf_into(html_document: str, buffer: BinaryIO) -> Optional[int]:
+    """
+    Render straight into a caller-supplied writable buffer (BytesIO, an upload
+    stream, ...). No temp files.
+
+    Returns:
+        Optional[int]: Bytes written, or None if the buffer can't report its position.
+    """
+    if PDF_RENDER_WORKERS <= 0:
+        start = buffer.tell() if buffer.seekable() else None
+        _render(html_document, buffer)
+        return buffer.tell() - start if start is not None else None
+    pdf_data = render_pdf(html_document)
+    buffer.write(pdf_data)
+    return len(pdf_data)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark PDF renders per second vs worker count")
+    parser.add_argument("--docs", type=int, default=48)
+    parser.add_argument("--io", action="store_true", help="compare temp-file vs in-memory output")
+    parser.add_argument("--combined", type=int, default=0, metavar="N",
+                        help="compare one combined render of N documents vs N separate renders")
+    args = parser.parse_args()
+
+    paragraph = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 12
+    sample_markdown = f"## Section\n\n{paragraph}\n\n" * 20
+    sample = "<html><body><h1>Privacy Policy</h1>" + f"<h2>Section</h2><p>{paragraph}</p>" * 20 + "</body></html>"
+
+    if args.combined:
+        _init_worker()
+        docs = [(f"Document {i + 1}", "Sample.", sample_markdown) for i in range(args.combined)]
+        for name, fn in (
+            ("separate", lambda: [_render_document(*doc) for doc in docs]),
+            ("combined", lambda: _render_bundle("Legal Documents", docs)),
+        ):
+            start = time.perf_counter()
+            for _ in range(max(1, args.docs // args.combined)):
+                output = fn()
+            elapsed = (time.perf_counter() - start) / max(1, args.docs // args.combined)
+            size = sum(map(len, output)) if name == "separate" else len(output["combined"])
+            print(f"{name:>10}: {elapsed * 1000:.1f} ms per {args.combined} docs, {size / 1024:.0f} KiB output")
+        raise SystemExit(0)
+
+    if args.io:
+        import base64
+        import tempfile
+        from weasyprint import HTML
+
+        _init_worker()
+        document = HTML(string=sample).render(font_config=_font_config)
+
+        def via_tempfile() -> str:
+            # What the legal route used to do per document
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+                document.write_pdf(temp_file.name)
+                with open(temp_file.name, 'rb') as pdf_file:
+                    pdf_base64 = base64.b64encode(pdf_file.read()).decode('utf-8')
+                os.unlink(temp_file.name)
+            return pdf_base64
+
+        def in_memory() -> str:
+            return base64.b64encode(document.write_pdf()).decode('utf-8')
+
+        # Layout is done once up front so only the output path is timed
+        for name, fn in (("temp file", via_tempfile), ("in memory", in_memory)):
+            start = time.perf_counter()
+            for _ in range(args.docs):
+                fn()
+            elapsed = (time.perf_counter() - start) / args.docs
+            print(f"{name:>10}: {elapsed * 1000:.2f} ms/doc")
+        raise SystemExit(0)
+
+    counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    print(f"{'workers':>8} {'docs/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in [w for w in counts if w <= (os.cpu_count() or 1)]:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker) as pool:
+            [f.result() for f in [pool.submit(_ping) for _ in range(workers)]]
+            start = time.perf_counter()
+            [f.result() for f in [pool.submit(_render_document, "Privacy Policy", "Sample.", sample_markdown) for _ in range(args.docs)]]
+            rate = args.docs / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.1f} {rate / baseline:>7.2f}x")
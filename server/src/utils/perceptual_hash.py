@@ -0,0 +1,50 @@
+from io import BytesIO
+from typing import List, Sequence
+from PIL import Image
+
+# Candidates closer than this (out of 64 bits) are treated as the same logo
+DUPLICATE_DISTANCE = 6
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    Difference hash of an image: compares adjacent pixels of a small
+    grayscale thumbnail, so it is stable under resizing and re-encoding.
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def dedupe_and_rank(hashes: Sequence[int], threshold: int = DUPLICATE_DISTANCE) -> List[int]:
+    """
+    Drop near-duplicate images and order the rest for variety.
+
+    The first image keeps its place; each next pick is the one furthest (by
+    minimum hamming distance) from everything already picked, so the top few
+    candidates shown to a user look as different from each other as possible.
+
+    Returns:
+        List[int]: Indexes into `hashes`, best first.
+    """
+    unique: List[int] = []
+    for index, value in enumerate(hashes):
+        if all(hamming(value, hashes[kept]) > threshold for kept in unique):
+            unique.append(index)
+
+    if not unique:
+        return []
+    ranked = [unique.pop(0)]
+    while unique:
+        best = max(unique, key=lambda i: min(hamming(hashes[i], hashes[r]) for r in ranked))
+        unique.remove(best)
+        ranked.append(best)
+    return ranked
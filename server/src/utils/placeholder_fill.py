@@ -0,0 +1,31 @@
+"""
+Fill `[Placeholder]` markers in generated legal templates with tenant values.
+
+All placeholders are replaced in one pass with a single compiled alternation
+regex (longest names first), so filling cost is linear in the document size
+no matter how many placeholders there are. Compiled patterns are cached per
+set of placeholder names.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+# Markers the generator leaves in content, e.g. [Store Name] or [Contact Email]
+PLACEHOLDER_PATTERN = re.compile(r"\[([A-Z][A-Za-z0-9 ]{1,40})\]")
+
+@lru_cache(maxsize=256)
+def _compile(names: tuple) -> re.Pattern:
+    alternation = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(r"\[(" + alternation + r")\]", re.IGNORECASE)
+
+def fill_placeholders(text: str, values: Dict[str, str]) -> str:
+    """Replace every `[Name]` whose name (case-insensitive) has a value; leave the rest as is."""
+    lookup = {name.strip().lower(): value for name, value in values.items() if value is not None}
+    if not lookup or not text:
+        return text
+    pattern = _compile(tuple(sorted(lookup)))
+    return pattern.sub(lambda m: lookup[m.group(1).lower()], text)
+
+def find_placeholders(text: str) -> List[str]:
+    """Placeholder names still present in `text`, in order of first appearance."""
+    return list(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text or "")))
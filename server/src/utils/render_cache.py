@@ -0,0 +1,132 @@
+"""
+Content-addressed cache for rendered PDFs.
+
+Keys are a hash of everything that affects the output (document fields and
+the template version), so identical documents are rendered once. Entries live
+in a disk LRU bounded by PDF_CACHE_MAX_BYTES, which survives restarts, with a
+small in-memory LRU in front for the hottest entries.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from src.utils.data_dir import data_path
+
+load_dotenv()
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.dirname(data_path("pdf_cache", "index"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+def content_key(*parts) -> str:
+    """Stable hash of JSON-serializable render inputs."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class RenderCache:
+    def __init__(self, directory: str, max_bytes: int, memory_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory = LRUCache(maxsize=memory_bytes, getsizeof=len)
+        # key -> size on disk, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def _load_index(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    os.unlink(path)
+                elif name.endswith(".pdf"):
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._index.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+            if key not in self._index:
+                self.stats["misses"] += 1
+                return None
+            self._index.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mtime records recency so LRU order survives restarts
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._size -= self._index.pop(key, 0)
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._remember(key, data)
+        return data
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) <= self._memory.maxsize:
+            self._memory[key] = data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._remember(key, data)
+            evicted = []
+            while self._size > self.max_bytes and self._index:
+                old_key, old_size = self._index.popitem(last=False)
+                self._size -= old_size
+                self._memory.pop(old_key, None)
+                evicted.append(old_key)
+            self.stats["evictions"] += len(evicted)
+
+        for old_key in evicted:
+            try:
+                os.unlink(self._path(old_key))
+            except OSError:
+                pass
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._index), "bytes": self._size, "max_bytes": self.max_bytes}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_render_cache() -> RenderCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES, PDF_CACHE_MEMORY_BYTES)
+        return _cache
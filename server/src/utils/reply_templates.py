@@ -0,0 +1,189 @@
+"""
+Intent-keyed reply templates for support emails.
+
+Emails are sorted into a small set of intents with precompiled regexes. An
+intent is only used when the email does not go beyond it: the email must be
+short (FAQ_MAX_QUERY_TERMS) and mostly covered by the intent's example
+phrasings (FAQ_MIN_COVERAGE, scored with the FAQ index), so multi-issue mail
+still gets an LLM reply. The first email of an intent for a store has Gemini write a reusable reply with
+[Customer Name] / [Order Number] placeholders; later emails with that intent
+are answered by filling the cached template. Templates are kept in the
+support database and regenerated after REPLY_TEMPLATE_TTL_SECONDS so they
+follow prompt and policy changes.
+"""
+import os
+import re
+import threading
+import time
+from typing import Optional
+from dotenv import load_dotenv
+from src.utils.email_queue import SUPPORT_DB_PATH, connect_support_db
+from src.utils.faq_index import FAQ_MAX_QUERY_TERMS, FAQ_MIN_COVERAGE, FaqIndex
+
+load_dotenv()
+REPLY_TEMPLATE_TTL_SECONDS = float(os.getenv("REPLY_TEMPLATE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Checked in order; the first match wins
+INTENT_PATTERNS = [
+    ("damaged_item", re.compile(r"\b(damaged|broken|cracked|defective|torn|smashed)\b", re.I)),
+    ("wrong_item", re.compile(r"\b(wrong (item|size|colou?r|product|order)|not what i ordered|received the wrong)\b", re.I)),
+    ("missing_item", re.compile(r"\b(missing (item|part|piece)s?|item(s)? (is|are|was|were) missing|only (got|received) (one|part))\b", re.I)),
+    ("cancel_request", re.compile(
+        r"\bcancel(l?ed|l?ing|lation)?\b.{0,30}\border\b|\border\b.{0,30}\bcancel(l?ed|l?ing|lation)?\b", re.I
+    )),
+    ("address_change", re.compile(
+        r"\b(change|update|wrong|correct|incorrect)\b.{0,30}\b(shipping|delivery) address\b"
+        r"|\b(shipping|delivery) address\b.{0,30}\b(change|update|wrong|incorrect)\b",
+        re.I,
+    )),
+    ("refund_request", re.compile(r"\b(refund|money back|reimburse)", re.I)),
+    ("order_status", re.compile(
+        r"\b(where is my (order|package|parcel)|order status|track(ing)? (my |the )?(order|package|parcel|shipment)"
+        r"|tracking (number|link|info(rmation)?)|hasn'?t (arrived|shipped)|not (arrived|received)|still waiting)\b",
+        re.I,
+    )),
+    ("discount_code", re.compile(r"\b(discount|promo|coupon|voucher)( code)?\b", re.I)),
+]
+INTENT_DESCRIPTIONS = {
+    "damaged_item": "an item that arrived damaged or defective",
+    "wrong_item": "receiving the wrong item, size or colour",
+    "missing_item": "items missing from their order",
+    "cancel_request": "a request to cancel their order",
+    "address_change": "a request to change the shipping address of their order",
+    "refund_request": "a request for a refund or the status of one",
+    "order_status": "where their order is or when it will arrive",
+    "discount_code": "a discount or promo code that does not work or that they want to use",
+}
+# Example phrasings per intent; an email must be mostly covered by its intent's phrasings
+INTENT_PHRASINGS = {
+    "damaged_item": ["My order arrived damaged", "The item I ordered is broken", "It was cracked when it arrived",
+                     "I received a defective product", "The package was smashed and the item is torn"],
+    "wrong_item": ["I received the wrong item", "You sent the wrong size", "This is not what I ordered",
+                   "I received the wrong colour"],
+    "missing_item": ["An item is missing from my order", "My order is missing items", "I only received part of my order"],
+    "cancel_request": ["Please cancel my order", "I want to cancel my order", "Order cancellation request"],
+    "address_change": ["I need to change the shipping address on my order", "Please update my delivery address",
+                       "I entered the wrong shipping address"],
+    "refund_request": ["I want a refund", "When will I get my refund", "Can I get my money back for my order"],
+    "order_status": ["Where is my order", "My order has not arrived yet", "Can I get the tracking number for my order",
+                     "I am still waiting for my package", "What is the status of my order"],
+    "discount_code": ["My discount code does not work", "The promo code is not working at checkout",
+                      "Can I use a coupon code on my order"],
+}
+ORDER_NUMBER = re.compile(
+    r"(?:\border\b\s*(?:number|no\.?|num|id)?\s*[:#]?\s*(?:(?:is|was)\s+)?|#)(?=[A-Z0-9-]*\d)([A-Z0-9][A-Z0-9-]{2,19})\b",
+    re.I,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reply_templates (
+    intent TEXT NOT NULL,
+    store TEXT NOT NULL,
+    template TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (intent, store)
+);
+"""
+
+_intent_index = FaqIndex([
+    {"id": intent, "questions": phrasings, "answer": ""} for intent, phrasings in INTENT_PHRASINGS.items()
+])
+
+def _within_intent(text: str, intent: str) -> bool:
+    """Whether the email is about `intent` and little else, by the FAQ index's coverage and length guards."""
+    # The order number is expected and is not something the template has to cover
+    results = _intent_index.search(ORDER_NUMBER.sub(" ", text), limit=len(INTENT_PHRASINGS))
+    for result in results:
+        if result["id"] == intent:
+            return result["coverage"] >= FAQ_MIN_COVERAGE and result["query_terms"] <= FAQ_MAX_QUERY_TERMS
+    return False
+
+def classify_intent(text: str) -> Optional[str]:
+    """The email's intent, or None when no intent matches or the email goes beyond it."""
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(text):
+            return intent if _within_intent(text, intent) else None
+    return None
+
+def extract_order_number(text: str) -> Optional[str]:
+    match = ORDER_NUMBER.search(text)
+    return match.group(1) if match else None
+
+class ReplyTemplateCache:
+    def __init__(self, path: str = SUPPORT_DB_PATH, ttl: float = REPLY_TEMPLATE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = connect_support_db(path)
+        self._conn.executescript(SCHEMA)
+        # (intent, store) -> (template, created_at); mirrors the table
+        self._templates = {
+            (row[0], row[1]): (row[2], row[3])
+            for row in self._conn.execute("SELECT intent, store, template, created_at FROM reply_templates")
+        }
+        self.stats = {"hits": 0, "generated": 0, "refreshed": 0, "unfillable": 0}
+
+    def get(self, intent: str, store: str) -> Optional[str]:
+        """The cached template, or None if there is none or it is due for a refresh."""
+        with self._lock:
+            entry = self._templates.get((intent, store))
+            if entry is None or time.time() - entry[1] > self.ttl:
+                return None
+            self.stats["hits"] += 1
+            self._conn.execute(
+                "UPDATE reply_templates SET uses = uses + 1 WHERE intent = ? AND store = ?", (intent, store)
+            )
+            return entry[0]
+
+    def put(self, intent: str, store: str, template: str) -> None:
+        now = time.time()
+        with self._lock:
+            self.stats["refreshed" if (intent, store) in self._templates else "generated"] += 1
+            self._templates[(intent, store)] = (template, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reply_templates (intent, store, template, created_at, uses) VALUES (?, ?, ?, ?, 0)",
+                (intent, store, template, now),
+            )
+
+    def record_unfillable(self) -> None:
+        with self._lock:
+            self.stats["unfillable"] += 1
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats, "templates": len(self._templates)}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_reply_template_cache() -> ReplyTemplateCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReplyTemplateCache()
+        return _cache
+
+if __name__ == "__main__":
+    intent_samples = [
+        ("Order #12345 arrived damaged\nHi, the mug I ordered arrived broken. Thanks, Sam", "damaged_item"),
+        ("Cancel order\nPlease cancel my order 4411", "cancel_request"),
+        ("Address\nI need to change the shipping address on order #5512", "address_change"),
+        ("Where is my order #1001?", "order_status"),
+        ("Please update my billing address", None),
+        ("How do I cancel my subscription?", None),
+        ("Order #12345\nMy order arrived damaged, I was also charged twice and the wrong size came. Can you call me?", None),
+    ]
+    for text, expected in intent_samples:
+        got = classify_intent(text)
+        print(f"{str(expected):>14} -> {got}{'' if got == expected else '  MISMATCH'}")
+
+    order_samples = [
+        ("My order number is 12345", "12345"),
+        ("The order was #A-77", "A-77"),
+        ("Order no. 5531 never came", "5531"),
+        ("order id: AB123", "AB123"),
+        ("My order was late", None),
+    ]
+    for text, expected in order_samples:
+        got = extract_order_number(text)
+        print(f"{str(expected):>14} -> {got}{'' if got == expected else '  MISMATCH'}")
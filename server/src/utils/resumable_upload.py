@@ -0,0 +1,327 @@
+"""
+Resumable, chunked uploads to Supabase Storage over the TUS protocol.
+
+Large artifacts (generated videos, bundles, ...) are sent in fixed-size chunks
+so a transient failure only re-sends the chunk in flight instead of the whole
+file. When the server supports the TUS `concatenation` extension the file is
+split into parts that are uploaded in parallel and stitched together
+server-side; otherwise the chunks are sent sequentially over one upload.
+
+Every chunk carries an `Upload-Checksum` header when the server advertises the
+`checksum` extension, and the final offset is checked against the file size
+before the upload is reported as complete.
+
+Point `SUPABASE_TUS_URL` at `src/dev/tus_standin.py` to exercise this module
+against a local stand-in server.
+"""
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+from urllib.parse import urljoin
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TUS_VERSION = "1.0.0"
+# Supabase Storage only accepts 6MB chunks on its resumable endpoint
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024)))
+MAX_PARALLEL = int(os.getenv("UPLOAD_MAX_PARALLEL", "4"))
+MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+RESUME_STORE_PATH = os.getenv(
+    "UPLOAD_RESUME_STORE",
+    os.path.join(tempfile.gettempdir(), "foundry-resumable-uploads.json"),
+)
+
+Source = Union[bytes, bytearray, memoryview, str]
+
+_store_lock = threading.Lock()
+_extensions_cache: Dict[str, set] = {}
+
+
+class UploadError(RuntimeError):
+    """Raised when an upload cannot be completed after all retries."""
+
+
+def tus_endpoint() -> str:
+    endpoint = os.getenv("SUPABASE_TUS_URL")
+    if endpoint:
+        return endpoint
+    supabase_url = os.getenv("SUPABASE_URL")
+    if not supabase_url:
+        raise UploadError("Missing SUPABASE_URL or SUPABASE_TUS_URL env vars")
+    return f"{supabase_url}/storage/v1/upload/resumable"
+
+
+def _auth_headers() -> dict:
+    headers = {"Tus-Resumable": TUS_VERSION}
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if service_key:
+        headers["Authorization"] = f"Bearer {service_key}"
+        headers["apikey"] = service_key
+    return headers
+
+
+def _source_length(source: Source) -> int:
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    return len(source)
+
+
+def _read(source: Source, offset: int, size: int) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+    return bytes(memoryview(source)[offset:offset + size])
+
+
+def _fingerprint(bucket: str, object_key: str, source: Source) -> str:
+    """
+    Resume key: the identity of the data plus where it is going (bucket and
+    the object's folder). The object name itself is left out because callers
+    often make it unique per attempt, which would make every retry a new upload.
+    """
+    destination = f"{bucket}/{posixpath.dirname(object_key)}"
+    if isinstance(source, str):
+        stat = os.stat(source)
+        identity = f"file:{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}"
+    else:
+        identity = f"bytes:{hashlib.sha256(memoryview(source)).hexdigest()}"
+    return hashlib.sha256(f"{destination}|{identity}".encode()).hexdigest()
+
+
+def _load_resume_store() -> dict:
+    try:
+        with open(RESUME_STORE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember(fingerprint: str, entry: Optional[dict]) -> None:
+    with _store_lock:
+        store = _load_resume_store()
+        if entry is None:
+            store.pop(fingerprint, None)
+        else:
+            store[fingerprint] = entry
+        tmp_path = f"{RESUME_STORE_PATH}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(store, f)
+        os.replace(tmp_path, RESUME_STORE_PATH)
+
+
+def _recall(fingerprint: str) -> Optional[dict]:
+    with _store_lock:
+        return _load_resume_store().get(fingerprint)
+
+
+def _backoff(attempt: int) -> None:
+    time.sleep(min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.5))
+
+
+def _server_extensions(session: requests.Session, endpoint: str) -> set:
+    if endpoint not in _extensions_cache:
+        try:
+            resp = session.options(endpoint, headers=_auth_headers(), timeout=10)
+            raw = resp.headers.get("Tus-Extension", "")
+            _extensions_cache[endpoint] = {ext.strip() for ext in raw.split(",") if ext.strip()}
+        except requests.RequestException:
+            return set()
+    return _extensions_cache[endpoint]
+
+
+def _encode_metadata(metadata: dict) -> str:
+    return ",".join(
+        f"{key} {base64.b64encode(str(value).encode()).decode()}"
+        for key, value in metadata.items()
+    )
+
+
+def _create_upload(session: requests.Session, endpoint: str, length: Optional[int],
+                   metadata: dict, upsert: bool, concat: Optional[str] = None) -> str:
+    headers = _auth_headers()
+    headers["Upload-Metadata"] = _encode_metadata(metadata)
+    headers["x-upsert"] = "true" if upsert else "false"
+    if length is not None:
+        headers["Upload-Length"] = str(length)
+    if concat:
+        headers["Upload-Concat"] = concat
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            resp = session.post(endpoint, headers=headers, timeout=30)
+            if resp.status_code == 201 and resp.headers.get("Location"):
+                return urljoin(endpoint, resp.headers["Location"])
+            if resp.status_code < 500:
+                raise UploadError(f"Upload creation rejected: HTTP {resp.status_code} {resp.text}")
+        except requests.RequestException as e:
+            print(f"Upload creation failed (attempt {attempt + 1}): {e}")
+        _backoff(attempt)
+    raise UploadError("Unable to create upload")
+
+
+def _server_offset(session: requests.Session, upload_url: str) -> Optional[int]:
+    """Current offset of an upload, or None if the server no longer knows it."""
+    try:
+        resp = session.head(upload_url, headers=_auth_headers(), timeout=10)
+    except requests.RequestException:
+        return None
+    if resp.status_code in (404, 410) or "Upload-Offset" not in resp.headers:
+        return None
+    return int(resp.headers["Upload-Offset"])
+
+
+def _send_range(session: requests.Session, upload_url: str, source: Source,
+                start: int, end: int, offset: int, checksums: bool) -> None:
+    """PATCH bytes [start + offset, end) of source to upload_url, resuming on failure."""
+    attempt = 0
+    while start + offset < end:
+        chunk = _read(source, start + offset, min(CHUNK_SIZE, end - start - offset))
+        headers = _auth_headers()
+        headers["Upload-Offset"] = str(offset)
+        headers["Content-Type"] = "application/offset+octet-stream"
+        if checksums:
+            headers["Upload-Checksum"] = "sha1 " + base64.b64encode(hashlib.sha1(chunk).digest()).decode()
+
+        try:
+            resp = session.patch(upload_url, data=chunk, headers=headers, timeout=60)
+            if resp.status_code == 204:
+                offset = int(resp.headers.get("Upload-Offset", offset + len(chunk)))
+                attempt = 0
+                continue
+            if resp.status_code == 409:
+                # Offset mismatch: re-sync with the server's view of the upload. Only a
+                # server ahead of us is progress; anything else counts toward MAX_RETRIES
+                server_offset = _server_offset(session, upload_url)
+                if server_offset is not None and server_offset > offset:
+                    offset = server_offset
+                    attempt = 0
+                    continue
+                if server_offset is not None:
+                    offset = server_offset
+            elif resp.status_code not in (460,) and resp.status_code < 500:
+                raise UploadError(f"Chunk rejected: HTTP {resp.status_code} {resp.text}")
+            print(f"Chunk at offset {offset} failed with HTTP {resp.status_code}, retrying")
+        except requests.RequestException as e:
+            print(f"Chunk at offset {offset} failed: {e}, retrying")
+            server_offset = _server_offset(session, upload_url)
+            if server_offset is not None:
+                offset = server_offset
+
+        attempt += 1
+        if attempt >= MAX_RETRIES:
+            raise UploadError(f"Giving up on {upload_url} at offset {offset}")
+        _backoff(attempt)
+
+
+def _split_parts(length: int) -> List[tuple]:
+    chunks = (length + CHUNK_SIZE - 1) // CHUNK_SIZE
+    per_part = max(1, (chunks + MAX_PARALLEL - 1) // MAX_PARALLEL) * CHUNK_SIZE
+    return [(start, min(start + per_part, length)) for start in range(0, length, per_part)]
+
+
+def _upload_parallel(session: requests.Session, endpoint: str, source: Source, length: int,
+                     metadata: dict, upsert: bool, checksums: bool, fingerprint: str) -> str:
+    saved = _recall(fingerprint) or {}
+    part_urls: List[Optional[str]] = saved.get("parts") or []
+    parts = _split_parts(length)
+    if len(part_urls) != len(parts):
+        part_urls = [None] * len(parts)
+
+    def upload_part(index: int) -> str:
+        start, end = parts[index]
+        url = part_urls[index]
+        offset = _server_offset(session, url) if url else None
+        if offset is None:
+            url = _create_upload(session, endpoint, end - start, metadata, upsert, concat="partial")
+            offset = 0
+            part_urls[index] = url
+            _remember(fingerprint, {"parts": part_urls, "object_key": metadata["objectName"]})
+        _send_range(session, url, source, start, end, offset, checksums)
+        return url
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(parts))) as pool:
+        urls = list(pool.map(upload_part, range(len(parts))))
+
+    final_url = _create_upload(
+        session, endpoint, None, metadata, upsert, concat="final;" + " ".join(urls)
+    )
+    return final_url
+
+
+def _upload_sequential(session: requests.Session, endpoint: str, source: Source, length: int,
+                       metadata: dict, upsert: bool, checksums: bool, fingerprint: str) -> str:
+    saved = _recall(fingerprint) or {}
+    upload_url = saved.get("url")
+    offset = _server_offset(session, upload_url) if upload_url else None
+    if offset is None:
+        upload_url = _create_upload(session, endpoint, length, metadata, upsert)
+        offset = 0
+        _remember(fingerprint, {"url": upload_url, "object_key": metadata["objectName"]})
+    else:
+        print(f"Resuming upload at offset {offset} of {length}")
+    _send_range(session, upload_url, source, 0, length, offset, checksums)
+    return upload_url
+
+
+def upload_resumable(
+    bucket: str,
+    object_key: str,
+    source: Source,
+    content_type: str = "application/octet-stream",
+    upsert: bool = True,
+) -> str:
+    """
+    Upload bytes (or a file path) to Supabase Storage in resumable chunks.
+
+    Args:
+        bucket (str): Storage bucket name.
+        object_key (str): Path of the object inside the bucket.
+        source (bytes | str): The data to upload, or the path of a file to stream.
+        content_type (str): MIME type stored with the object.
+        upsert (bool): Overwrite an existing object at the same key.
+
+    Returns:
+        str: The object key, once the server has acknowledged every byte. When
+        an interrupted upload of the same data is resumed, this is the key that
+        upload was started with, which may differ from `object_key`.
+    """
+    endpoint = tus_endpoint()
+    length = _source_length(source)
+    fingerprint = _fingerprint(bucket, object_key, source)
+    saved = _recall(fingerprint) or {}
+    if saved.get("object_key"):
+        # The interrupted upload's bytes already live under its original name
+        object_key = saved["object_key"]
+    metadata = {
+        "bucketName": bucket,
+        "objectName": object_key,
+        "contentType": content_type,
+        "cacheControl": "3600",
+    }
+
+    with requests.Session() as session:
+        extensions = _server_extensions(session, endpoint)
+        checksums = "checksum" in extensions
+        parallel = "concatenation" in extensions and MAX_PARALLEL > 1 and length > CHUNK_SIZE
+        upload = _upload_parallel if parallel else _upload_sequential
+        upload_url = upload(session, endpoint, source, length, metadata, upsert, checksums, fingerprint)
+
+        final_offset = _server_offset(session, upload_url)
+        if final_offset is not None and final_offset != length:
+            raise UploadError(f"Upload incomplete: server has {final_offset} of {length} bytes")
+
+    _remember(fingerprint, None)
+    print(f"Uploaded {length} bytes to {bucket}/{object_key} ({'parallel' if parallel else 'sequential'})")
+    return object_key
@@ -0,0 +1,197 @@
+"""
+Process-wide pooled HTTP clients for Shopify.
+
+One httpx.AsyncClient per shop host (HTTP/2 where the server offers it,
+keep-alive, bounded connections) is shared by every Shopify route, so OAuth
+callbacks and Admin API calls reuse open connections instead of paying TCP +
+TLS setup per request. Clients are closed on app shutdown.
+
+Admin GraphQL calls also go through the host's ShopThrottle
+(src.utils.shopify_throttle), which holds them back until their query cost
+fits Shopify's rate-limit bucket.
+
+Shop domains come from request parameters, so only *.myshopify.com hosts are
+accepted (unless SHOPIFY_BASE_URL points every shop at one server), and at
+most SHOPIFY_MAX_SHOPS clients and throttles are kept; the least recently
+used are evicted, and an evicted client is closed once requests it may still
+be serving have had time to finish.
+"""
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+from src.utils.shopify_throttle import INTERACTIVE, ShopThrottle
+
+load_dotenv()
+SHOPIFY_API_VERSION = os.getenv("SHOPIFY_API_VERSION", "2024-10")
+# Send every shop's requests to one base URL instead of https://{shop} (e.g. src.dev.shopify_standin)
+SHOPIFY_BASE_URL = os.getenv("SHOPIFY_BASE_URL")
+SHOPIFY_MAX_CONNECTIONS = int(os.getenv("SHOPIFY_MAX_CONNECTIONS", "10"))
+SHOPIFY_TIMEOUT = float(os.getenv("SHOPIFY_TIMEOUT", "30"))
+SHOPIFY_MAX_SHOPS = int(os.getenv("SHOPIFY_MAX_SHOPS", "256"))
+# Longest request an evicted client may still be serving (bulk result downloads)
+RETIRED_CLIENT_GRACE_SECONDS = 600
+
+SHOP_DOMAIN = re.compile(r"^[a-z0-9][a-z0-9-]*\.myshopify\.com$")
+
+_clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+_throttles: "OrderedDict[str, ShopThrottle]" = OrderedDict()
+_clients_lock = threading.Lock()
+_stats = {"evicted": 0}
+
+class InvalidShopError(ValueError):
+    """Raised for a shop that is not a *.myshopify.com domain."""
+
+def normalize_shop(shop: str) -> str:
+    """
+    `https://my-shop.myshopify.com/` -> `my-shop.myshopify.com`. Raises
+    InvalidShopError for anything else, unless SHOPIFY_BASE_URL is set.
+    """
+    shop = shop.strip().lower()
+    for prefix in ("https://", "http://"):
+        if shop.startswith(prefix):
+            shop = shop[len(prefix):]
+    shop = shop.split("/", 1)[0]
+    if not SHOPIFY_BASE_URL and not SHOP_DOMAIN.match(shop):
+        raise InvalidShopError(f"Invalid shop domain: {shop!r} (expected your-shop.myshopify.com)")
+    return shop
+
+def _new_client(base_url: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=True,
+        timeout=SHOPIFY_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=SHOPIFY_MAX_CONNECTIONS,
+            max_keepalive_connections=SHOPIFY_MAX_CONNECTIONS,
+            keepalive_expiry=60,
+        ),
+    )
+
+def _base_url(shop: str) -> str:
+    return SHOPIFY_BASE_URL or f"https://{normalize_shop(shop)}"
+
+def _retire(client: httpx.AsyncClient) -> None:
+    """Close an evicted client after the grace period; without a running loop nothing can be using it."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.call_later(RETIRED_CLIENT_GRACE_SECONDS, lambda: loop.create_task(client.aclose()))
+
+def get_shop_client(shop: str) -> httpx.AsyncClient:
+    """Shared client for `shop`; request paths are relative to the shop's origin."""
+    base_url = _base_url(shop)
+    evicted = []
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None or client.is_closed:
+            client = _clients[base_url] = _new_client(base_url)
+        _clients.move_to_end(base_url)
+        while len(_clients) > SHOPIFY_MAX_SHOPS:
+            evicted.append(_clients.popitem(last=False)[1])
+            _stats["evicted"] += 1
+    for old in evicted:
+        _retire(old)
+    return client
+
+def get_shop_throttle(shop: str) -> ShopThrottle:
+    base_url = _base_url(shop)
+    with _clients_lock:
+        throttle = _throttles.get(base_url)
+        if throttle is None:
+            throttle = _throttles[base_url] = ShopThrottle()
+        _throttles.move_to_end(base_url)
+        while len(_throttles) > SHOPIFY_MAX_SHOPS:
+            # Calls already waiting keep their reference; the next call re-learns the bucket
+            _throttles.popitem(last=False)
+        return throttle
+
+def graphql_path(api_version: Optional[str] = None) -> str:
+    return f"/admin/api/{api_version or SHOPIFY_API_VERSION}/graphql.json"
+
+async def admin_graphql(shop: str, access_token: str, query: str, variables: Optional[dict] = None,
+                        priority: str = INTERACTIVE) -> dict:
+    """
+    POST a GraphQL request to the shop's Admin API and return the decoded
+    response, once the shop's throttle admits it. Pass priority=BACKGROUND
+    for syncs and polling so they yield to interactive calls.
+    """
+    async def send() -> dict:
+        response = await get_shop_client(shop).post(
+            graphql_path(),
+            json={"query": query, "variables": variables or {}},
+            headers={"X-Shopify-Access-Token": access_token},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    return await get_shop_throttle(shop).run(query, variables, send, priority)
+
+async def close_shop_clients() -> None:
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+def shop_client_info() -> dict:
+    with _clients_lock:
+        throttles = dict(_throttles)
+        hosts = len(_clients)
+        evicted = _stats["evicted"]
+    return {"hosts": hosts, "max_hosts": SHOPIFY_MAX_SHOPS, "evicted": evicted, "throttles": {base_url: throttle.info() for base_url, throttle in throttles.items()}}
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import time
+
+    parser = argparse.ArgumentParser(description="Admin API latency: new client per request vs pooled client")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--handshake-ms", type=float, default=30,
+                        help="connection setup cost simulated by the local stand-in")
+    args = parser.parse_args()
+
+    if not SHOPIFY_BASE_URL:
+        from src.dev.shopify_standin import serve
+        server = serve(port=0, handshake_ms=args.handshake_ms)
+        SHOPIFY_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"Using local stand-in with {args.handshake_ms:.0f} ms connection setup")
+
+    shop = "bench.myshopify.com"
+    query = "{ shop { name } }"
+
+    async def per_request() -> None:
+        # What the OAuth callback did: a fresh client (and connection) for every call
+        async with _new_client(SHOPIFY_BASE_URL) as client:
+            response = await client.post(graphql_path(), json={"query": query}, headers={"X-Shopify-Access-Token": "t"})
+            response.raise_for_status()
+
+    async def pooled() -> None:
+        await admin_graphql(shop, "t", query)
+
+    async def run(fn) -> float:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one() -> None:
+            async with semaphore:
+                await fn()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        return time.perf_counter() - start
+
+    async def main() -> None:
+        for name, fn in (("client per request", per_request), ("pooled client", pooled)):
+            elapsed = await run(fn)
+            print(f"{name:>18}: {elapsed / args.requests * 1000:.2f} ms per request, "
+                  f"{args.requests / elapsed:.0f} requests/s")
+        await close_shop_clients()
+
+    asyncio.run(main())
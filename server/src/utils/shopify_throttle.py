@@ -0,0 +1,331 @@
+"""
+Cost-aware admission for the Shopify Admin GraphQL API.
+
+Shopify meters GraphQL calls with a leaky bucket per app and shop: a call's
+requested cost is taken from `currentlyAvailable`, which refills at
+`restoreRate` points per second up to `maximumAvailable`, and a call that
+does not fit fails with THROTTLED. ShopThrottle keeps a local model of that
+bucket, refreshed from every response's extensions.cost, and admits a call
+only once its estimated cost fits. Calls run in parallel while there is
+headroom and wait their turn instead of failing when there is not.
+
+Two lanes: interactive calls are always admitted first, and background
+calls (bulk polling, exports, syncs) must also leave
+SHOPIFY_BACKGROUND_RESERVE of the bucket free for interactive ones.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+# Bucket assumed until the first response reports the real one (standard plan)
+SHOPIFY_BUCKET_SIZE = float(os.getenv("SHOPIFY_BUCKET_SIZE", "1000"))
+SHOPIFY_RESTORE_RATE = float(os.getenv("SHOPIFY_RESTORE_RATE", "50"))
+SHOPIFY_BACKGROUND_RESERVE = float(os.getenv("SHOPIFY_BACKGROUND_RESERVE", "0.25"))
+SHOPIFY_THROTTLE_RETRIES = int(os.getenv("SHOPIFY_THROTTLE_RETRIES", "3"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+TOKEN = re.compile(r"\$?\w+|[{}():]")
+MUTATION_COST = 10
+LEARNED_COSTS_MAX = 512
+
+# (query, estimate) -> requestedQueryCost last reported by Shopify
+_learned_costs: "OrderedDict[tuple, float]" = OrderedDict()
+
+def estimate_query_cost(query: str, variables: Optional[dict] = None) -> int:
+    """
+    Approximate Shopify's requested cost: objects cost 1, connections cost
+    2 plus `first`/`last` times the cost of one node, scalars are free and
+    mutations cost 10.
+    """
+    variables = variables or {}
+    tokens = TOKEN.findall(query)
+    cost = 0
+    multipliers = []
+    pending = None
+    last_name = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "mutation" and not multipliers:
+            cost += MUTATION_COST
+        elif token == "(":
+            depth = 1
+            i += 1
+            while i < len(tokens) and depth:
+                if tokens[i] == "(":
+                    depth += 1
+                elif tokens[i] == ")":
+                    depth -= 1
+                elif tokens[i] in ("first", "last") and i + 2 < len(tokens) and tokens[i + 1] == ":":
+                    value = tokens[i + 2]
+                    value = variables.get(value[1:]) if value.startswith("$") else value
+                    if str(value).isdigit():
+                        pending = int(value)
+                i += 1
+            continue
+        elif token == "{":
+            multiplier = multipliers[-1] if multipliers else 1
+            if not multipliers or last_name in ("edges", "pageInfo"):
+                multipliers.append(multiplier)
+            elif pending is not None:
+                cost += 2 * multiplier
+                multipliers.append(multiplier * pending)
+            else:
+                cost += multiplier
+                multipliers.append(multiplier)
+            pending = None
+        elif token == "}":
+            if multipliers:
+                multipliers.pop()
+        elif token != ":":
+            last_name = token
+        i += 1
+    return max(cost, 1)
+
+def query_cost(query: str, variables: Optional[dict] = None) -> float:
+    """The cost Shopify last charged for this query shape, else the estimate."""
+    estimate = estimate_query_cost(query, variables)
+    return _learned_costs.get((query, estimate), estimate)
+
+def _learn_cost(query: str, variables: Optional[dict], requested: float) -> None:
+    key = (query, estimate_query_cost(query, variables))
+    _learned_costs[key] = requested
+    _learned_costs.move_to_end(key)
+    while len(_learned_costs) > LEARNED_COSTS_MAX:
+        _learned_costs.popitem(last=False)
+
+def _is_throttled(body: dict) -> bool:
+    return any((error.get("extensions") or {}).get("code") == "THROTTLED" for error in body.get("errors") or [])
+
+class ShopThrottle:
+    def __init__(self, maximum: float = SHOPIFY_BUCKET_SIZE, restore_rate: float = SHOPIFY_RESTORE_RATE,
+                 reserve: float = SHOPIFY_BACKGROUND_RESERVE):
+        self.maximum = maximum
+        self.restore_rate = restore_rate
+        self.reserve = reserve
+        self.available = maximum
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self._waiters = {INTERACTIVE: deque(), BACKGROUND: deque()}
+        self._timer = None
+        self.stats = {"admitted": 0, "queued": 0, "wait_seconds": 0.0, "throttled": 0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.maximum, self.available + (now - self.updated) * self.restore_rate)
+        self.updated = now
+
+    def _floor(self, priority: str) -> float:
+        return self.maximum * self.reserve if priority == BACKGROUND else 0.0
+
+    def _fits(self, cost: float, priority: str) -> bool:
+        # A call bigger than the whole bucket is let through when it is full;
+        # Shopify rejects it with MAX_COST_EXCEEDED rather than it waiting forever
+        floor = self._floor(priority)
+        return self.available - cost >= floor or self.available >= self.maximum - 1e-6
+
+    def _admit(self, cost: float) -> None:
+        self.available -= cost
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+
+    async def acquire(self, cost: float, priority: str = INTERACTIVE) -> None:
+        self._refill()
+        ahead = self._waiters[INTERACTIVE] or (priority == BACKGROUND and self._waiters[BACKGROUND])
+        if not ahead and self._fits(cost, priority):
+            self._admit(cost)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append((cost, future))
+        self.stats["queued"] += 1
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._return(cost)
+            raise
+        finally:
+            self.stats["wait_seconds"] += time.monotonic() - start
+
+    def _dispatch(self) -> None:
+        """Admit queued calls in priority order until the head of a lane does not fit."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        for priority in (INTERACTIVE, BACKGROUND):
+            waiters = self._waiters[priority]
+            while waiters:
+                cost, future = waiters[0]
+                if future.done():
+                    waiters.popleft()
+                    continue
+                if not self._fits(cost, priority):
+                    # Nothing behind this call may overtake it, so wake up when it fits
+                    deficit = self._floor(priority) + min(cost, self.maximum) - self.available
+                    delay = max(deficit / max(self.restore_rate, 1e-6), 0.001)
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                    return
+                waiters.popleft()
+                self._admit(cost)
+                future.set_result(None)
+
+    def _return(self, cost: float) -> None:
+        self.in_flight -= 1
+        self.available = min(self.maximum, self.available + cost)
+
+    def release(self, cost: float, body: Optional[dict]) -> None:
+        """Settle a call: refund the unused estimate and sync with the bucket Shopify reports."""
+        self.in_flight -= 1
+        self._refill()
+        reported = ((body or {}).get("extensions") or {}).get("cost") or {}
+        status = reported.get("throttleStatus")
+        if status:
+            self.maximum = float(status["maximumAvailable"])
+            self.restore_rate = float(status["restoreRate"])
+            if _is_throttled(body):
+                # Throttled calls are not charged
+                self.available += cost
+            elif reported.get("actualQueryCost") is not None:
+                self.available += cost - float(reported["actualQueryCost"])
+            # Shopify's figure is authoritative, but it may not yet include
+            # calls of ours that are still in flight, so never raise it
+            current = float(status["currentlyAvailable"])
+            self.available = current if self.in_flight == 0 else min(self.available, current)
+        elif body is None:
+            self.available += cost
+        self.available = min(self.available, self.maximum)
+        self._dispatch()
+
+    async def run(self, query: str, variables: Optional[dict], send: Callable[[], Awaitable[dict]],
+                  priority: str = INTERACTIVE) -> dict:
+        """Send one GraphQL call through the bucket, retrying if Shopify still throttles it."""
+        for attempt in range(SHOPIFY_THROTTLE_RETRIES + 1):
+            cost = query_cost(query, variables)
+            await self.acquire(cost, priority)
+            try:
+                body = await send()
+            except BaseException:
+                self.release(cost, None)
+                raise
+            requested = ((body.get("extensions") or {}).get("cost") or {}).get("requestedQueryCost")
+            if requested is not None:
+                _learn_cost(query, variables, float(requested))
+            self.release(cost, body)
+            if not _is_throttled(body):
+                return body
+            self.stats["throttled"] += 1
+        return body
+
+    def info(self) -> dict:
+        self._refill()
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "available": round(self.available, 1),
+            "maximum": self.maximum,
+            "restore_rate": self.restore_rate,
+            "in_flight": self.in_flight,
+            "waiting": {priority: len(waiters) for priority, waiters in self._waiters.items()},
+        }
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="GraphQL calls against a cost-metered stand-in: naive parallel vs serial vs throttle")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--first", type=int, default=20, help="page size of each products query")
+    parser.add_argument("--concurrency", type=int, default=20, help="parallelism of the naive run")
+    parser.add_argument("--bucket", type=float, default=1000)
+    parser.add_argument("--restore-rate", type=float, default=500)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    from src.dev.shopify_standin import serve
+    server = serve(port=0, bucket=args.bucket, restore_rate=args.restore_rate, latency_ms=args.latency_ms, products=args.first)
+    os.environ["SHOPIFY_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    # Imported after SHOPIFY_BASE_URL is set so the pooled clients point at the stand-in
+    from src.utils import shopify_client
+    from src.utils.shopify_throttle import BACKGROUND, INTERACTIVE
+    shopify_client.SHOPIFY_BASE_URL = os.environ["SHOPIFY_BASE_URL"]
+
+    query = f"{{ products(first: {args.first}) {{ edges {{ node {{ id title }} }} pageInfo {{ hasNextPage endCursor }} }} }}"
+    shop = "bench.myshopify.com"
+    print(f"Stand-in bucket {args.bucket:.0f} points, restoring {args.restore_rate:.0f}/s, {args.latency_ms:.0f} ms per call; "
+          f"{args.calls} calls of estimated cost {estimate_query_cost(query)}")
+
+    def reset_bucket() -> None:
+        with server.state.lock:
+            server.state.available = server.state.bucket
+            server.state.throttled = 0
+
+    async def raw_call() -> dict:
+        client = shopify_client.get_shop_client(shop)
+        response = await client.post(shopify_client.graphql_path(), json={"query": query}, headers={"X-Shopify-Access-Token": "t"})
+        response.raise_for_status()
+        return response.json()
+
+    async def naive(concurrency: int) -> None:
+        # Retry throttled calls after a fixed second, as a simple client would
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one() -> None:
+            async with semaphore:
+                while _is_throttled(await raw_call()):
+                    await asyncio.sleep(1)
+
+        await asyncio.gather(*(one() for _ in range(args.calls)))
+
+    async def throttled() -> None:
+        await asyncio.gather(*(shopify_client.admin_graphql(shop, "t", query) for _ in range(args.calls)))
+
+    async def interactive_latency(priority: str) -> float:
+        """Median latency of interactive calls made while a background sync saturates the bucket."""
+        latencies = []
+        syncing = asyncio.Event()
+
+        async def sync() -> None:
+            syncing.set()
+            await asyncio.gather(*(shopify_client.admin_graphql(shop, "t", query, priority=BACKGROUND)
+                                   for _ in range(args.calls)))
+            syncing.clear()
+
+        async def interactive() -> None:
+            await syncing.wait()
+            while syncing.is_set():
+                await asyncio.sleep(0.2)
+                start = time.perf_counter()
+                await shopify_client.admin_graphql(shop, "t", "{ shop { name } }", priority=priority)
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(sync(), interactive())
+        return statistics.median(latencies)
+
+    async def main() -> None:
+        for name, run in ((f"naive x{args.concurrency}", lambda: naive(args.concurrency)),
+                          ("serial", lambda: naive(1)),
+                          ("throttle", throttled)):
+            reset_bucket()
+            start = time.perf_counter()
+            await run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>12}: {elapsed:6.2f} s, {args.calls / elapsed:6.1f} calls/s, "
+                  f"{server.state.throttled} THROTTLED responses")
+        for name, priority in (("interactive lane", INTERACTIVE), ("same lane as sync", BACKGROUND)):
+            reset_bucket()
+            latency = await interactive_latency(priority)
+            print(f"{name:>18}: median interactive call {latency * 1000:.0f} ms during a background sync")
+        print(shopify_client.shop_client_info()["throttles"])
+        await shopify_client.close_shop_clients()
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+In-memory conversation context for support threads.
+
+Turns are recorded as emails arrive and replies are sent, keyed by AgentMail
+thread id, so a reply prompt can include earlier turns without fetching the
+thread from the API. Each thread keeps at most THREAD_CONTEXT_MAX_TURNS turns
+and THREAD_CONTEXT_THREAD_CHARS characters; threads share a total budget of
+THREAD_CONTEXT_TOTAL_CHARS and the least recently used thread is evicted
+first.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+from cachetools import LRUCache
+from dotenv import load_dotenv
+
+load_dotenv()
+THREAD_CONTEXT_MAX_TURNS = int(os.getenv("THREAD_CONTEXT_MAX_TURNS", "10"))
+THREAD_CONTEXT_THREAD_CHARS = int(os.getenv("THREAD_CONTEXT_THREAD_CHARS", "8000"))
+THREAD_CONTEXT_TOTAL_CHARS = int(os.getenv("THREAD_CONTEXT_TOTAL_CHARS", str(20 * 1024 * 1024)))
+
+class ThreadContext:
+    def __init__(self, max_turns: int, max_chars: int):
+        self.max_chars = max_chars
+        self.turns = deque(maxlen=max_turns)
+        self.message_ids = set()
+        self.chars = 0
+
+    def add(self, role: str, text: str, message_id: Optional[str]) -> None:
+        if message_id and message_id in self.message_ids:
+            return
+        text = (text or "").strip()[-self.max_chars:]
+        if len(self.turns) == self.turns.maxlen:
+            self._drop_oldest()
+        self.turns.append({"role": role, "text": text, "message_id": message_id, "at": time.time()})
+        self.chars += len(text)
+        if message_id:
+            self.message_ids.add(message_id)
+        while self.chars > self.max_chars and len(self.turns) > 1:
+            self._drop_oldest()
+
+    def _drop_oldest(self) -> None:
+        turn = self.turns.popleft()
+        self.chars -= len(turn["text"])
+        self.message_ids.discard(turn["message_id"])
+
+    def size(self) -> int:
+        # Rough per-turn overhead so many tiny turns still count against the budget
+        return self.chars + 64 * len(self.turns)
+
+class ThreadContextCache:
+    def __init__(
+        self,
+        max_turns: int = THREAD_CONTEXT_MAX_TURNS,
+        thread_chars: int = THREAD_CONTEXT_THREAD_CHARS,
+        total_chars: int = THREAD_CONTEXT_TOTAL_CHARS,
+    ):
+        self.max_turns = max_turns
+        self.thread_chars = thread_chars
+        self._lock = threading.Lock()
+        self._threads = LRUCache(maxsize=total_chars, getsizeof=ThreadContext.size)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def record(self, thread_id: str, role: str, text: str, message_id: Optional[str] = None) -> None:
+        """Append a turn to the thread; re-inserting updates its size and recency."""
+        if not thread_id:
+            return
+        with self._lock:
+            context = self._threads.pop(thread_id, None) or ThreadContext(self.max_turns, self.thread_chars)
+            context.add(role, text, message_id)
+            self._threads[thread_id] = context
+
+    def history(self, thread_id: str, exclude_message_id: Optional[str] = None) -> List[dict]:
+        """Earlier turns of the thread, oldest first."""
+        with self._lock:
+            context = self._threads.get(thread_id) if thread_id else None
+            if context is None:
+                self.stats["misses"] += 1
+                return []
+            self.stats["hits"] += 1
+            return [dict(turn) for turn in context.turns if turn["message_id"] != exclude_message_id or not turn["message_id"]]
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats, "threads": len(self._threads), "chars": self._threads.currsize}
+
+_cache = ThreadContextCache()
+
+def get_thread_context_cache() -> ThreadContextCache:
+    return _cache
@@ -0,0 +1,77 @@
+"""
+Build zip archives on the fly as an iterator of byte chunks.
+
+zipfile writes into a non-seekable sink (so it emits data descriptors instead
+of seeking back to patch headers), and the sink is drained after every block,
+so memory use is bounded by the block size rather than the archive size.
+"""
+import io
+import os
+import time
+import zipfile
+from typing import Callable, Iterable, Iterator, Tuple, Union
+
+BLOCK_SIZE = 64 * 1024
+# Force zip64 headers for entries that may cross the 4GB limit
+ZIP64_THRESHOLD = 2 ** 31
+
+Source = Union[bytes, str, Callable[[], Union[bytes, str]]]
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable file object that collects written bytes."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _blocks(source: Union[bytes, str]) -> Iterator[bytes]:
+    if isinstance(source, (bytes, bytearray)):
+        view = memoryview(source)
+        for offset in range(0, len(view), BLOCK_SIZE):
+            yield view[offset:offset + BLOCK_SIZE]
+        return
+    with open(source, "rb") as f:
+        while block := f.read(BLOCK_SIZE):
+            yield block
+
+def _size(source: Union[bytes, str]) -> int:
+    return len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+
+def stream_zip(entries: Iterable[Tuple[str, Source, int]]) -> Iterator[bytes]:
+    """
+    Yield a zip archive chunk by chunk.
+
+    Args:
+        entries: (arcname, source, compress_type) tuples. `source` is bytes, a
+            file path, or a callable returning either; callables are only
+            invoked when their entry is reached, so expensive artifacts are
+            produced lazily.
+    """
+    sink = _ChunkSink()
+    date_time = time.localtime(time.time())[:6]
+    with zipfile.ZipFile(sink, "w") as zf:
+        for arcname, source, compress_type in entries:
+            if callable(source):
+                source = source()
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = compress_type
+            with zf.open(info, "w", force_zip64=_size(source) > ZIP64_THRESHOLD) as dest:
+                for block in _blocks(source):
+                    dest.write(block)
+                    if data := sink.drain():
+                        yield data
+            if data := sink.drain():
+                yield data
+    if data := sink.drain():
+        yield data